@@ -16,20 +16,23 @@ const pool = new Pool({
 router.get('/executions', authenticateToken, async (req: Request, res: Response) => {
     try {
         const days = parseInt(req.query.days as string) || 7;
-
+        
+        // Daily rollups: one row per task per day, independent of execution volume
         const result = await pool.query(
             `SELECT 
-        DATE(started_at) as date,
-        COUNT(*) as total,
-        COUNT(CASE WHEN status = 'success' THEN 1 END) as successful,
-        COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
-        AVG(duration_ms) as avg_duration
-       FROM task_executions
-       WHERE started_at >= CURRENT_DATE - INTERVAL '${days} days'
-       GROUP BY DATE(started_at)
-       ORDER BY date DESC`
+        DATE(bucket_start) as date,
+        SUM(total) as total,
+        SUM(successful) as successful,
+        SUM(failed) as failed,
+        SUM(duration_sum)::numeric / NULLIF(SUM(duration_count), 0) as avg_duration,
+        histogram_percentile(histogram_sum(duration_histogram), 0.95) as p95_duration
+       FROM task_execution_rollups
+       WHERE bucket_size = 'day' AND bucket_start >= CURRENT_DATE - $1::int * INTERVAL '1 day'
+       GROUP BY DATE(bucket_start)
+       ORDER BY date DESC`,
+            [days]
         );
-
+        
         res.json(result.rows);
     } catch (error) {
         res.status(500).json({ error: 'Failed to fetch execution statistics' });
@@ -42,7 +45,7 @@ router.get('/success-rate', authenticateToken, async (req: Request, res: Respons
         const result = await pool.query(
             `SELECT * FROM task_execution_stats ORDER BY total_executions DESC`
         );
-
+        
         res.json(result.rows);
     } catch (error) {
         res.status(500).json({ error: 'Failed to fetch success rates' });
@@ -53,14 +56,14 @@ router.get('/success-rate', authenticateToken, async (req: Request, res: Respons
 router.get('/ai-results', authenticateToken, async (req: Request, res: Response) => {
     try {
         const limit = parseInt(req.query.limit as string) || 50;
-
+        
         const result = await pool.query(
             `SELECT * FROM ai_results 
        ORDER BY created_at DESC 
        LIMIT $1`,
             [limit]
         );
-
+        
         res.json(result.rows);
     } catch (error) {
         res.status(500).json({ error: 'Failed to fetch AI results' });
@@ -72,16 +75,29 @@ router.get('/overview', authenticateToken, async (req: Request, res: Response) =
     try {
         const [tasksResult, executionsResult, pluginsResult] = await Promise.all([
             pool.query('SELECT COUNT(*) as total, COUNT(CASE WHEN is_enabled THEN 1 END) as enabled FROM tasks'),
+            // Completed executions from the last 24 hourly rollups, plus the
+            // pending and running ones (served by the partial index on active
+            // executions). Timestamps are stored as UTC wall time.
             pool.query(`SELECT 
-        COUNT(*) as total,
-        COUNT(CASE WHEN status = 'success' THEN 1 END) as successful,
-        COUNT(CASE WHEN status = 'failed' THEN 1 END) as failed,
-        COUNT(CASE WHEN status = 'running' THEN 1 END) as running
-       FROM task_executions
-       WHERE started_at >= CURRENT_DATE - INTERVAL '24 hours'`),
+        c.completed + a.active as total,
+        c.successful,
+        c.failed,
+        a.running
+       FROM (SELECT 
+          COALESCE(SUM(total), 0) as completed,
+          COALESCE(SUM(successful), 0) as successful,
+          COALESCE(SUM(failed), 0) as failed
+         FROM task_execution_rollups
+         WHERE bucket_size = 'hour'
+           AND bucket_start > date_trunc('hour', now() AT TIME ZONE 'UTC') - INTERVAL '24 hours') c,
+        (SELECT COUNT(*) as active,
+          COUNT(*) FILTER (WHERE status = 'running') as running
+         FROM task_executions
+         WHERE status IN ('pending', 'running')
+           AND started_at >= (now() AT TIME ZONE 'UTC') - INTERVAL '24 hours') a`),
             pool.query('SELECT COUNT(*) as total, COUNT(CASE WHEN is_enabled THEN 1 END) as enabled FROM plugins')
         ]);
-
+        
         res.json({
             tasks: tasksResult.rows[0],
             executions_24h: executionsResult.rows[0],
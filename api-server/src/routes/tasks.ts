@@ -1,5 +1,5 @@
 import { Router, Request, Response } from 'express';
-import { Pool } from 'pg';
+import { Pool, Client, Notification } from 'pg';
 import { authenticateToken } from '../middleware/auth';
 
 const router = Router();
@@ -13,6 +13,72 @@ const pool = new Pool({
     password: process.env.DB_PASSWORD || 'omnitasker_secure_pass'
 });
 
+// Long-poll log followers waiting for new output, keyed by execution ID.
+// A single LISTEN connection wakes all of them, so followers never poll the database.
+const logWaiters = new Map<string, Set<() => void>>();
+let logListener: Client | null = null;
+
+const ensureLogListener = async () => {
+    if (logListener) {
+        return;
+    }
+
+    const client = new Client({
+        host: process.env.DB_HOST || 'localhost',
+        port: parseInt(process.env.DB_PORT || '5432'),
+        database: process.env.DB_NAME || 'omnitasker',
+        user: process.env.DB_USER || 'omnitasker',
+        password: process.env.DB_PASSWORD || 'omnitasker_secure_pass'
+    });
+
+    client.on('notification', (msg: Notification) => {
+        const executionId = msg.payload || '';
+        const waiters = logWaiters.get(executionId);
+        if (waiters) {
+            logWaiters.delete(executionId);
+            waiters.forEach((wake) => wake());
+        }
+    });
+    client.on('error', () => {
+        // Reconnect on the next follow request
+        logListener = null;
+        client.end().catch(() => undefined);
+    });
+
+    logListener = client;
+    try {
+        await client.connect();
+        await client.query('LISTEN execution_logs');
+    } catch (error) {
+        logListener = null;
+        throw error;
+    }
+};
+
+const waitForLogs = (executionId: string, timeoutMs: number) => {
+    let wake: () => void = () => undefined;
+    const promise = new Promise<void>((resolve) => {
+        const timer = setTimeout(() => wake(), timeoutMs);
+        wake = () => {
+            clearTimeout(timer);
+            const waiters = logWaiters.get(executionId);
+            if (waiters) {
+                waiters.delete(wake);
+                if (waiters.size === 0) {
+                    logWaiters.delete(executionId);
+                }
+            }
+            resolve();
+        };
+    });
+
+    const waiters = logWaiters.get(executionId) || new Set<() => void>();
+    waiters.add(wake);
+    logWaiters.set(executionId, waiters);
+
+    return { promise, cancel: () => wake() };
+};
+
 // Get all tasks
 router.get('/', authenticateToken, async (req: Request, res: Response) => {
     try {
@@ -148,6 +214,72 @@ router.post('/:id/execute', authenticateToken, async (req: Request, res: Respons
     }
 });
 
+// Get execution output after a sequence number, optionally waiting for more (long-poll)
+router.get('/executions/:executionId/logs', authenticateToken, async (req: Request, res: Response) => {
+    try {
+        const { executionId } = req.params;
+        const afterParam = parseInt(req.query.after as string);
+        const after = isNaN(afterParam) ? -1 : afterParam;
+        const limit = Math.min(parseInt(req.query.limit as string) || 100, 1000);
+        const waitSeconds = Math.min(parseInt(req.query.wait as string) || 0, 30);
+
+        const getStatus = async () => {
+            const result = await pool.query(
+                `SELECT te.status FROM task_executions te
+       JOIN tasks t ON te.task_id = t.id
+       WHERE te.id = $1 AND t.user_id = $2`,
+                [executionId, req.user?.userId]
+            );
+            return result.rows.length ? result.rows[0].status as string : null;
+        };
+
+        const getChunks = async () => {
+            const result = await pool.query(
+                `SELECT seq, stream, content, created_at FROM task_execution_logs
+       WHERE execution_id = $1 AND seq > $2
+       ORDER BY seq
+       LIMIT $3`,
+                [executionId, after, limit]
+            );
+            return result.rows;
+        };
+
+        let status = await getStatus();
+        if (status === null) {
+            return res.status(404).json({ error: 'Execution not found' });
+        }
+
+        let chunks = await getChunks();
+        const isActive = (s: string | null) => s === 'pending' || s === 'running';
+
+        if (chunks.length === 0 && waitSeconds > 0 && isActive(status)) {
+            await ensureLogListener();
+            // Subscribe before re-checking so a chunk written in between is not missed
+            const waiter = waitForLogs(executionId, waitSeconds * 1000);
+            chunks = await getChunks();
+            if (chunks.length === 0 && isActive(await getStatus())) {
+                await waiter.promise;
+                chunks = await getChunks();
+            } else {
+                waiter.cancel();
+            }
+            status = await getStatus();
+        }
+
+        const nextAfter = chunks.length ? chunks[chunks.length - 1].seq : after;
+
+        res.json({
+            execution_id: executionId,
+            status,
+            chunks,
+            next_after: nextAfter,
+            complete: !isActive(status) && chunks.length < limit
+        });
+    } catch (error) {
+        res.status(500).json({ error: 'Failed to fetch execution logs' });
+    }
+});
+
 // Get task executions
 router.get('/:id/executions', authenticateToken, async (req: Request, res: Response) => {
     try {
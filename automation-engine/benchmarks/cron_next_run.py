@@ -0,0 +1,91 @@
+"""
+Cron next-run micro-benchmark
+Compares per-call croniter against the compiled plan cache and batch API
+
+Usage:
+    python -m benchmarks.cron_next_run --schedules 100000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+import numpy as np
+import pytz
+from croniter import croniter
+
+from src.core.cron_plans import CronPlanCache, to_datetime64
+
+EXPRESSIONS = [
+    '* * * * *', '*/5 * * * *', '*/15 * * * *', '0 * * * *', '30 2 * * *',
+    '0 0 * * *', '0 9 * * 1-5', '0 */6 * * *', '15 3 1 * *', '0 12 * * 0',
+]
+TIMEZONES = ['UTC', 'America/New_York', 'Europe/London', 'Asia/Tokyo', 'Australia/Sydney']
+
+
+def baseline_next_run(cron_expression: str, timezone: str, base_time: datetime) -> datetime:
+    """Original scheduler path: new timezone and croniter on every call"""
+    tz = pytz.timezone(timezone)
+    cron = croniter(cron_expression, base_time.astimezone(tz))
+    return cron.get_next(datetime).astimezone(pytz.UTC)
+
+
+def timed(label: str, func, count: int):
+    """Run func once and print throughput"""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed * 1000:10.1f} ms  {count / elapsed:12,.0f} schedules/s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--schedules', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    
+    rng = random.Random(args.seed)
+    count = args.schedules
+    expressions = [rng.choice(EXPRESSIONS) for _ in range(count)]
+    timezones = [rng.choice(TIMEZONES) for _ in range(count)]
+    now = datetime.now(pytz.UTC)
+    # Per-schedule base times spread over the last hour (e.g. staggered last runs)
+    bases = [now - timedelta(seconds=rng.randint(0, 3600)) for _ in range(count)]
+    
+    print(f"{count:,} schedules, {len(set(zip(expressions, timezones)))} distinct (expression, timezone) pairs\n")
+    
+    baseline, baseline_s = timed(
+        'baseline croniter per call',
+        lambda: [baseline_next_run(e, z, b) for e, z, b in zip(expressions, timezones, bases)],
+        count
+    )
+    
+    cache = CronPlanCache()
+    timed(
+        'cached plan per call',
+        lambda: [cache.next_run(e, z, b) for e, z, b in zip(expressions, timezones, bases)],
+        count
+    )
+    
+    cache = CronPlanCache()
+    base_array = np.array([to_datetime64(b) for b in bases], dtype='datetime64[us]')
+    batch, batch_s = timed(
+        'batch, per-schedule base times',
+        lambda: cache.next_runs(expressions, timezones, base_array),
+        count
+    )
+    
+    cache = CronPlanCache()
+    timed(
+        'batch, shared base time',
+        lambda: cache.next_runs(expressions, timezones, now),
+        count
+    )
+    
+    expected = np.array([to_datetime64(d) for d in baseline], dtype='datetime64[us]')
+    mismatches = int((expected != batch).sum())
+    print(f"\nbatch vs baseline: {mismatches} mismatches, {baseline_s / batch_s:.1f}x speedup")
+
+
+if __name__ == '__main__':
+    main()
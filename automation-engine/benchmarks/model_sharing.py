@@ -0,0 +1,122 @@
+"""
+Model sharing benchmark
+Compares Python workers that load NLP models themselves with workers sharing
+models warmed up in the forkserver (AI_WARMUP_MODELS)
+
+Each configuration runs in its own process, since the forkserver and its
+preload are fixed for the lifetime of the process that starts it. Every
+worker runs one NLP task; the report shows pool start time, the first task's
+latency per worker (the cold start), and per-worker memory from
+/proc/<pid>/smaps_rollup: PSS (shared pages split between the processes
+mapping them) and USS (pages only that worker holds). Linux only.
+
+Usage:
+    python -m benchmarks.model_sharing --model sentiment --workers 4
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+
+from src.core.python_pool import PythonWorkerPool
+
+TASK = """
+import os, time
+from src.ai.nlp_processor import NLPProcessor
+start = time.perf_counter()
+processor = NLPProcessor(batching=False)
+if {model!r} == 'summarization':
+    result = processor.summarize_text({text!r}, max_length=40, min_length=10)
+else:
+    result = processor.analyze_sentiment({text!r})
+assert 'error' not in result, result
+print(os.getpid(), (time.perf_counter() - start) * 1000)
+"""
+
+TEXT = ("The deployment finished ahead of schedule and every service passed its health checks. "
+        "Two nodes reported elevated latency during the rollout, which recovered without intervention.")
+
+
+def memory_kb(pid: int) -> dict:
+    """PSS and USS of a process in kB"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return {'pss': fields.get('Pss', 0),
+            'uss': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)}
+
+
+def parent_pid(pid: int) -> int:
+    with open(f'/proc/{pid}/stat') as f:
+        return int(f.read().rsplit(')', 1)[1].split()[1])
+
+
+def measure(model: str, workers: int) -> dict:
+    """Start a pool, run one task per worker concurrently, and measure the workers"""
+    start = time.perf_counter()
+    pool = PythonWorkerPool(max_workers=workers, max_tasks_per_worker=1000)
+    pool.start()
+    start_ms = (time.perf_counter() - start) * 1000
+    
+    script = TASK.format(model=model, text=TEXT)
+    try:
+        # Run from threads so every worker gets one task
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            results = list(executor.map(lambda _: pool.run(script, 'model_task.py', timeout=600),
+                                        range(workers)))
+        first_task_ms, pids = [], []
+        for exit_code, stdout, stderr in results:
+            if exit_code != 0:
+                raise RuntimeError(stderr)
+            pid, elapsed = stdout.split()
+            pids.append(int(pid))
+            first_task_ms.append(float(elapsed))
+        
+        memory = [memory_kb(pid) for pid in pids]
+        forkserver = memory_kb(parent_pid(pids[0]))
+    finally:
+        pool.shutdown()
+    
+    return {
+        'pool_start_ms': start_ms,
+        'first_task_ms': sum(first_task_ms) / len(first_task_ms),
+        'worker_pss_mb': sum(m['pss'] for m in memory) / len(memory) / 1024,
+        'worker_uss_mb': sum(m['uss'] for m in memory) / len(memory) / 1024,
+        'total_pss_mb': (sum(m['pss'] for m in memory) + forkserver['pss']) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--model', choices=('sentiment', 'summarization'), default='sentiment')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.measure:
+        print(json.dumps(measure(args.model, args.workers)))
+        return
+    
+    print(f"{args.model}: {args.workers} workers, one task each")
+    for label, warm_up in (('per-worker load', ''), ('forkserver warm-up', args.model)):
+        env = dict(os.environ, AI_WARMUP_MODELS=warm_up, AI_RESULT_CACHE='false',
+                   PYTHON_POOL_START_METHOD='forkserver')
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.model_sharing', '--measure',
+             '--model', args.model, '--workers', str(args.workers)],
+            env=env, check=True, capture_output=True, text=True
+        ).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"  {label:<20} pool start {r['pool_start_ms']:8.0f} ms   first task {r['first_task_ms']:8.0f} ms")
+        print(f"  {'':<20} per worker PSS {r['worker_pss_mb']:7.0f} MB   USS {r['worker_uss_mb']:7.0f} MB   "
+              f"total PSS with forkserver {r['total_pss_mb']:7.0f} MB")
+
+
+if __name__ == '__main__':
+    main()
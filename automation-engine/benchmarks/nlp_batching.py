@@ -0,0 +1,81 @@
+"""
+NLP micro-batching benchmark
+Compares throughput and latency of concurrent NLP requests with and without batching
+
+Loads the real models (downloaded on first use). Every request in a run
+comes from one of --concurrency threads, like tasks sharing one engine.
+
+Usage:
+    python -m benchmarks.nlp_batching --task sentiment --concurrency 16 --requests 256
+"""
+import argparse
+import os
+import threading
+import time
+
+from src.ai.nlp_processor import NLPProcessor
+
+SAMPLE = ("The deployment finished ahead of schedule and every service passed its health checks. "
+          "Two nodes reported elevated latency during the rollout, which recovered without "
+          "intervention once the caches warmed up. ")
+
+
+def run(processor: NLPProcessor, task: str, concurrency: int, requests: int):
+    """Issue `requests` calls from `concurrency` threads; returns (req/s, p50 ms, p99 ms)"""
+    latencies = []
+    lock = threading.Lock()
+    per_thread = requests // concurrency
+    
+    def worker(index: int):
+        for i in range(per_thread):
+            # Vary input length so batches see realistic padding
+            text = SAMPLE * (1 + (index + i) % 4)
+            start = time.perf_counter()
+            if task == 'summarize':
+                result = processor.summarize_text(text, max_length=60, min_length=20)
+            else:
+                result = processor.analyze_sentiment(text)
+            if 'error' in result:
+                raise RuntimeError(result['error'])
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+    
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    return (len(latencies) / elapsed, latencies[len(latencies) // 2],
+            latencies[max(int(len(latencies) * 0.99) - 1, 0)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--task', choices=('sentiment', 'summarize'), default='sentiment')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=256)
+    args = parser.parse_args()
+    
+    print(f"{args.task}: {args.requests} requests from {args.concurrency} threads "
+          f"(NLP_BATCH_SIZE={os.getenv('NLP_BATCH_SIZE', 8)}, "
+          f"NLP_BATCH_WAIT_MS={os.getenv('NLP_BATCH_WAIT_MS', 20)})")
+    results = {}
+    for label, batching in (('unbatched', False), ('batched', True)):
+        processor = NLPProcessor(batching=batching)
+        run(processor, args.task, 1, 1)  # Load the model outside the measurement
+        throughput, p50, p99 = run(processor, args.task, args.concurrency, args.requests)
+        results[label] = throughput
+        print(f"  {label:<10} {throughput:8.1f} req/s   p50 {p50:8.1f} ms   p99 {p99:8.1f} ms")
+        if batching:
+            stats = processor.get_batching_stats()['summarization' if args.task == 'summarize' else 'sentiment']
+            print(f"  {'':<10} avg batch {stats['avg_batch']:.1f}, avg wait {stats['avg_wait_ms']:.1f} ms")
+        processor.close()
+    print(f"  speedup    {results['batched'] / results['unbatched']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
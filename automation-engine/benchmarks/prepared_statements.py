@@ -0,0 +1,96 @@
+"""
+Prepared statement micro-benchmark
+Compares plain SQL text against server-side prepared statements for hot queries
+
+Needs a database reachable with the usual DB_* settings. Writes run inside
+a transaction that is rolled back, so nothing is left behind.
+
+Usage:
+    python -m benchmarks.prepared_statements --runs 2000
+"""
+import argparse
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime
+
+import psycopg2
+import pytz
+
+from src.database.prepared import PreparedStatements
+
+
+def measure(label: str, func, runs: int) -> float:
+    """Call func `runs` times and print mean / p50 / p99 latency in microseconds"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    mean = statistics.fmean(samples)
+    print(f"  {label:<10} mean {mean:8.1f} us   p50 {samples[len(samples) // 2]:8.1f} us"
+          f"   p99 {samples[int(len(samples) * 0.99) - 1]:8.1f} us")
+    return mean
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=2000)
+    parser.add_argument('--batch', type=int, default=20, help='rows per execution insert')
+    args = parser.parse_args()
+    
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=int(os.getenv('DB_PORT', 5432)),
+        database=os.getenv('DB_NAME', 'omnitasker'),
+        user=os.getenv('DB_USER', 'omnitasker'),
+        password=os.getenv('DB_PASSWORD', 'omnitasker_secure_pass')
+    )
+    plain = PreparedStatements(enabled=False)
+    prepared = PreparedStatements(enabled=True)
+    
+    with conn.cursor() as cur:
+        cur.execute("SELECT id FROM tasks LIMIT 1")
+        row = cur.fetchone()
+    conn.rollback()
+    task_id = str(row[0]) if row else str(uuid.uuid4())
+    now = datetime.now(pytz.UTC)
+    
+    def execution_rows():
+        ids = [str(uuid.uuid4()) for _ in range(args.batch)]
+        return [ids, [task_id] * args.batch, ['pending'] * args.batch, ['benchmark'] * args.batch,
+                [now] * args.batch] + [[None] * args.batch] * 6
+    
+    cases = [
+        ('get_task_by_id', lambda: (task_id,), False),
+        ('update_schedule_next_run', lambda: (now, str(uuid.uuid4())), True),
+        ('claim_schedules', lambda: ('benchmark', 60, [str(uuid.uuid4())], now), True),
+    ]
+    if row:
+        # Needs a real task for the foreign key
+        cases.append(('insert_executions', execution_rows, True))
+    
+    for name, params, rollback in cases:
+        print(name)
+        results = {}
+        for label, statements in (('plain', plain), ('prepared', prepared)):
+            def run():
+                with conn.cursor() as cur:
+                    statements.execute(cur, name, params())
+                    if cur.description:
+                        cur.fetchall()
+                if rollback:
+                    conn.rollback()
+                else:
+                    conn.commit()
+            
+            run()  # Warm up (and PREPARE) outside the measurement
+            results[label] = measure(label, run, args.runs)
+        print(f"  speedup    {results['plain'] / results['prepared']:.2f}x")
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
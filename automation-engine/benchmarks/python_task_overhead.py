@@ -0,0 +1,55 @@
+"""
+Python task overhead micro-benchmark
+Compares a fresh interpreter per task against the prewarmed worker pool
+
+Usage:
+    python -m benchmarks.python_task_overhead --runs 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from src.core.output_capture import run_process
+from src.core.python_pool import PythonWorkerPool
+
+SCRIPT = 'import json\nprint(json.dumps({"status": "ok"}))\n'
+
+
+def timed(label: str, func, runs: int) -> float:
+    """Run func `runs` times and print the mean latency"""
+    start = time.perf_counter()
+    for _ in range(runs):
+        exit_code, _, stderr = func()
+        assert exit_code == 0, stderr
+    elapsed = (time.perf_counter() - start) / runs
+    print(f"{label:<28} {elapsed * 1000:8.2f} ms/task")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args()
+    
+    with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False) as f:
+        f.write(SCRIPT)
+    try:
+        baseline = timed('fresh interpreter', lambda: run_process([sys.executable, f.name]), args.runs)
+    finally:
+        os.remove(f.name)
+    
+    pool = PythonWorkerPool(max_workers=args.workers)
+    pool.start()
+    try:
+        pooled = timed('prewarmed pool', lambda: pool.run(SCRIPT, 'bench.py'), args.runs)
+    finally:
+        pool.shutdown()
+    
+    print(f"\n{baseline / pooled:.1f}x lower per-task overhead ({pool.get_stats()['recycled']} workers recycled)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Inference Backends
+Loads transformers pipelines on fp32 PyTorch, dynamic int8 or ONNX Runtime
+"""
+import os
+import shutil
+import logging
+import tempfile
+from typing import Any
+
+import torch
+from transformers import AutoTokenizer, pipeline
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('pytorch', 'int8', 'onnx')
+
+# Pipeline task -> optimum ONNX Runtime model class
+ONNX_MODEL_CLASSES = {
+    'summarization': 'ORTModelForSeq2SeqLM',
+    'sentiment-analysis': 'ORTModelForSequenceClassification',
+}
+
+
+def default_backend() -> str:
+    """Backend selected by NLP_BACKEND"""
+    backend = os.getenv('NLP_BACKEND', 'pytorch').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"NLP_BACKEND must be one of {', '.join(BACKENDS)}, not {backend}")
+    return backend
+
+
+def load_pipeline(task: str, model_name: str, backend: str) -> Any:
+    """
+    Load a pipeline with the same call interface on any backend
+    
+    Args:
+        task: Pipeline task ('summarization' or 'sentiment-analysis')
+        model_name: Hugging Face model name
+        backend: 'pytorch' (fp32), 'int8' (dynamically quantized Linear
+            layers) or 'onnx' (ONNX Runtime; needs optimum[onnxruntime])
+    """
+    if backend == 'pytorch':
+        return pipeline(task, model=model_name)
+    
+    if backend == 'int8':
+        nlp = pipeline(task, model=model_name)
+        # Weights are stored as int8 and activations quantized on the fly, so
+        # Linear layers (most of the compute) run int8 matmuls on the CPU
+        torch.quantization.quantize_dynamic(nlp.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return nlp
+    
+    if backend == 'onnx':
+        return pipeline(task, model=_load_onnx_model(task, model_name),
+                        tokenizer=AutoTokenizer.from_pretrained(model_name))
+    
+    raise ValueError(f"Unknown NLP backend {backend}; expected one of {', '.join(BACKENDS)}")
+
+
+def _load_onnx_model(task: str, model_name: str) -> Any:
+    """Load an ONNX Runtime model, exporting it once to NLP_ONNX_CACHE_DIR"""
+    try:
+        import optimum.onnxruntime as ort
+    except ImportError as e:
+        raise ImportError("NLP_BACKEND=onnx needs optimum[onnxruntime] installed") from e
+    
+    model_class = getattr(ort, ONNX_MODEL_CLASSES[task])
+    cache_root = os.getenv('NLP_ONNX_CACHE_DIR') or \
+        os.path.join(os.path.expanduser('~'), '.cache', 'omnitasker', 'onnx')
+    export_dir = os.path.join(cache_root, model_name.replace('/', '--'))
+    
+    if os.path.isdir(export_dir):
+        return model_class.from_pretrained(export_dir)
+    
+    logger.info(f"Exporting {model_name} to ONNX (first use only)...")
+    model = model_class.from_pretrained(model_name, export=True)
+    # Export next to the target and rename, so an interrupted export is never reused
+    os.makedirs(cache_root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=cache_root, prefix='.export_')
+    try:
+        model.save_pretrained(tmp_dir)
+        os.rename(tmp_dir, export_dir)
+    except OSError:
+        # Another process finished the same export first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(export_dir):
+            raise
+    return model
@@ -0,0 +1,197 @@
+"""
+Micro-batching
+Groups concurrent inference requests into batches run in one forward pass
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Batches' worth of already-queued requests sorted together by length
+BACKLOG_BATCHES = 4
+
+
+class _Request:
+    """One submitted input waiting for its batch"""
+    
+    __slots__ = ('item', 'key', 'length', 'future', 'enqueued')
+    
+    def __init__(self, item: Any, key: Hashable, length: int):
+        self.item = item
+        self.key = key
+        self.length = length
+        self.future = Future()
+        self.enqueued = time.monotonic()
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching in front of a batch inference function
+    
+    Callers submit single inputs and get a Future. A worker thread takes
+    the first waiting request, then keeps collecting until max_batch_size
+    requests are waiting or that request has waited max_wait_ms. While a
+    batch runs, new requests queue up, so under load batches fill without
+    waiting and when idle a lone request is delayed by at most max_wait_ms.
+    
+    Everything already queued at that point is taken too, grouped by key
+    (inputs that must share generation parameters), sorted by length and cut
+    into batches of up to max_batch_size, so inputs of similar length are
+    padded together.
+    """
+    
+    def __init__(self, process_batch: Callable[[List[Any], Hashable], Sequence[Any]],
+                 max_batch_size: int = None, max_wait_ms: float = None,
+                 length_fn: Callable[[Any], int] = len, name: str = 'micro-batcher'):
+        """
+        Initialize the batcher (the worker starts on first submit)
+        
+        Args:
+            process_batch: Called with (inputs, key); returns one result per input
+            max_batch_size: Most inputs run together
+            max_wait_ms: Longest a request waits for others to join its batch
+            length_fn: Input size used to bucket by length
+            name: Worker thread name
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size or int(os.getenv('NLP_BATCH_SIZE', 8))
+        self.max_wait_ms = max_wait_ms if max_wait_ms is not None else \
+            float(os.getenv('NLP_BATCH_WAIT_MS', 20))
+        self.length_fn = length_fn
+        self.name = name
+        
+        self._queue: 'queue.Queue[_Request]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'batched_requests': 0,
+            'failed_batches': 0,
+            'max_batch': 0,
+            'total_wait_ms': 0.0,
+            'total_batch_ms': 0.0,
+        }
+    
+    def submit(self, item: Any, key: Hashable = None) -> Future:
+        """Queue one input; the Future resolves to its result"""
+        request = _Request(item, key, self.length_fn(item))
+        with self._lock:
+            if not self._running:
+                self._start()
+            self._stats['requests'] += 1
+        self._queue.put(request)
+        return request.future
+    
+    def stop(self):
+        """Stop the worker; requests still queued fail with RuntimeError"""
+        with self._lock:
+            self._running = False
+            thread = self._thread
+        if thread:
+            thread.join(timeout=10)
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(RuntimeError(f"{self.name} stopped"))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get request/batch counters and average batch size"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['avg_batch'] = stats['batched_requests'] / stats['batches'] if stats['batches'] else 0.0
+        stats['avg_wait_ms'] = stats['total_wait_ms'] / stats['batched_requests'] \
+            if stats['batched_requests'] else 0.0
+        stats['avg_batch_ms'] = stats['total_batch_ms'] / stats['batches'] if stats['batches'] else 0.0
+        return stats
+    
+    def _start(self):
+        """Start the worker thread (called with the lock held)"""
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+    
+    def _collect(self) -> List[_Request]:
+        """Wait for a request, gather others until a batch is full or its deadline passes,
+        then take whatever else is already queued (up to BACKLOG_BATCHES batches)"""
+        try:
+            first = self._queue.get(timeout=0.5)
+        except queue.Empty:
+            return []
+        collected = [first]
+        deadline = first.enqueued + self.max_wait_ms / 1000
+        while len(collected) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                collected.append(self._queue.get(timeout=remaining) if remaining > 0
+                                 else self._queue.get_nowait())
+            except queue.Empty:
+                return collected
+        while len(collected) < self.max_batch_size * BACKLOG_BATCHES:
+            try:
+                collected.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return collected
+    
+    def _split(self, requests: List[_Request]) -> List[List[_Request]]:
+        """Group requests by key, then cut each group by length into batches"""
+        groups: Dict[Hashable, List[_Request]] = {}
+        for request in requests:
+            groups.setdefault(request.key, []).append(request)
+        
+        batches = []
+        for group in groups.values():
+            group.sort(key=lambda r: r.length)
+            batches.extend(group[i:i + self.max_batch_size]
+                           for i in range(0, len(group), self.max_batch_size))
+        return batches
+    
+    def _process(self, batch: List[_Request]):
+        """Run one batch and resolve its futures"""
+        # Requests cancelled while queued are left out
+        batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        
+        start_time = time.monotonic()
+        try:
+            results = self.process_batch([r.item for r in batch], batch[0].key)
+            if len(results) != len(batch):
+                raise RuntimeError(f"{self.name} returned {len(results)} results for {len(batch)} inputs")
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+            with self._lock:
+                self._stats['failed_batches'] += 1
+            for request in batch:
+                request.future.set_exception(e)
+            return
+        finished = time.monotonic()
+        
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['batched_requests'] += len(batch)
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+            self._stats['total_batch_ms'] += (finished - start_time) * 1000
+            self._stats['total_wait_ms'] += sum((start_time - r.enqueued) * 1000 for r in batch)
+    
+    def _run(self):
+        """Worker loop"""
+        while True:
+            with self._lock:
+                if not self._running:
+                    return
+            for batch in self._split(self._collect()):
+                self._process(batch)
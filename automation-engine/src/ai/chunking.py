@@ -0,0 +1,100 @@
+"""
+Chunking
+Streams text into overlapping windows of tokenizer tokens
+"""
+import io
+from typing import Iterable, Iterator, List, Union
+
+# Characters read from a file-like source at a time
+READ_CHARS = 16384
+
+TextSource = Union[str, io.TextIOBase, Iterable[str]]
+
+
+class TextStats:
+    """Counts characters and tokens seen while a source is streamed"""
+    
+    def __init__(self):
+        self.characters = 0
+        self.tokens = 0
+
+
+def iter_text(source: TextSource, stats: TextStats = None) -> Iterator[str]:
+    """
+    Yield a text source piece by piece
+    
+    Args:
+        source: A string, a file-like object with read(), or an iterable of strings
+        stats: Optional counter of characters yielded
+    """
+    if isinstance(source, str):
+        pieces = (source[i:i + READ_CHARS] for i in range(0, len(source), READ_CHARS))
+    elif hasattr(source, 'read'):
+        pieces = iter(lambda: source.read(READ_CHARS), '')
+    else:
+        pieces = source
+    for piece in pieces:
+        if stats is not None:
+            stats.characters += len(piece)
+        yield piece
+
+
+def iter_token_chunks(pieces: Iterable[str], tokenizer, chunk_tokens: int, overlap: int = 0,
+                      stats: TextStats = None) -> Iterator[List[int]]:
+    """
+    Tokenize streamed text once and yield windows of token IDs
+    
+    Text is cut at whitespace before tokenizing, which matches tokenizing
+    the whole document for tokenizers that attach leading spaces to words
+    (BPE) or split on whitespace (WordPiece, SentencePiece). Each window
+    holds chunk_tokens tokens (the last may be shorter) and repeats the
+    last `overlap` tokens of the previous one, so no sentence loses all
+    of its context at a boundary. Only one window and one read buffer are
+    held at a time.
+    
+    Args:
+        pieces: Text pieces, e.g. from iter_text()
+        tokenizer: Hugging Face tokenizer
+        chunk_tokens: Tokens per window, without special tokens
+        overlap: Tokens repeated from the previous window
+        stats: Optional counter of tokens produced
+    """
+    if not 0 <= overlap < chunk_tokens:
+        raise ValueError(f"Overlap must be between 0 and {chunk_tokens - 1} tokens, not {overlap}")
+    
+    window: List[int] = []
+    emitted = False
+    buffer = ''
+    
+    def tokenize(segment: str) -> List[int]:
+        ids = tokenizer(segment, add_special_tokens=False, verbose=False)['input_ids']
+        if stats is not None:
+            stats.tokens += len(ids)
+        return ids
+    
+    for piece in pieces:
+        buffer += piece
+        # Keep the trailing partial word for the next piece, unless there is
+        # no whitespace at all and the buffer keeps growing
+        cut = max(buffer.rfind(' '), buffer.rfind('\n'), buffer.rfind('\t'))
+        if cut <= 0:
+            if len(buffer) < 4 * READ_CHARS:
+                continue
+            cut = len(buffer)
+        window.extend(tokenize(buffer[:cut]))
+        buffer = buffer[cut:]
+        
+        while len(window) >= chunk_tokens:
+            yield window[:chunk_tokens]
+            emitted = True
+            window = window[chunk_tokens - overlap:]
+    
+    if buffer.strip():
+        window.extend(tokenize(buffer))
+    while len(window) >= chunk_tokens:
+        yield window[:chunk_tokens]
+        emitted = True
+        window = window[chunk_tokens - overlap:]
+    # After a full window the rest starts with `overlap` tokens already sent
+    if len(window) > (overlap if emitted else 0):
+        yield window
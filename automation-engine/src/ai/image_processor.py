@@ -2,6 +2,7 @@
 Image Processor
 Handles image processing and classification tasks
 """
+import os
 import logging
 from typing import Dict, Any, List
 import time
@@ -9,26 +10,58 @@ import cv2
 import numpy as np
 from PIL import Image
 
+from src.ai.result_cache import AIResultCache, digest_file
+
 logger = logging.getLogger(__name__)
 
+CLASSIFICATION_MODEL = 'opencv-basic'
+
 
 class ImageProcessor:
-    """Handles image processing tasks"""
+    """
+    Handles image processing tasks
+    
+    Classification results are cached by image content (see AIResultCache).
+    """
     
-    def __init__(self):
-        """Initialize image processor"""
+    def __init__(self, result_cache: AIResultCache = None):
+        """
+        Initialize image processor
+        
+        Args:
+            result_cache: Result cache (defaults to an in-memory one unless
+                AI_RESULT_CACHE is false)
+        """
+        if result_cache is None and os.getenv('AI_RESULT_CACHE', 'true').lower() == 'true':
+            result_cache = AIResultCache()
+        self.result_cache = result_cache
         logger.info("Image Processor initialized")
     
-    def classify_image(self, image_path: str) -> Dict[str, Any]:
+    def classify_image(self, image_path: str, task_execution_id: str = None) -> Dict[str, Any]:
         """
         Classify image (basic implementation using OpenCV)
         
         Args:
             image_path: Path to image file
-            
+            task_execution_id: Execution cache lookups are recorded against
+        
         Returns:
             Dict containing classification results
         """
+        if self.result_cache is None:
+            return self._classify_image(image_path)
+        try:
+            digest = digest_file(image_path)
+        except OSError:
+            # Unreadable file: let classification report the error
+            return self._classify_image(image_path)
+        return self.result_cache.get_or_compute(
+            'image_classification', CLASSIFICATION_MODEL, {}, digest,
+            lambda: self._classify_image(image_path),
+            task_execution_id=task_execution_id, input_file_path=image_path)
+    
+    def _classify_image(self, image_path: str) -> Dict[str, Any]:
+        """Classify an image without the result cache"""
         start_time = time.time()
         
         try:
@@ -62,7 +95,7 @@ class ImageProcessor:
                 'processing_time_ms': processing_time_ms,
                 'note': 'Basic classification - advanced ML models can be added'
             }
-            
+        
         except Exception as e:
             logger.error(f"Error in image classification: {e}")
             return {
@@ -87,7 +120,7 @@ class ImageProcessor:
         Args:
             image_path: Input image path
             output_path: Output image path
-            
+        
         Returns:
             Dict containing enhancement results
         """
@@ -122,7 +155,7 @@ class ImageProcessor:
                 'enhancements': ['contrast_adjustment', 'denoising'],
                 'processing_time_ms': processing_time_ms
             }
-            
+        
         except Exception as e:
             logger.error(f"Error in image enhancement: {e}")
             return {
@@ -147,14 +180,16 @@ class ImageProcessor:
         else:
             return 'mixed'
     
-    def batch_process(self, image_paths: List[str], operation: str = 'classify') -> List[Dict[str, Any]]:
+    def batch_process(self, image_paths: List[str], operation: str = 'classify',
+                      task_execution_id: str = None) -> List[Dict[str, Any]]:
         """
         Process multiple images in batch
         
         Args:
             image_paths: List of image paths
             operation: Operation to perform ('classify', 'enhance')
-            
+            task_execution_id: Execution cache lookups are recorded against
+        
         Returns:
             List of results for each image
         """
@@ -162,7 +197,7 @@ class ImageProcessor:
         
         for image_path in image_paths:
             if operation == 'classify':
-                result = self.classify_image(image_path)
+                result = self.classify_image(image_path, task_execution_id)
             else:
                 result = {'error': f'Unknown operation: {operation}'}
             
@@ -0,0 +1,188 @@
+"""
+Model Registry
+Process-wide, memory-budgeted store of loaded AI models
+"""
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> 'ModelRegistry':
+    """The process-wide model registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+        return _registry
+
+
+def estimate_model_bytes(model: Any) -> int:
+    """Bytes held by a model's tensors (0 if it is not a torch model)"""
+    # Pipelines wrap the module in .model
+    module = getattr(model, 'model', model)
+    if not hasattr(module, 'state_dict'):
+        return 0
+    # The state dict also covers packed int8 weights, which are not parameters;
+    # tied weights appear under several names, so count each storage once
+    seen = set()
+    total = 0
+    pending = list(module.state_dict().values())
+    while pending:
+        value = pending.pop()
+        if isinstance(value, (tuple, list)):
+            pending.extend(value)
+        elif hasattr(value, 'element_size') and value.data_ptr() not in seen:
+            seen.add(value.data_ptr())
+            total += value.numel() * value.element_size()
+    return total
+
+
+class ModelRegistry:
+    """
+    Loads each model once per process and shares it between callers
+    
+    Models are registered by name with a loader and loaded on first use
+    (or ahead of time with warm_up). When the loaded models exceed the
+    memory budget, the least recently used ones are unloaded; callers
+    still holding a reference keep it alive until they are done, since
+    each lookup returns the model rather than callers keeping their own.
+    
+    Models loaded before worker processes are forked are shared with
+    them copy-on-write instead of each worker loading its own copy.
+    """
+    
+    def __init__(self, budget_bytes: int = None):
+        """
+        Initialize the registry
+        
+        Args:
+            budget_bytes: Memory for loaded models before LRU unloading (0: unlimited)
+        """
+        self.budget_bytes = budget_bytes if budget_bytes is not None else \
+            int(os.getenv('AI_MODEL_MEMORY_MB', 4096)) * 1024 * 1024
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: 'OrderedDict[str, Any]' = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._known_sizes: Dict[str, int] = {}  # Survives unloading, to make room before a reload
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'loads': 0, 'unloads': 0, 'total_load_ms': 0.0}
+    
+    def register(self, name: str, loader: Callable[[], Any]):
+        """Register (or replace) the loader for a model name"""
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+    
+    def get(self, name: str) -> Any:
+        """
+        Get a loaded model, loading it if needed
+        
+        Raises:
+            KeyError: If no loader is registered under name
+        """
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                self._stats['hits'] += 1
+                return self._models[name]
+            if name not in self._loaders:
+                raise KeyError(f"No model registered as {name}")
+            load_lock = self._load_locks[name]
+        
+        # One load per model; other callers wait for it instead of loading a copy
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    self._stats['hits'] += 1
+                    return self._models[name]
+                loader = self._loaders[name]
+                unloaded = self._enforce_budget(keep=name, extra=self._known_sizes.get(name, 0))
+            for victim in unloaded:
+                logger.info(f"Unloaded model {victim} to make room for {name}")
+            
+            logger.info(f"Loading model {name}...")
+            start_time = time.time()
+            model = loader()
+            load_ms = (time.time() - start_time) * 1000
+            size = estimate_model_bytes(model)
+            
+            with self._lock:
+                self._models[name] = model
+                self._sizes[name] = size
+                self._known_sizes[name] = size
+                self._stats['loads'] += 1
+                self._stats['total_load_ms'] += load_ms
+                unloaded = self._enforce_budget(keep=name)
+        logger.info(f"Model {name} loaded in {load_ms:.0f} ms ({size / 1024 / 1024:.0f} MB)")
+        for victim in unloaded:
+            logger.info(f"Unloaded model {victim} to stay within the model memory budget")
+        return model
+    
+    def warm_up(self, names: Iterable[str] = None) -> List[str]:
+        """
+        Load models ahead of their first use
+        
+        Args:
+            names: Models to load (default: every registered model)
+        
+        Returns:
+            Names that were loaded; failures are logged and skipped
+        """
+        with self._lock:
+            names = list(names) if names is not None else list(self._loaders)
+        loaded = []
+        for name in names:
+            try:
+                self.get(name)
+                loaded.append(name)
+            except Exception as e:
+                logger.error(f"Warm-up of model {name} failed: {e}")
+        return loaded
+    
+    def unload(self, name: str = None):
+        """Unload one model, or every model when no name is given"""
+        with self._lock:
+            for victim in ([name] if name is not None else list(self._models)):
+                if self._models.pop(victim, None) is not None:
+                    self._sizes.pop(victim, None)
+                    self._stats['unloads'] += 1
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get load counters and the loaded models with their sizes"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['loaded'] = {name: self._sizes[name] for name in self._models}
+            stats['loaded_bytes'] = sum(self._sizes.values())
+            stats['budget_bytes'] = self.budget_bytes
+            return stats
+    
+    def _enforce_budget(self, keep: str, extra: int = 0) -> List[str]:
+        """
+        Unload least recently used models (never keep) until the loaded ones
+        plus extra bytes fit the budget; called with the lock held
+        """
+        unloaded = []
+        if self.budget_bytes <= 0:
+            return unloaded
+        while sum(self._sizes.values()) + extra > self.budget_bytes:
+            victim = next((name for name in self._models if name != keep), None)
+            if victim is None:
+                break
+            del self._models[victim]
+            del self._sizes[victim]
+            self._stats['unloads'] += 1
+            unloaded.append(victim)
+        if self._sizes.get(keep, 0) > self.budget_bytes:
+            logger.warning(f"Model {keep} alone exceeds the model memory budget "
+                           f"({self._sizes[keep] / 1024 / 1024:.0f} MB)")
+        return unloaded
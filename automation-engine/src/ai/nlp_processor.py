@@ -2,77 +2,291 @@
 NLP Processor
 Handles natural language processing tasks
 """
+import os
 import logging
-from typing import Dict, Any, Optional
-from transformers import pipeline
+import threading
+from collections import deque
+from itertools import chain
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import torch
 import time
 
+from src.ai.backends import default_backend, load_pipeline
+from src.ai.batching import MicroBatcher
+from src.ai.chunking import TextSource, TextStats, iter_text, iter_token_chunks
+from src.ai.model_registry import ModelRegistry, get_model_registry
+from src.ai.result_cache import AIResultCache, digest_text
+
 logger = logging.getLogger(__name__)
 
+SUMMARIZATION_MODEL = 'facebook/bart-large-cnn'
+SENTIMENT_MODEL = 'distilbert-base-uncased-finetuned-sst-2-english'
+
+# Characters of the input recorded with cached results
+INPUT_EXCERPT_CHARS = 1000
+
+_shared_processor = None
+_shared_lock = threading.Lock()
+
+
+# Model -> (pipeline task, Hugging Face model)
+NLP_MODELS = {
+    'summarization': ('summarization', SUMMARIZATION_MODEL),
+    'sentiment': ('sentiment-analysis', SENTIMENT_MODEL),
+}
+
+
+def model_key(model: str, backend: str) -> str:
+    """Registry name of an NLP model on a backend"""
+    return f"{model}:{backend}"
+
+
+def register_models(registry: ModelRegistry, backend: str):
+    """Register the NLP pipelines' loaders for a backend with a model registry"""
+    for model, (task, model_name) in NLP_MODELS.items():
+        registry.register(model_key(model, backend),
+                          lambda task=task, model_name=model_name: load_pipeline(task, model_name, backend))
+
+
+def warm_up_models(names: Iterable[str] = None, backend: str = None) -> List[str]:
+    """
+    Load NLP models into the process-wide registry ahead of first use
+    
+    Args:
+        names: Models to load (default: AI_WARMUP_MODELS, comma-separated,
+            'all' for every NLP model)
+        backend: Backend to load them on (default: NLP_BACKEND)
+    
+    Returns:
+        Registry names that were loaded
+    """
+    backend = backend or default_backend()
+    registry = get_model_registry()
+    register_models(registry, backend)
+    if names is None:
+        names = [n.strip() for n in os.getenv('AI_WARMUP_MODELS', '').split(',') if n.strip()]
+        if names == ['all']:
+            names = list(NLP_MODELS)
+    return registry.warm_up([model_key(name, backend) for name in names])
+
+
+def get_nlp_processor(result_cache: AIResultCache = None) -> 'NLPProcessor':
+    """
+    Process-wide NLPProcessor, so concurrent tasks share models and batches
+    
+    Args:
+        result_cache: Cache used if this call creates the processor
+    """
+    global _shared_processor
+    with _shared_lock:
+        if _shared_processor is None:
+            _shared_processor = NLPProcessor(result_cache=result_cache)
+        return _shared_processor
+
 
 class NLPProcessor:
-    """Handles NLP tasks using transformers"""
+    """
+    Handles NLP tasks using transformers
+    
+    With NLP_BATCHING enabled (the default), concurrent calls on the same
+    processor are grouped into micro-batches, each run through the model in
+    one padded forward pass (see MicroBatcher).
     
-    def __init__(self):
-        """Initialize NLP models"""
-        self.summarizer = None
-        self.sentiment_analyzer = None
+    Documents longer than the summarization model's input are summarized
+    map-reduce style: tokenized once into overlapping windows, each window
+    summarized (in batches), then the joined summaries summarized again
+    until they fit in one window.
+    
+    Results for string inputs are cached by content (see AIResultCache);
+    pass a cache built with a db_manager to share them through ai_results.
+    
+    Models come from the process-wide ModelRegistry on every use, so all
+    processors share one copy and the registry can unload idle ones. They
+    run on the backend chosen by NLP_BACKEND (fp32 PyTorch, int8 or ONNX
+    Runtime); results have the same shape on every backend.
+    """
+    
+    def __init__(self, batching: bool = None, result_cache: AIResultCache = None,
+                 registry: ModelRegistry = None, backend: str = None):
+        """
+        Initialize NLP models
+        
+        Args:
+            batching: Micro-batch concurrent requests (defaults to NLP_BATCHING)
+            result_cache: Result cache (defaults to an in-memory one unless
+                AI_RESULT_CACHE is false)
+            registry: Model registry (defaults to the process-wide one)
+            backend: 'pytorch', 'int8' or 'onnx' (defaults to NLP_BACKEND)
+        """
+        self.backend = backend or default_backend()
+        self.registry = registry or get_model_registry()
+        register_models(self.registry, self.backend)
+        self.batching = batching if batching is not None else \
+            os.getenv('NLP_BATCHING', 'true').lower() == 'true'
+        self.chunk_tokens = int(os.getenv('NLP_CHUNK_TOKENS', 0))  # 0: the model's input size
+        self.chunk_overlap = int(os.getenv('NLP_CHUNK_OVERLAP', 64))
+        if result_cache is None and os.getenv('AI_RESULT_CACHE', 'true').lower() == 'true':
+            result_cache = AIResultCache()
+        self.result_cache = result_cache
+        self._summary_batcher = MicroBatcher(self._summarize_batch, name='nlp-summarize-batcher')
+        self._sentiment_batcher = MicroBatcher(self._sentiment_batch, name='nlp-sentiment-batcher')
         logger.info("NLP Processor initialized (models loaded on-demand)")
     
     def _load_summarizer(self):
-        """Lazy load summarization model"""
-        if self.summarizer is None:
-            logger.info("Loading summarization model...")
-            self.summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
-            logger.info("Summarization model loaded")
+        """Summarization pipeline, loaded on first use"""
+        return self.registry.get(model_key('summarization', self.backend))
     
     def _load_sentiment_analyzer(self):
-        """Lazy load sentiment analysis model"""
-        if self.sentiment_analyzer is None:
-            logger.info("Loading sentiment analysis model...")
-            self.sentiment_analyzer = pipeline("sentiment-analysis")
-            logger.info("Sentiment analysis model loaded")
-    
-    def summarize_text(self, text: str, max_length: int = 150, 
-                      min_length: int = 50) -> Dict[str, Any]:
+        """Sentiment analysis pipeline, loaded on first use"""
+        return self.registry.get(model_key('sentiment', self.backend))
+    
+    def _summarize_batch(self, chunks: List[List[int]], lengths: Tuple[int, int]) -> List[str]:
+        """Summarize token windows sharing (max_length, min_length) in one padded batch"""
+        max_length, min_length = lengths
+        summarizer = self._load_summarizer()
+        tokenizer = summarizer.tokenizer
+        model = summarizer.model
+        inputs = tokenizer.pad(
+            {'input_ids': [tokenizer.build_inputs_with_special_tokens(chunk) for chunk in chunks]},
+            return_tensors='pt'
+        ).to(model.device)
+        with torch.inference_mode():
+            output = model.generate(**inputs, max_length=max_length, min_length=min_length,
+                                    do_sample=False)
+        return tokenizer.batch_decode(output, skip_special_tokens=True)
+    
+    def _window_tokens(self, summarizer) -> int:
+        """Tokens per summarization window, leaving room for special tokens"""
+        tokenizer = summarizer.tokenizer
+        limit = min(tokenizer.model_max_length,
+                    getattr(summarizer.model.config, 'max_position_embeddings', tokenizer.model_max_length))
+        if self.chunk_tokens:
+            limit = min(limit, self.chunk_tokens)
+        return limit - tokenizer.num_special_tokens_to_add()
+    
+    def _summarize_chunks(self, chunks: Iterable[List[int]], max_length: int,
+                          min_length: int) -> List[str]:
+        """Summarize token windows in order, keeping a bounded number in flight"""
+        summaries = []
+        batch_size = self._summary_batcher.max_batch_size
+        if self.batching:
+            in_flight = deque()
+            for chunk in chunks:
+                # A short final window should not be stretched to min_length, and
+                # the map step's reduced max_length caps min_length too
+                key = (max_length, min(min_length, max_length, len(chunk) // 2))
+                in_flight.append(self._summary_batcher.submit(chunk, key=key))
+                if len(in_flight) >= 2 * batch_size:
+                    summaries.append(in_flight.popleft().result())
+            summaries.extend(future.result() for future in in_flight)
+            return summaries
+        
+        batch = []
+        for chunk in chain(chunks, [None]):
+            if chunk is not None:
+                batch.append(chunk)
+            if batch and (chunk is None or len(batch) == batch_size):
+                key = (max_length, min(min_length, max_length, min(len(c) for c in batch) // 2))
+                summaries.extend(self._summarize_batch(batch, key))
+                batch = []
+        return summaries
+    
+    def _sentiment_batch(self, texts: List[str], _key=None) -> List[Dict[str, Any]]:
+        """Classify texts in one padded batch"""
+        return self._load_sentiment_analyzer()(texts, batch_size=len(texts), truncation=True)
+    
+    def get_batching_stats(self) -> Dict[str, Any]:
+        """Get micro-batching counters per model"""
+        return {
+            'summarization': self._summary_batcher.get_stats(),
+            'sentiment': self._sentiment_batcher.get_stats(),
+        }
+    
+    def close(self):
+        """Stop the batching workers"""
+        self._summary_batcher.stop()
+        self._sentiment_batcher.stop()
+    
+    def summarize_text(self, text: TextSource, max_length: int = 150, 
+                      min_length: int = 50, task_execution_id: str = None) -> Dict[str, Any]:
         """
         Summarize text using BART model
         
+        Input longer than the model's window is summarized in full,
+        map-reduce style, without holding the whole document in memory.
+        
         Args:
-            text: Input text to summarize
+            text: Input text to summarize: a string, a text file object, or
+                an iterable of strings (read incrementally; not cached)
             max_length: Maximum length of summary
             min_length: Minimum length of summary
-            
+            task_execution_id: Execution cache lookups are recorded against
+        
         Returns:
             Dict containing summary and metadata
         """
+        if self.result_cache is None or not isinstance(text, str):
+            return self._summarize_text(text, max_length, min_length)
+        params = {'max_length': max_length, 'min_length': min_length, 'backend': self.backend,
+                  'chunk_tokens': self.chunk_tokens, 'chunk_overlap': self.chunk_overlap}
+        return self.result_cache.get_or_compute(
+            'nlp_summary', SUMMARIZATION_MODEL, params, digest_text(text),
+            lambda: self._summarize_text(text, max_length, min_length),
+            task_execution_id=task_execution_id, input_data=text[:INPUT_EXCERPT_CHARS])
+    
+    def _summarize_text(self, text: TextSource, max_length: int, min_length: int) -> Dict[str, Any]:
+        """Summarize text without the result cache"""
         start_time = time.time()
         
         try:
-            self._load_summarizer()
+            summarizer = self._load_summarizer()
+            tokenizer = summarizer.tokenizer
+            window = self._window_tokens(summarizer)
+            # Map summaries must be much shorter than a window for the reduce to converge
+            map_max_length = min(max_length, window // 4)
+            stats = TextStats()
             
-            # Truncate input if too long (BART has max 1024 tokens)
-            if len(text.split()) > 1000:
-                text = ' '.join(text.split()[:1000])
+            chunks = iter_token_chunks(iter_text(text, stats), tokenizer, window,
+                                       min(self.chunk_overlap, window // 2), stats)
+            first = next(chunks, None)
+            if first is None:
+                raise ValueError("No text to summarize")
+            second = next(chunks, None)
             
-            # Generate summary
-            result = self.summarizer(
-                text,
-                max_length=max_length,
-                min_length=min_length,
-                do_sample=False
-            )
+            chunk_count = 1
+            levels = 0
+            if second is None:
+                summary = self._summarize_chunks([first], max_length, min_length)[0]
+            else:
+                summaries = self._summarize_chunks(chain([first, second], chunks),
+                                                   map_max_length, min_length)
+                chunk_count = len(summaries)
+                levels = 1
+                while True:
+                    joined = tokenizer(' '.join(summaries), add_special_tokens=False,
+                                       verbose=False)['input_ids']
+                    if len(joined) <= window:
+                        summary = self._summarize_chunks([joined], max_length, min_length)[0]
+                        break
+                    summaries = self._summarize_chunks(
+                        (joined[i:i + window] for i in range(0, len(joined), window)),
+                        map_max_length, min_length)
+                    levels += 1
             
             processing_time_ms = int((time.time() - start_time) * 1000)
             
             return {
-                'summary': result[0]['summary_text'],
-                'original_length': len(text),
-                'summary_length': len(result[0]['summary_text']),
+                'summary': summary,
+                'original_length': stats.characters,
+                'summary_length': len(summary),
+                'input_tokens': stats.tokens,
+                'chunks': chunk_count,
+                'reduce_levels': levels,
                 'processing_time_ms': processing_time_ms,
-                'model': 'facebook/bart-large-cnn'
+                'model': SUMMARIZATION_MODEL,
+                'backend': self.backend
             }
-            
+        
         except Exception as e:
             logger.error(f"Error in text summarization: {e}")
             return {
@@ -80,16 +294,26 @@ class NLPProcessor:
                 'processing_time_ms': int((time.time() - start_time) * 1000)
             }
     
-    def analyze_sentiment(self, text: str) -> Dict[str, Any]:
+    def analyze_sentiment(self, text: str, task_execution_id: str = None) -> Dict[str, Any]:
         """
         Analyze sentiment of text
         
         Args:
             text: Input text to analyze
-            
+            task_execution_id: Execution cache lookups are recorded against
+        
         Returns:
             Dict containing sentiment label and score
         """
+        if self.result_cache is None:
+            return self._analyze_sentiment(text)
+        return self.result_cache.get_or_compute(
+            'sentiment_analysis', SENTIMENT_MODEL, {'backend': self.backend}, digest_text(text),
+            lambda: self._analyze_sentiment(text),
+            task_execution_id=task_execution_id, input_data=text[:INPUT_EXCERPT_CHARS])
+    
+    def _analyze_sentiment(self, text: str) -> Dict[str, Any]:
+        """Analyze sentiment without the result cache"""
         start_time = time.time()
         
         try:
@@ -99,7 +323,10 @@ class NLPProcessor:
             if len(text.split()) > 500:
                 text = ' '.join(text.split()[:500])
             
-            result = self.sentiment_analyzer(text)[0]
+            if self.batching:
+                result = self._sentiment_batcher.submit(text).result()
+            else:
+                result = self._sentiment_batch([text])[0]
             
             processing_time_ms = int((time.time() - start_time) * 1000)
             
@@ -107,9 +334,10 @@ class NLPProcessor:
                 'sentiment': result['label'],
                 'confidence': result['score'],
                 'processing_time_ms': processing_time_ms,
-                'model': 'distilbert-base-uncased-finetuned-sst-2-english'
+                'model': SENTIMENT_MODEL,
+                'backend': self.backend
             }
-            
+        
         except Exception as e:
             logger.error(f"Error in sentiment analysis: {e}")
             return {
@@ -0,0 +1,196 @@
+"""
+AI Result Cache
+Content-addressed cache of AI processor results
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bytes read at a time when hashing input files
+HASH_BLOCK = 1024 * 1024
+
+
+def digest_text(text: str) -> str:
+    """SHA-256 of a text input"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def digest_file(path: str) -> str:
+    """SHA-256 of a file's content, read in blocks"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class AIResultCache:
+    """
+    Results keyed by (operation, model, params, SHA-256 of the input)
+    
+    Two tiers: an in-memory LRU bounded by the serialized size of its
+    results, and, with a db_manager, the ai_results table. Every lookup is
+    recorded there through save_ai_result with metadata {cache_key,
+    cache_hit, cache_tier}, so computed results become the database tier
+    (found via the cache_key index) and hits can be tracked per execution.
+    Results containing an 'error' are never cached.
+    """
+    
+    def __init__(self, db_manager=None, max_bytes: int = None, db_max_age_days: int = None):
+        """
+        Initialize the cache
+        
+        Args:
+            db_manager: DatabaseManager for the ai_results tier (None: memory only)
+            max_bytes: Serialized result bytes kept in memory
+            db_max_age_days: Ignore database results older than this (0 for no limit)
+        """
+        self.db_manager = db_manager
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(os.getenv('AI_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        self.db_max_age_days = db_max_age_days if db_max_age_days is not None else \
+            int(os.getenv('AI_CACHE_DB_MAX_AGE_DAYS', 30))
+        
+        self._entries: 'OrderedDict[str, Tuple[Dict[str, Any], int]]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'database_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'record_errors': 0,
+        }
+    
+    @staticmethod
+    def make_key(operation: str, model: str, params: Dict[str, Any], input_digest: str) -> str:
+        """Cache key for an operation on an input"""
+        identity = json.dumps([operation, model, params, input_digest], sort_keys=True, default=str)
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+    
+    def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Look a result up in memory, then in the database
+        
+        Returns:
+            (result, tier) with tier 'memory' or 'database', (None, None) on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                return dict(entry[0]), 'memory'
+        
+        if self.db_manager is not None:
+            try:
+                result = self.db_manager.find_ai_result(key, self.db_max_age_days)
+            except Exception as e:
+                logger.warning(f"AI result cache lookup failed: {e}")
+                result = None
+            if result is not None:
+                self.put(key, result)
+                with self._lock:
+                    self._stats['database_hits'] += 1
+                return dict(result), 'database'
+        
+        with self._lock:
+            self._stats['misses'] += 1
+        return None, None
+    
+    def put(self, key: str, result: Dict[str, Any]):
+        """Keep a result in memory, evicting least recently used ones over max_bytes"""
+        size = len(json.dumps(result, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (dict(result), size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self._stats['evictions'] += 1
+    
+    def get_or_compute(self, operation: str, model: str, params: Dict[str, Any], input_digest: str,
+                       compute: Callable[[], Dict[str, Any]], task_execution_id: str = None,
+                       input_data: str = None, input_file_path: str = None) -> Dict[str, Any]:
+        """
+        Return the cached result for an input, computing and caching it on a miss
+        
+        Hits come back with cached=True, cache_tier and the lookup time as
+        processing_time_ms.
+        
+        Args:
+            operation: ai_results.ai_type of the operation
+            model: Model name (part of the key)
+            params: Parameters that change the output (part of the key)
+            input_digest: SHA-256 of the input (digest_text / digest_file)
+            compute: Produces the result on a miss
+            task_execution_id: Execution the lookup is recorded against
+            input_data: Input excerpt recorded with the result
+            input_file_path: Input file recorded with the result
+        """
+        start_time = time.time()
+        key = self.make_key(operation, model, params, input_digest)
+        result, tier = self.get(key)
+        
+        if result is None:
+            result = compute()
+            if 'error' in result:
+                return result
+            self.put(key, result)
+        else:
+            result.update({
+                'cached': True,
+                'cache_tier': tier,
+                'processing_time_ms': int((time.time() - start_time) * 1000),
+            })
+        
+        self._record(key, tier, operation, model, result, task_execution_id, input_data, input_file_path)
+        return result
+    
+    def clear(self):
+        """Drop every in-memory result"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and memory usage"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['memory_hits'] + stats['database_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['database_hits']) / lookups if lookups else 0.0
+        return stats
+    
+    def _record(self, key: str, tier: Optional[str], operation: str, model: str,
+                result: Dict[str, Any], task_execution_id: str, input_data: str,
+                input_file_path: str):
+        """Save the lookup to ai_results; failures only cost tracking"""
+        if self.db_manager is None:
+            return
+        try:
+            self.db_manager.save_ai_result(
+                task_execution_id, operation, input_data, result,
+                confidence_score=result.get('confidence'),
+                processing_time_ms=result.get('processing_time_ms'),
+                model_name=model,
+                input_file_path=input_file_path,
+                metadata={'cache_key': key, 'cache_hit': tier is not None, 'cache_tier': tier}
+            )
+        except Exception as e:
+            with self._lock:
+                self._stats['record_errors'] += 1
+            logger.warning(f"Could not record AI result for cache key {key[:12]}: {e}")
@@ -0,0 +1,18 @@
+"""
+Model Warm-up
+Importing this module loads the models named in AI_WARMUP_MODELS
+"""
+import logging
+
+from src.ai.nlp_processor import warm_up_models
+
+logger = logging.getLogger(__name__)
+
+# Imported by the Python worker pool's forkserver, so workers forked from it
+# share these weights copy-on-write instead of loading their own copies. A
+# failure must not stop the forkserver (and with it every Python task), so
+# models that did not load are loaded on first use instead.
+try:
+    warm_up_models()
+except Exception as e:
+    logger.error(f"Model warm-up failed: {e}")
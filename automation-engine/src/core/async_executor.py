@@ -0,0 +1,325 @@
+"""
+Async Task Runner
+Supervises task subprocesses on a single asyncio event loop
+"""
+import os
+import sys
+import codecs
+import asyncio
+import logging
+import threading
+import subprocess
+import concurrent.futures
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from src.core.output_capture import ExecutionLogWriter, create_outputs, READ_SIZE
+from src.core.worker_pool import parse_type_limits
+
+logger = logging.getLogger(__name__)
+
+
+async def run_process_async(cmd: List[str], timeout: float = 300,
+                            log_writer: Optional[ExecutionLogWriter] = None,
+                            head_size: int = None, tail_size: int = None) -> Tuple[int, str, str]:
+    """
+    Run a command as an asyncio subprocess, reading stdout/stderr incrementally
+    
+    Behaves like output_capture.run_process but holds no thread while the
+    process runs. Log chunks are written on the loop's default executor.
+    
+    Args:
+        cmd: Command and arguments
+        timeout: Seconds before the process is killed
+        log_writer: Optional writer receiving every output chunk
+        head_size: Characters kept from the start of each stream
+        tail_size: Characters kept from the end of each stream
+    
+    Returns:
+        Tuple of (exit_code, stdout, stderr) with the retained output
+    
+    Raises:
+        subprocess.TimeoutExpired: If the process runs longer than timeout
+    """
+    outputs = create_outputs(head_size, tail_size)
+    loop = asyncio.get_running_loop()
+    # Chunks must reach the database in sequence order
+    store_lock = asyncio.Lock()
+    
+    async def store(rows):
+        if not rows:
+            return
+        async with store_lock:
+            await loop.run_in_executor(None, log_writer.store, rows)
+    
+    async def pump(stream: str, reader: asyncio.StreamReader):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        while True:
+            data = await reader.read(READ_SIZE)
+            text = decoder.decode(data, final=not data)
+            if text:
+                outputs[stream].write(text)
+                if log_writer:
+                    await store(log_writer.buffer(stream, text))
+            if not data:
+                break
+    
+    async def flush_periodically():
+        # Quiet processes still reach followers once the flush interval passes
+        while True:
+            await asyncio.sleep(log_writer.flush_interval)
+            await store(log_writer.take(only_if_due=True))
+    
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    readers = asyncio.gather(pump('stdout', process.stdout), pump('stderr', process.stderr))
+    flusher = asyncio.ensure_future(flush_periodically()) if log_writer else None
+    
+    reader_timeout = None
+    try:
+        await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        # Orphaned grandchildren may keep the pipes open
+        reader_timeout = 5
+        raise subprocess.TimeoutExpired(cmd, timeout)
+    finally:
+        try:
+            await asyncio.wait_for(readers, reader_timeout)
+        except asyncio.TimeoutError:
+            readers.cancel()
+        if flusher:
+            flusher.cancel()
+            await store(log_writer.take())
+    
+    return process.returncode, outputs['stdout'].getvalue(), outputs['stderr'].getvalue()
+
+
+class AsyncTaskRunner:
+    """
+    Runs task executions as coroutines on a dedicated event loop thread
+    
+    Drop-in replacement for TaskWorkerPool. A running task costs a coroutine
+    and its pipes rather than a thread, so thousands of mostly idle scripts
+    can be supervised at once. Blocking work (database calls, log writes)
+    runs on a small thread pool set as the loop's default executor; in-process
+    Lua runs on the Lua pool's own threads so it cannot starve that pool.
+    """
+    
+    def __init__(self, task_executor, max_concurrency: int = None,
+                 max_queue_size: int = None, type_limits: Dict[str, int] = None,
+                 blocking_threads: int = None):
+        """
+        Initialize the async runner
+        
+        Args:
+            task_executor: TaskExecutor used to run each task
+            max_concurrency: Number of tasks running at once
+            max_queue_size: Number of tasks allowed to wait for a free slot
+            type_limits: Maximum parallelism per script_type
+            blocking_threads: Threads available for database and other blocking calls
+        """
+        self.task_executor = task_executor
+        self.max_concurrency = max_concurrency or int(os.getenv('TASK_ASYNC_CONCURRENCY', 1000))
+        self.max_queue_size = max_queue_size if max_queue_size is not None else \
+            int(os.getenv('TASK_WORKER_QUEUE_SIZE', 100))
+        self.type_limits = type_limits if type_limits is not None else \
+            parse_type_limits(os.getenv('TASK_TYPE_CONCURRENCY', ''))
+        # Defaults to the database pool size; more threads would only wait for connections
+        self.blocking_threads = blocking_threads or int(os.getenv('TASK_ASYNC_THREADS', 10))
+        
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = None
+        self._blocking_executor = None
+        # Admission slots: running + queued tasks, used for backpressure
+        self._slots = threading.BoundedSemaphore(self.max_concurrency + self.max_queue_size)
+        self._lock = threading.Lock()
+        self._queued: Dict[str, int] = {}
+        self._running: Dict[str, int] = {}
+        self._admitted = 0
+        self._futures = set()
+        self._accepting = False
+        # Created on the loop thread in _setup
+        self._concurrency = None
+        self._type_semaphores: Dict[str, asyncio.Semaphore] = {}
+    
+    def start(self):
+        """Start the event loop thread"""
+        with self._lock:
+            if self._accepting:
+                return
+            self._accepting = True
+        
+        self.loop = asyncio.new_event_loop()
+        self._blocking_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.blocking_threads,
+            thread_name_prefix='engine-blocking'
+        )
+        self.loop.set_default_executor(self._blocking_executor)
+        self._install_child_watcher()
+        
+        self._loop_thread = threading.Thread(target=self.loop.run_forever,
+                                             name='engine-event-loop', daemon=True)
+        self._loop_thread.start()
+        self.run_coroutine(self._setup()).result()
+        
+        logger.info(f"Async task runner started (concurrency: {self.max_concurrency}, "
+                    f"blocking threads: {self.blocking_threads}, "
+                    f"type limits: {self.type_limits or 'none'})")
+    
+    def run_coroutine(self, coro) -> concurrent.futures.Future:
+        """Schedule a coroutine on the runner's loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def call_soon(self, callback: Callable, *args):
+        """Schedule a callback on the runner's loop from any thread"""
+        self.loop.call_soon_threadsafe(callback, *args)
+    
+    def submit(self, task_id: str, script_type: str, triggered_by: str = 'manual',
+               on_complete: Callable[[Optional[str]], None] = None,
+               timeout: float = None) -> bool:
+        """
+        Queue a task for execution
+        
+        Blocks for up to `timeout` seconds while the runner is full; from the
+        loop thread itself it never blocks.
+        
+        Args:
+            task_id: UUID of the task to execute
+            script_type: Script type of the task, used for per-type limits
+            triggered_by: Source that triggered the execution
+            on_complete: Optional callback receiving the execution ID
+            timeout: Seconds to wait for a free slot (None waits forever)
+        
+        Returns:
+            True if the task was queued, False if the runner is full or stopped
+        """
+        if not self._accepting:
+            logger.warning(f"Async runner is not accepting tasks, rejected task {task_id}")
+            return False
+        
+        if threading.current_thread() is self._loop_thread:
+            timeout = 0
+        if not self._slots.acquire(timeout=timeout):
+            logger.warning(f"Async runner is full, could not queue task {task_id}")
+            return False
+        
+        with self._lock:
+            if not self._accepting:
+                self._slots.release()
+                return False
+            self._admitted += 1
+            self._queued[script_type] = self._queued.get(script_type, 0) + 1
+        
+        future = self.run_coroutine(self._run(task_id, script_type, triggered_by, on_complete))
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard_future)
+        return True
+    
+    def shutdown(self, wait: bool = True, timeout: float = None):
+        """
+        Stop accepting tasks, drain running ones and stop the loop
+        
+        Args:
+            wait: Whether to wait for queued and running tasks to finish
+            timeout: Maximum seconds to wait for the drain
+        """
+        with self._lock:
+            self._accepting = False
+            futures = list(self._futures)
+        if self.loop is None:
+            return
+        
+        if wait and futures:
+            _, not_done = concurrent.futures.wait(futures, timeout=timeout)
+            if not_done:
+                logger.warning(f"{len(not_done)} async tasks still running after drain timeout")
+        
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._loop_thread.join(timeout=5)
+        self._blocking_executor.shutdown(wait=wait)
+        if not self.loop.is_running():
+            self.loop.close()
+        self.loop = None
+        logger.info("Async task runner stopped")
+    
+    def available_slots(self) -> int:
+        """Number of tasks that can be submitted without blocking"""
+        with self._lock:
+            if not self._accepting:
+                return 0
+            return self.max_concurrency + self.max_queue_size - self._admitted
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get current queue and running counts per script type"""
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'queued': {t: n for t, n in self._queued.items() if n},
+                'running': {t: n for t, n in self._running.items() if n},
+            }
+    
+    async def _setup(self):
+        """Create loop-bound primitives"""
+        self._concurrency = asyncio.Semaphore(self.max_concurrency)
+    
+    def _install_child_watcher(self):
+        """Watch child processes through pidfds instead of a thread per child"""
+        # Python 3.12+ already prefers pidfds and deprecates child watchers
+        if sys.version_info >= (3, 12) or not hasattr(os, 'pidfd_open'):
+            return
+        try:
+            watcher = asyncio.PidfdChildWatcher()
+            watcher.attach_loop(self.loop)
+            asyncio.get_event_loop_policy().set_child_watcher(watcher)
+        except Exception as e:
+            logger.warning(f"pidfd child watcher unavailable, using threaded watcher: {e}")
+    
+    def _discard_future(self, future: concurrent.futures.Future):
+        """Forget a finished task future"""
+        with self._lock:
+            self._futures.discard(future)
+    
+    async def _run(self, task_id: str, script_type: str, triggered_by: str,
+                   on_complete: Optional[Callable]):
+        """Run one task once global and per-type capacity allows"""
+        type_semaphore = self._type_semaphores.get(script_type)
+        if type_semaphore is None and script_type in self.type_limits:
+            type_semaphore = asyncio.Semaphore(self.type_limits[script_type])
+            self._type_semaphores[script_type] = type_semaphore
+        
+        execution_id = None
+        try:
+            # Wait for the type limit first so blocked types do not hold global slots
+            if type_semaphore is not None:
+                await type_semaphore.acquire()
+            try:
+                async with self._concurrency:
+                    with self._lock:
+                        self._queued[script_type] -= 1
+                        self._running[script_type] = self._running.get(script_type, 0) + 1
+                    try:
+                        execution_id = await self.task_executor.execute_task_async(
+                            task_id=task_id,
+                            triggered_by=triggered_by
+                        )
+                    except Exception as e:
+                        logger.error(f"Unhandled error executing task {task_id}: {e}")
+                    finally:
+                        with self._lock:
+                            self._running[script_type] -= 1
+            finally:
+                if type_semaphore is not None:
+                    type_semaphore.release()
+        finally:
+            with self._lock:
+                self._admitted -= 1
+            self._slots.release()
+        
+        if on_complete:
+            try:
+                on_complete(execution_id)
+            except Exception as e:
+                logger.error(f"Error in completion callback for task {task_id}: {e}")
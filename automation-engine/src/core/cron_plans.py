@@ -0,0 +1,184 @@
+"""
+Cron Plans
+Compiled cron expression cache and batch next-run computation
+"""
+import os
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Sequence, Tuple
+import numpy as np
+import pytz
+from croniter import croniter
+
+logger = logging.getLogger(__name__)
+
+# Fire times are handled as naive UTC datetime64 values with microsecond precision
+DATETIME_UNIT = 'datetime64[us]'
+
+
+def to_datetime64(value: datetime) -> np.datetime64:
+    """Convert an aware datetime to naive UTC datetime64"""
+    return np.datetime64(value.astimezone(pytz.UTC).replace(tzinfo=None), 'us')
+
+
+def from_datetime64(value: np.datetime64) -> datetime:
+    """Convert naive UTC datetime64 back to an aware UTC datetime"""
+    return pytz.UTC.localize(value.astype('datetime64[us]').item())
+
+
+class CronPlan:
+    """A parsed cron expression bound to a timezone"""
+    
+    def __init__(self, cron_expression: str, timezone: str):
+        """Parse the cron expression and resolve the timezone once"""
+        self.cron_expression = cron_expression
+        self.timezone = pytz.timezone(timezone)
+        self._cron = croniter(cron_expression, datetime.now(self.timezone))
+        # croniter instances are stateful; serialize access to the shared one
+        self._lock = threading.Lock()
+    
+    def next_run(self, base_time: datetime) -> datetime:
+        """Get the first fire time after base_time, in UTC"""
+        with self._lock:
+            self._cron.set_current(base_time.astimezone(self.timezone), force=True)
+            next_run_local = self._cron.get_next(datetime)
+        return next_run_local.astimezone(pytz.UTC)
+    
+    def fire_times(self, start: datetime, end: datetime, max_count: int) -> np.ndarray:
+        """
+        Get fire times after start, up to and including the first one past end
+        
+        Returns:
+            datetime64 array, or None if more than max_count fire times are needed
+        """
+        times = []
+        end_utc = end.astimezone(pytz.UTC)
+        with self._lock:
+            self._cron.set_current(start.astimezone(self.timezone), force=True)
+            while len(times) < max_count:
+                fire = self._cron.get_next(datetime).astimezone(pytz.UTC)
+                times.append(fire.replace(tzinfo=None))
+                if fire > end_utc:
+                    return np.array(times, dtype=DATETIME_UNIT)
+        return None
+
+
+class CronPlanCache:
+    """LRU cache of compiled cron plans keyed by (expression, timezone)"""
+    
+    def __init__(self, max_size: int = None, max_span_steps: int = 1024):
+        """
+        Initialize cron plan cache
+        
+        Args:
+            max_size: Maximum number of compiled plans to keep
+            max_span_steps: Largest fire-time sequence generated for one batch
+                group before falling back to per-schedule computation
+        """
+        self.max_size = max_size or int(os.getenv('CRON_PLAN_CACHE_SIZE', 4096))
+        self.max_span_steps = max_span_steps
+        self._plans: 'OrderedDict[Tuple[str, str], CronPlan]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get_plan(self, cron_expression: str, timezone: str) -> CronPlan:
+        """Get the compiled plan for an expression, compiling it on a miss"""
+        key = (cron_expression, timezone)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+        
+        plan = CronPlan(cron_expression, timezone)
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+                self.evictions += 1
+        return plan
+    
+    def next_run(self, cron_expression: str, timezone: str, base_time: datetime) -> datetime:
+        """Calculate the next run time for a single schedule"""
+        return self.get_plan(cron_expression, timezone).next_run(base_time)
+    
+    def next_runs(self, cron_expressions: Sequence[str], timezones: Sequence[str],
+                  base_times) -> np.ndarray:
+        """
+        Calculate next run times for many schedules in one call
+        
+        Schedules sharing an (expression, timezone) pair are grouped. A group
+        with a single base time is computed once and broadcast; otherwise one
+        fire-time sequence covering all base times is generated and each
+        schedule's next run is found with a vectorized searchsorted.
+        
+        Args:
+            cron_expressions: Cron expression per schedule
+            timezones: Timezone name per schedule
+            base_times: One aware datetime for all schedules, or a sequence of
+                aware datetimes / a datetime64 array (naive UTC) per schedule
+        
+        Returns:
+            datetime64[us] array of next run times in naive UTC. Schedules whose
+            expression fails to compile get base time + 1 hour.
+        """
+        count = len(cron_expressions)
+        if isinstance(base_times, datetime):
+            bases = np.full(count, to_datetime64(base_times), dtype=DATETIME_UNIT)
+        elif isinstance(base_times, np.ndarray):
+            bases = base_times.astype(DATETIME_UNIT)
+        else:
+            bases = np.array([to_datetime64(b) for b in base_times], dtype=DATETIME_UNIT)
+        
+        groups: Dict[Tuple[str, str], List[int]] = {}
+        for i, key in enumerate(zip(cron_expressions, timezones)):
+            groups.setdefault(key, []).append(i)
+        
+        result = np.empty(count, dtype=DATETIME_UNIT)
+        for (cron_expression, timezone), indices in groups.items():
+            index = np.asarray(indices)
+            group_bases = bases[index]
+            try:
+                plan = self.get_plan(cron_expression, timezone)
+                result[index] = self._group_next_runs(plan, group_bases)
+            except Exception as e:
+                logger.error(f"Error calculating next run for '{cron_expression}' ({timezone}): {e}")
+                result[index] = group_bases + np.timedelta64(1, 'h')
+        return result
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache size and hit/miss counters"""
+        with self._lock:
+            return {
+                'size': len(self._plans),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+    
+    def _group_next_runs(self, plan: CronPlan, bases: np.ndarray) -> np.ndarray:
+        """Next run times for base times that share one plan"""
+        earliest, latest = bases.min(), bases.max()
+        if earliest == latest:
+            return np.full(len(bases), to_datetime64(plan.next_run(from_datetime64(earliest))),
+                           dtype=DATETIME_UNIT)
+        
+        fires = plan.fire_times(
+            from_datetime64(earliest) - timedelta(microseconds=1),
+            from_datetime64(latest),
+            self.max_span_steps
+        )
+        if fires is None:
+            # Base times too far apart for one sequence
+            return np.array([to_datetime64(plan.next_run(from_datetime64(b))) for b in bases],
+                            dtype=DATETIME_UNIT)
+        
+        return fires[np.searchsorted(fires, bases, side='right')]
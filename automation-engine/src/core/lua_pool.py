@@ -0,0 +1,423 @@
+"""
+Lua Runtime Pool
+Reusable Lua states with per-use sandboxed globals and a compiled chunk cache
+"""
+import os
+import time
+import queue
+import asyncio
+import hashlib
+import logging
+import functools
+import threading
+import subprocess
+import concurrent.futures
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Tuple, Callable
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_lua_pool() -> 'LuaRuntimePool':
+    """The process-wide Lua runtime pool shared by tasks and plugins"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LuaRuntimePool()
+        return _pool
+
+
+# Runs once per Lua state. Returns helpers that compile a chunk without binding
+# it to the shared globals and give it a fresh environment on each use; lookups
+# fall through to a snapshot of the standard globals taken before any script ran.
+# Library tables (string, table, math, os, ...) are copied into every environment,
+# so a script that changes them only changes its own copies. A count hook
+# enforces the run's deadline, also inside coroutines the script creates.
+LUA_PRELUDE = """
+local pristine, libraries = {}, {}
+for k, v in pairs(_G) do
+    if type(v) == 'table' and k ~= '_G' then
+        libraries[k] = v
+    else
+        pristine[k] = v
+    end
+end
+local setfenv, loadstring, load = setfenv, loadstring, load
+local setupvalue = debug.setupvalue
+local pairs, require, setmetatable = pairs, require, setmetatable
+local sethook, clock, error, create, resume = debug.sethook, os.time, error, coroutine.create, coroutine.resume
+local HOOK_INSTRUCTIONS = 10000
+
+-- String methods resolve through this metatable; it is pointed at each run's
+-- copy of the string library and hidden from getmetatable()
+local string_meta = getmetatable('')
+string_meta.__metatable = false
+
+local function copy(t)
+    local c = {}
+    for k, v in pairs(t) do c[k] = v end
+    return c
+end
+
+-- os.time() has one-second resolution, which is plenty for script timeouts
+local deadline
+local function check_deadline()
+    if deadline and clock() > deadline then
+        error('script timed out', 2)
+    end
+end
+
+local function set_deadline(seconds)
+    if seconds then
+        deadline = clock() + seconds
+        sethook(check_deadline, '', HOOK_INSTRUCTIONS)
+    else
+        deadline = nil
+        sethook()
+    end
+end
+
+local function hooked_create(fn)
+    local co = create(fn)
+    if deadline then sethook(co, check_deadline, '', HOOK_INSTRUCTIONS) end
+    return co
+end
+
+local function unwrap(ok, ...)
+    if not ok then error((...), 0) end
+    return ...
+end
+
+local function compile(source, name)
+    local fn, err
+    if setfenv then
+        fn, err = loadstring(source, '=' .. name)
+    else
+        fn, err = load(source, '=' .. name, 't', {})
+    end
+    return fn, err
+end
+
+local function sandbox(fn, output, on_print)
+    local env = setmetatable({}, {__index = pristine})
+    for name, lib in pairs(libraries) do env[name] = copy(lib) end
+    env._G = env
+    string_meta.__index = env.string
+    env.coroutine.create = hooked_create
+    env.coroutine.wrap = function(fn)
+        local co = hooked_create(fn)
+        return function(...) return unwrap(resume(co, ...)) end
+    end
+    if env.package then
+        local loaded = copy(libraries.package.loaded)
+        for name in pairs(libraries) do
+            if loaded[name] ~= nil then loaded[name] = env[name] end
+        end
+        loaded._G = env
+        env.package.loaded = loaded
+        env.require = function(name)
+            local lib = loaded[name]
+            if lib ~= nil then return lib end
+            return require(name)
+        end
+    end
+    env.print = function(...)
+        for i = 1, select('#', ...) do
+            local line = tostring((select(i, ...)))
+            output[#output + 1] = line
+            if on_print then on_print(line) end
+        end
+    end
+    if setfenv then
+        setfenv(fn, env)
+    else
+        -- The first upvalue of a main chunk is its _ENV
+        setupvalue(fn, 1, env)
+    end
+    return env
+end
+
+return compile, sandbox, set_deadline
+"""
+
+
+class LuaState:
+    """One Lua runtime with its own compiled chunk cache"""
+    
+    def __init__(self, chunk_cache_size: int):
+        """Create the runtime and install the sandbox helpers"""
+        from lupa import LuaRuntime
+        
+        self.lua = LuaRuntime(unpack_returned_tuples=True)
+        self._compile, self._sandbox, self.set_deadline = self.lua.execute(LUA_PRELUDE)
+        self.lua_type = self.lua.eval('type')
+        self._chunks: 'OrderedDict[Any, Any]' = OrderedDict()
+        self.chunk_cache_size = chunk_cache_size
+        self.uses = 0
+        self.last_hit = False  # Whether the last run used a cached chunk
+    
+    def run(self, key, name: str, load_source: Callable[[], str],
+            timeout: float = None, on_print: Callable[[str], None] = None) -> Tuple[Any, List[str]]:
+        """
+        Run a chunk in a fresh environment
+        
+        Args:
+            key: Cache key identifying this version of the chunk
+            name: Chunk name used in Lua error messages
+            load_source: Returns the source when the chunk is not cached
+            timeout: Seconds Lua code may run from now until set_deadline(None)
+            on_print: Called with each printed line as it is printed
+        
+        Returns:
+            Tuple of (environment after the chunk ran, printed output lines)
+        """
+        chunk = self.compile(key, name, load_source)
+        output = self.lua.table()
+        env = self._sandbox(chunk, output, on_print)
+        self.set_deadline(timeout)
+        chunk()
+        return env, output
+    
+    def compile(self, key, name: str, load_source: Callable[[], str]):
+        """
+        Get the compiled chunk for a key, compiling it on a miss
+        
+        Raises:
+            SyntaxError: If the source does not compile
+        """
+        chunk = self._chunks.get(key)
+        if chunk is None:
+            chunk, error = self._compile(load_source(), name)
+            if chunk is None:
+                raise SyntaxError(error)
+            self._chunks[key] = chunk
+            while len(self._chunks) > self.chunk_cache_size:
+                self._chunks.popitem(last=False)
+            self.last_hit = False
+        else:
+            self._chunks.move_to_end(key)
+            self.last_hit = True
+        return chunk
+    
+    def to_python(self, value, depth: int = 0):
+        """Copy a Lua value into plain Python objects so it can leave the pool"""
+        if self.lua_type(value) != 'table' or depth > 32:
+            return value
+        items = [(k, self.to_python(v, depth + 1)) for k, v in value.items()]
+        if all(isinstance(k, int) for k, _ in items) and \
+                sorted(k for k, _ in items) == list(range(1, len(items) + 1)):
+            return [v for _, v in sorted(items, key=lambda item: item[0])]
+        return {k: v for k, v in items}
+
+
+class LuaRuntimePool:
+    """
+    Pool of pre-initialized Lua states shared by tasks and plugins
+    
+    Lua runs in-process, so every run has a deadline (enforced by an
+    instruction count hook) and waiting for a free state is bounded by
+    checkout_timeout. Async callers run on the pool's own threads, so slow
+    scripts cannot take the event loop's default executor away from
+    database calls and scheduling.
+    """
+    
+    def __init__(self, size: int = None, chunk_cache_size: int = None, max_uses: int = None,
+                 checkout_timeout: float = None):
+        """
+        Initialize the pool
+        
+        Args:
+            size: Maximum number of Lua states (parallel Lua executions)
+            chunk_cache_size: Compiled chunks kept per state
+            max_uses: Uses after which a state is discarded, bounding memory
+                the state accumulates (compiled chunks, interned strings)
+            checkout_timeout: Seconds to wait for a free state
+        """
+        self.size = size or int(os.getenv('LUA_POOL_SIZE', 4))
+        self.chunk_cache_size = chunk_cache_size or int(os.getenv('LUA_CHUNK_CACHE_SIZE', 256))
+        self.max_uses = max_uses or int(os.getenv('LUA_POOL_MAX_USES', 1000))
+        self.checkout_timeout = checkout_timeout or float(os.getenv('LUA_POOL_CHECKOUT_TIMEOUT', 30))
+        # One thread per state; more could only wait for a checkout
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.size,
+            thread_name_prefix='lua-pool'
+        )
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._stats = {'uses': 0, 'states_created': 0, 'states_recycled': 0,
+                       'chunk_hits': 0, 'chunk_misses': 0}
+    
+    @contextmanager
+    def acquire(self, timeout: float = None):
+        """
+        Borrow a Lua state, creating one if the pool is not yet full
+        
+        Raises:
+            TimeoutError: If no state is free within timeout (default checkout_timeout)
+        """
+        state = self._checkout(self.checkout_timeout if timeout is None else timeout)
+        try:
+            yield state
+        finally:
+            self._checkin(state)
+    
+    def execute(self, source: str, name: str = 'script', timeout: float = 300,
+                on_print: Callable[[str], None] = None) -> List[str]:
+        """
+        Run a Lua script and return the lines it printed
+        
+        The chunk is cached by content hash, so a recurring task compiles once per state.
+        on_print, if given, is called with each line as it is printed (on the
+        thread running the script).
+        
+        Raises:
+            subprocess.TimeoutExpired: If the script runs longer than timeout
+            TimeoutError: If no state is free within checkout_timeout
+        """
+        key = ('source', hashlib.sha1(source.encode('utf-8')).hexdigest())
+        with self.acquire() as state:
+            with self._deadline(name, timeout):
+                _, output = self._run(state, key, name, lambda: source, timeout, on_print)
+            return [str(line) for line in output.values()]
+    
+    async def execute_async(self, source: str, name: str = 'script', timeout: float = 300,
+                            on_print: Callable[[str], None] = None) -> List[str]:
+        """Run a Lua script from the event loop on one of the pool's own threads"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            functools.partial(self.execute, source, name, timeout=timeout, on_print=on_print)
+        )
+    
+    def call(self, path: str, function_name: str = 'main',
+             args: Dict[str, Any] = None, timeout: float = 300) -> Tuple[Any, List[str]]:
+        """
+        Load a Lua file and call one of the functions it defines
+        
+        The compiled file is cached by path, mtime and size, so edits are
+        picked up on the next call.
+        
+        Returns:
+            Tuple of (return value converted to Python, printed output lines)
+        
+        Raises:
+            LookupError: If the file does not define the function
+            subprocess.TimeoutExpired: If loading and calling take longer than timeout
+            TimeoutError: If no state is free within checkout_timeout
+        """
+        key, read_source = self._file_chunk(path)
+        name = os.path.basename(path)
+        with self.acquire() as state:
+            with self._deadline(name, timeout):
+                env, output = self._run(state, key, name, read_source, timeout)
+                func = env[function_name]
+                if state.lua_type(func) != 'function':
+                    raise LookupError(f'Function {function_name} not found in plugin')
+                
+                if args:
+                    # Convert Python dict to Lua table
+                    result = func(state.lua.table_from(args))
+                else:
+                    result = func()
+            return state.to_python(result), [str(line) for line in output.values()]
+    
+    def shutdown(self):
+        """Stop the pool's threads; runs in progress finish first"""
+        self._executor.shutdown(wait=False)
+    
+    def compile_file(self, path: str):
+        """
+        Compile a Lua file on one runtime, surfacing syntax errors up front
+        
+        Raises:
+            SyntaxError: If the file does not compile
+        """
+        key, read_source = self._file_chunk(path)
+        with self.acquire() as state:
+            state.compile(key, os.path.basename(path), read_source)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get state and chunk cache counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['states'] = self._created
+            stats['idle'] = self._idle.qsize()
+            return stats
+    
+    def _file_chunk(self, path: str) -> Tuple[Any, Callable[[], str]]:
+        """Cache key and source loader for a Lua file"""
+        stat = os.stat(path)
+        key = ('file', path, stat.st_mtime_ns, stat.st_size)
+        
+        def read_source():
+            with open(path, 'r') as f:
+                return f.read()
+        return key, read_source
+    
+    @contextmanager
+    def _deadline(self, name: str, timeout: float):
+        """Report a Lua error raised after the deadline as a timeout"""
+        deadline = time.monotonic() + timeout
+        try:
+            yield
+        except Exception as e:
+            # The hook checks whole seconds, so it fires up to a second late
+            if time.monotonic() >= deadline and 'script timed out' in str(e):
+                raise subprocess.TimeoutExpired(name, timeout) from e
+            raise
+    
+    def _run(self, state: LuaState, key, name: str, load_source: Callable[[], str],
+             timeout: float = None, on_print: Callable[[str], None] = None):
+        """Run a chunk on a state and record whether it was compiled"""
+        state.last_hit = False
+        try:
+            return state.run(key, name, load_source, timeout, on_print)
+        finally:
+            with self._lock:
+                self._stats['chunk_hits' if state.last_hit else 'chunk_misses'] += 1
+    
+    def _checkout(self, timeout: float = None) -> LuaState:
+        """Take an idle state or create a new one"""
+        try:
+            state = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if not create:
+                try:
+                    state = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No Lua runtime free after {timeout:g}s") from None
+            else:
+                state = None
+        if state is not None:
+            return state
+        
+        # Either below the pool size or a recycled state's slot
+        try:
+            state = LuaState(self.chunk_cache_size)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+        with self._lock:
+            self._stats['states_created'] += 1
+        return state
+    
+    def _checkin(self, state: LuaState):
+        """Return a state, discarding it once it reached max_uses"""
+        state.set_deadline(None)
+        state.uses += 1
+        with self._lock:
+            self._stats['uses'] += 1
+            if state.uses >= self.max_uses:
+                self._stats['states_recycled'] += 1
+                # The slot stays taken; the next checkout builds a fresh state
+                state = None
+        self._idle.put(state)
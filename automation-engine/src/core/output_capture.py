@@ -0,0 +1,274 @@
+"""
+Output Capture
+Streams subprocess output with bounded memory
+"""
+import os
+import time
+import codecs
+import logging
+import subprocess
+import threading
+from collections import deque
+from typing import Dict, List, Tuple, Optional, BinaryIO
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 8192
+
+
+class BoundedOutput:
+    """
+    Keeps the first `head_size` and last `tail_size` characters of a stream
+    
+    Everything in between is counted but dropped, so memory stays constant
+    regardless of how much a process writes.
+    """
+    
+    def __init__(self, head_size: int, tail_size: int):
+        """Initialize empty head and tail buffers"""
+        self.head_size = head_size
+        self.tail_size = tail_size
+        self._head: List[str] = []
+        self._head_len = 0
+        self._tail: deque = deque()
+        self._tail_len = 0
+        self.total = 0
+    
+    def write(self, text: str):
+        """Append text to the stream"""
+        self.total += len(text)
+        
+        if self._head_len < self.head_size:
+            take = text[:self.head_size - self._head_len]
+            self._head.append(take)
+            self._head_len += len(take)
+            text = text[len(take):]
+            if not text:
+                return
+        
+        if self.tail_size <= 0:
+            return
+        self._tail.append(text)
+        self._tail_len += len(text)
+        while self._tail_len - len(self._tail[0]) >= self.tail_size:
+            self._tail_len -= len(self._tail.popleft())
+    
+    @property
+    def truncated(self) -> int:
+        """Number of characters dropped from the middle of the stream"""
+        return self.total - self._head_len - min(self._tail_len, self.tail_size)
+    
+    def getvalue(self) -> str:
+        """Get the retained output, with a marker where text was dropped"""
+        head = ''.join(self._head)
+        tail = ''.join(self._tail)[-self.tail_size:] if self.tail_size > 0 else ''
+        if self.truncated > 0:
+            return f"{head}\n... [{self.truncated} characters truncated] ...\n{tail}"
+        return head + tail
+
+
+class ExecutionLogWriter:
+    """Buffers output chunks and flushes them to the execution log table"""
+    
+    def __init__(self, db_manager, execution_id: str, chunk_size: int = None,
+                 flush_interval: float = None):
+        """
+        Initialize log writer
+        
+        Args:
+            db_manager: DatabaseManager used to store chunks
+            execution_id: Execution the output belongs to
+            chunk_size: Characters buffered per stream before a flush
+            flush_interval: Seconds after which buffered output is flushed
+                even if the chunk is not full, so live followers see it
+        """
+        self.db_manager = db_manager
+        self.execution_id = execution_id
+        self.chunk_size = chunk_size or int(os.getenv('TASK_LOG_CHUNK_SIZE', 65536))
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            float(os.getenv('TASK_LOG_FLUSH_INTERVAL', 1.0))
+        self._last_flush = time.monotonic()
+        self._buffers = {'stdout': [], 'stderr': []}
+        self._sizes = {'stdout': 0, 'stderr': 0}
+        self._seq = 0
+        self._lock = threading.Lock()
+    
+    def write(self, stream: str, text: str):
+        """Buffer output from a stream, flushing once a chunk is full"""
+        with self._lock:
+            self._store_locked(self._buffer_locked(stream, text))
+    
+    def buffer(self, stream: str, text: str) -> List[Tuple]:
+        """
+        Buffer output without writing it
+        
+        Used by callers that cannot block on the database (the asyncio
+        runner); they pass the returned chunks to store() themselves, in order.
+        
+        Returns:
+            Chunks that are due to be written, if any
+        """
+        with self._lock:
+            return self._buffer_locked(stream, text)
+    
+    def take(self, only_if_due: bool = False) -> List[Tuple]:
+        """Remove and return buffered chunks without writing them"""
+        with self._lock:
+            if only_if_due and time.monotonic() - self._last_flush < self.flush_interval:
+                return []
+            return self._take_locked(list(self._buffers))
+    
+    def store(self, rows: List[Tuple]):
+        """Write chunks returned by buffer() or take()"""
+        with self._lock:
+            self._store_locked(rows)
+    
+    def flush(self):
+        """Write all buffered output"""
+        with self._lock:
+            self._store_locked(self._take_locked(list(self._buffers)))
+    
+    def flush_if_due(self):
+        """Write buffered output if the flush interval has passed"""
+        with self._lock:
+            if time.monotonic() - self._last_flush >= self.flush_interval:
+                self._store_locked(self._take_locked(list(self._buffers)))
+    
+    def _buffer_locked(self, stream: str, text: str) -> List[Tuple]:
+        """Append text to a stream buffer and take any chunks now due (lock held)"""
+        self._buffers[stream].append(text)
+        self._sizes[stream] += len(text)
+        if self._sizes[stream] >= self.chunk_size:
+            return self._take_locked([stream])
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            return self._take_locked(list(self._buffers))
+        return []
+    
+    def _take_locked(self, streams: List[str]) -> List[Tuple]:
+        """Turn buffered output for the given streams into numbered chunks (lock held)"""
+        self._last_flush = time.monotonic()
+        rows = []
+        for stream in streams:
+            if not self._buffers[stream]:
+                continue
+            rows.append((self.execution_id, self._seq, stream, ''.join(self._buffers[stream])))
+            self._seq += 1
+            self._buffers[stream] = []
+            self._sizes[stream] = 0
+        return rows
+    
+    def _store_locked(self, rows: List[Tuple]):
+        """Write chunks to the execution log (lock held)"""
+        if not rows:
+            return
+        try:
+            self.db_manager.append_execution_logs(rows)
+        except Exception as e:
+            # Losing log chunks must not fail the task itself
+            logger.error(f"Error writing execution log for {self.execution_id}: {e}")
+
+
+def create_outputs(head_size: int = None, tail_size: int = None) -> Dict[str, BoundedOutput]:
+    """Create stdout/stderr buffers, defaulting sizes from the environment"""
+    head_size = head_size if head_size is not None else int(os.getenv('TASK_OUTPUT_HEAD_SIZE', 65536))
+    tail_size = tail_size if tail_size is not None else int(os.getenv('TASK_OUTPUT_TAIL_SIZE', 65536))
+    return {
+        'stdout': BoundedOutput(head_size, tail_size),
+        'stderr': BoundedOutput(head_size, tail_size),
+    }
+
+
+def start_readers(pipes: Dict[str, BinaryIO], outputs: Dict[str, BoundedOutput],
+                  log_writer: Optional[ExecutionLogWriter] = None) -> List[threading.Thread]:
+    """
+    Start one thread per pipe copying output into bounded buffers and the log
+    
+    Each pipe is closed when it reaches EOF.
+    
+    Args:
+        pipes: Binary pipes keyed by stream name
+        outputs: BoundedOutput per stream name
+        log_writer: Optional writer receiving every output chunk
+    
+    Returns:
+        Started reader threads
+    """
+    def pump(stream: str, pipe):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            while True:
+                data = pipe.read1(READ_SIZE)
+                text = decoder.decode(data, final=not data)
+                if text:
+                    outputs[stream].write(text)
+                    if log_writer:
+                        log_writer.write(stream, text)
+                if not data:
+                    break
+        finally:
+            pipe.close()
+    
+    readers = [
+        threading.Thread(target=pump, args=(stream, pipe), daemon=True)
+        for stream, pipe in pipes.items()
+    ]
+    for reader in readers:
+        reader.start()
+    return readers
+
+
+def run_process(cmd: List[str], timeout: float = 300,
+                log_writer: Optional[ExecutionLogWriter] = None,
+                head_size: int = None, tail_size: int = None) -> Tuple[int, str, str]:
+    """
+    Run a command, reading stdout/stderr incrementally
+    
+    Output is kept in head/tail buffers and, if a log writer is given,
+    streamed to the execution log as it is produced.
+    
+    Args:
+        cmd: Command and arguments
+        timeout: Seconds before the process is killed
+        log_writer: Optional writer receiving every output chunk
+        head_size: Characters kept from the start of each stream
+        tail_size: Characters kept from the end of each stream
+    
+    Returns:
+        Tuple of (exit_code, stdout, stderr) with the retained output
+    
+    Raises:
+        subprocess.TimeoutExpired: If the process runs longer than timeout
+    """
+    outputs = create_outputs(head_size, tail_size)
+    
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    readers = start_readers({'stdout': process.stdout, 'stderr': process.stderr},
+                            outputs, log_writer)
+    
+    reader_timeout = None
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            try:
+                # Wake up periodically so quiet output still reaches followers
+                returncode = process.wait(timeout=min(remaining, 1.0))
+                break
+            except subprocess.TimeoutExpired:
+                if log_writer:
+                    log_writer.flush_if_due()
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        # Orphaned grandchildren may keep the pipes open
+        reader_timeout = 5
+        raise
+    finally:
+        for reader in readers:
+            reader.join(timeout=reader_timeout)
+        if log_writer:
+            log_writer.flush()
+    
+    return returncode, outputs['stdout'].getvalue(), outputs['stderr'].getvalue()
@@ -0,0 +1,444 @@
+"""
+Python Worker Pool
+Prewarmed interpreters that run python-type tasks without a fresh CPython start
+"""
+import os
+import sys
+import time
+import signal
+import types
+import asyncio
+import logging
+import functools
+import threading
+import subprocess
+import multiprocessing
+import concurrent.futures
+from collections import deque
+from multiprocessing import reduction
+from typing import Dict, Any, List, Optional, Tuple
+
+from src.core.output_capture import ExecutionLogWriter, create_outputs, start_readers
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRELOAD = 'json,re,datetime,pathlib,subprocess'
+
+# Modules whose attributes are restored after every task, besides the preloaded ones
+RESTORED_MODULES = ('builtins', 'os', 'os.path')
+
+_MISSING = object()
+
+
+def _snapshot_modules(preload: List[str]) -> Dict[str, Tuple[Any, Dict[str, Any]]]:
+    """Attributes of the modules a script is likely to monkeypatch, taken before any task"""
+    names = set(RESTORED_MODULES)
+    for name in list(sys.modules):
+        if any(name == module or name.startswith(module + '.') for module in preload):
+            names.add(name)
+    return {name: (sys.modules[name], dict(vars(sys.modules[name])))
+            for name in names if sys.modules.get(name) is not None}
+
+
+def _restore_modules(snapshot: Dict[str, Tuple[Any, Dict[str, Any]]]):
+    """Undo attributes a script replaced, added or deleted on snapshotted modules"""
+    for module, saved in snapshot.values():
+        current = vars(module)
+        try:
+            # Compares values by identity first, so untouched modules cost little
+            if current == saved:
+                continue
+        except Exception:
+            pass  # A replaced value with an unusual __eq__; restore below
+        for key in [key for key in current if key not in saved]:
+            del current[key]
+        for key, value in saved.items():
+            if current.get(key, _MISSING) is not value:
+                current[key] = value
+
+
+def _run_script(source: str, filename: str, snapshot: Dict[str, Tuple[Any, Dict[str, Any]]] = None) -> int:
+    """Run a script as __main__ inside a worker and return its exit code"""
+    import builtins
+    import linecache
+    import traceback
+    
+    # Let tracebacks show script lines even though there is no file on disk
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+    # A real __main__ module, so functions the script defines can be pickled
+    # (multiprocessing.Pool, ProcessPoolExecutor)
+    main_module = types.ModuleType('__main__')
+    main_module.__file__ = filename
+    main_module.__builtins__ = builtins
+    saved_main = sys.modules.get('__main__')
+    sys.modules['__main__'] = main_module
+    saved_argv, saved_path = sys.argv, list(sys.path)
+    saved_stdout, saved_stderr = sys.stdout, sys.stderr
+    saved_cwd, saved_environ = os.getcwd(), dict(os.environ)
+    sys.argv = [filename]
+    
+    try:
+        exec(compile(source, filename, 'exec'), main_module.__dict__)
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        if isinstance(e.code, int):
+            return e.code
+        print(e.code, file=sys.stderr)
+        return 1
+    except BaseException as e:
+        # Skip this frame so the traceback starts at the script, as with `python script.py`
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        return 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        # Undo process-level changes so the next task starts clean
+        sys.stdout, sys.stderr = saved_stdout, saved_stderr
+        sys.modules['__main__'] = saved_main
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        if os.getcwd() != saved_cwd:
+            os.chdir(saved_cwd)
+        if os.environ != saved_environ:
+            os.environ.clear()
+            os.environ.update(saved_environ)
+        if snapshot:
+            _restore_modules(snapshot)
+        linecache.cache.pop(filename, None)
+
+
+def _worker_main(conn, preload: List[str]):
+    """Worker process loop: receive a script and its output pipes, run it, report"""
+    # Shutdown is driven by the engine, not by Ctrl+C reaching the process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for module in preload:
+        try:
+            __import__(module)
+        except ImportError:
+            pass
+    snapshot = _snapshot_modules(preload)
+    # Scripts get the platform's default start method, as under a fresh interpreter,
+    # not the one this worker was started with
+    multiprocessing.set_start_method(None, force=True)
+    
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        
+        source, filename = job
+        stdout_fd = reduction.recv_handle(conn)
+        stderr_fd = reduction.recv_handle(conn)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.close(stdout_fd)
+        os.close(stderr_fd)
+        
+        exit_code = _run_script(source, filename, snapshot)
+        
+        # Dropping our copies of the pipes gives the engine EOF
+        os.dup2(devnull, 1)
+        os.dup2(devnull, 2)
+        conn.send(exit_code)
+
+
+class _Worker:
+    """Handle to one worker process"""
+    
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.tasks_run = 0
+    
+    def stop(self, kill: bool = False):
+        """Ask the worker to exit, or kill it"""
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+        except Exception:
+            pass
+        self.conn.close()
+        self.process.join(timeout=5)
+
+
+class PythonWorkerPool:
+    """
+    Pool of preloaded Python interpreters for python-type tasks
+    
+    Workers are started from a forkserver that has already imported the
+    preload modules, so spawning one costs a fork instead of an interpreter
+    start. Each task runs as __main__ in an idle worker with its stdout/stderr
+    pointed at fresh pipes. Afterwards argv, sys.path, cwd and the environment
+    are restored, as are the attributes of builtins, os and the preloaded
+    modules, so monkeypatching e.g. json.dumps does not reach the next task.
+    
+    Isolation is not complete: modules a script imports stay in sys.modules
+    (C extensions cannot be safely imported twice), and changes inside
+    module-level objects persist. Such state lasts until the worker is
+    replaced after max_tasks_per_worker tasks; use a low value, or disable
+    the pool (PYTHON_POOL_SIZE=0), when tasks must not influence each other.
+    
+    Workers are not daemonic, so scripts can start processes of their own
+    (multiprocessing.Pool, ProcessPoolExecutor); shutdown() stops them
+    explicitly instead.
+    """
+    
+    def __init__(self, max_workers: int = None, preload: List[str] = None,
+                 max_tasks_per_worker: int = None, start_method: str = None):
+        """
+        Initialize the pool
+        
+        Args:
+            max_workers: Number of worker interpreters
+            preload: Modules imported before workers are forked (plus
+                src.ai.warmup when AI_WARMUP_MODELS is set and workers start
+                from a forkserver)
+            max_tasks_per_worker: Tasks a worker runs before it is replaced
+            start_method: multiprocessing start method (default forkserver)
+        """
+        self.max_workers = max_workers or int(os.getenv('PYTHON_POOL_SIZE', 4))
+        if preload is None:
+            preload = [m.strip() for m in os.getenv('PYTHON_POOL_PRELOAD', DEFAULT_PRELOAD).split(',')]
+        self.preload = [m for m in preload if m]
+        self.max_tasks_per_worker = max_tasks_per_worker or \
+            int(os.getenv('PYTHON_POOL_MAX_TASKS', 20))
+        
+        start_method = start_method or os.getenv('PYTHON_POOL_START_METHOD', 'forkserver')
+        if start_method not in multiprocessing.get_all_start_methods():
+            start_method = 'spawn'
+        if start_method == 'forkserver' and os.getenv('AI_WARMUP_MODELS') and \
+                'src.ai.warmup' not in self.preload:
+            # Load models once in the forkserver so workers share the weights;
+            # with other start methods each worker would load its own copy
+            self.preload.append('src.ai.warmup')
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            self._context.set_forkserver_preload([__name__] + self.preload)
+        
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        self._busy: set = set()
+        self._size = 0  # Live workers, idle or busy
+        self._started = False
+        self._closed = False
+        self._stats = {'tasks': 0, 'spawned': 0, 'recycled': 0, 'killed': 0}
+        # Each worker runs one task at a time, so this never exceeds max_workers threads
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix='python-pool'
+        )
+    
+    def start(self):
+        """Prewarm all workers"""
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+            # Reserve the slots so concurrent checkouts do not spawn extra workers
+            self._size += self.max_workers
+        
+        for _ in range(self.max_workers):
+            try:
+                worker = self._spawn()
+            except Exception as e:
+                logger.error(f"Error starting Python worker: {e}")
+                with self._cond:
+                    self._size -= 1
+                continue
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+        logger.info(f"Python worker pool started with {self.max_workers} workers "
+                    f"(start method: {self._context.get_start_method()}, preload: {self.preload})")
+    
+    def run(self, source: str, filename: str, timeout: float = 300,
+            log_writer: Optional[ExecutionLogWriter] = None,
+            head_size: int = None, tail_size: int = None) -> Tuple[int, str, str]:
+        """
+        Run a script in an idle worker, waiting for one if all are busy
+        
+        Args:
+            source: Python source code
+            filename: Name used for __file__ and tracebacks
+            timeout: Seconds before the worker is killed
+            log_writer: Optional writer receiving every output chunk
+            head_size: Characters kept from the start of each stream
+            tail_size: Characters kept from the end of each stream
+        
+        Returns:
+            Tuple of (exit_code, stdout, stderr) with the retained output
+        
+        Raises:
+            subprocess.TimeoutExpired: If the script runs longer than timeout
+        """
+        self.start()
+        worker = self._checkout()
+        outputs = create_outputs(head_size, tail_size)
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        
+        try:
+            worker.conn.send((source, filename))
+            reduction.send_handle(worker.conn, stdout_w, worker.process.pid)
+            reduction.send_handle(worker.conn, stderr_w, worker.process.pid)
+        except Exception:
+            for fd in (stdout_r, stderr_r):
+                os.close(fd)
+            self._retire(worker, kill=True)
+            raise
+        finally:
+            os.close(stdout_w)
+            os.close(stderr_w)
+        
+        readers = start_readers({'stdout': os.fdopen(stdout_r, 'rb'),
+                                 'stderr': os.fdopen(stderr_r, 'rb')}, outputs, log_writer)
+        
+        reader_timeout = None
+        healthy = False
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(filename, timeout)
+                # Wake up periodically so quiet output still reaches followers
+                if worker.conn.poll(min(remaining, 1.0)):
+                    break
+                if log_writer:
+                    log_writer.flush_if_due()
+            
+            try:
+                exit_code = worker.conn.recv()
+                healthy = True
+            except EOFError:
+                # The script killed its interpreter (os._exit, a signal, ...)
+                worker.process.join(timeout=5)
+                exit_code = worker.process.exitcode if worker.process.exitcode is not None else -1
+        except subprocess.TimeoutExpired:
+            # Orphaned grandchildren may keep the pipes open
+            reader_timeout = 5
+            raise
+        finally:
+            if not healthy:
+                self._retire(worker, kill=True)
+            for reader in readers:
+                reader.join(timeout=reader_timeout)
+            if log_writer:
+                log_writer.flush()
+        
+        if healthy:
+            self._checkin(worker)
+        return exit_code, outputs['stdout'].getvalue(), outputs['stderr'].getvalue()
+    
+    async def run_async(self, source: str, filename: str, timeout: float = 300,
+                        log_writer: Optional[ExecutionLogWriter] = None) -> Tuple[int, str, str]:
+        """Run a script from the event loop, waiting on one of the pool's own threads"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor,
+            functools.partial(self.run, source, filename, timeout=timeout, log_writer=log_writer)
+        )
+    
+    def shutdown(self):
+        """Stop all idle workers and kill busy ones, whose tasks would outlive the engine"""
+        with self._cond:
+            self._closed = True
+            workers = list(self._idle)
+            self._idle.clear()
+            self._size -= len(workers)
+            busy = list(self._busy)
+            self._cond.notify_all()
+        for worker in workers:
+            worker.stop()
+        for worker in busy:
+            # run() sees the worker die and retires it
+            try:
+                worker.process.kill()
+            except Exception:
+                pass
+        self._executor.shutdown(wait=False)
+        logger.info("Python worker pool stopped")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker counts and lifetime counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['workers'] = self._size
+            stats['idle'] = len(self._idle)
+            return stats
+    
+    def _spawn(self) -> _Worker:
+        """Start a new worker process"""
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.preload),
+            name='python-task-worker'
+        )
+        process.start()
+        child_conn.close()
+        with self._cond:
+            self._stats['spawned'] += 1
+        return _Worker(process, parent_conn)
+    
+    def _checkout(self) -> _Worker:
+        """Take an idle, live worker, replacing dead ones"""
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Python worker pool is shut down")
+                if self._idle:
+                    worker = self._idle.popleft()
+                    if worker.process.is_alive():
+                        self._busy.add(worker)
+                        return worker
+                    self._size -= 1
+                    worker.conn.close()
+                if self._size < self.max_workers:
+                    self._size += 1
+                    break
+                self._cond.wait()
+        
+        try:
+            worker = self._spawn()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._busy.add(worker)
+        return worker
+    
+    def _checkin(self, worker: _Worker):
+        """Return a worker after a task, recycling it once it has run enough"""
+        worker.tasks_run += 1
+        with self._cond:
+            self._busy.discard(worker)
+            self._stats['tasks'] += 1
+            recycle = self._closed or worker.tasks_run >= self.max_tasks_per_worker
+            if not recycle:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+            self._size -= 1
+            self._stats['recycled'] += 1
+            self._cond.notify()
+        worker.stop()
+    
+    def _retire(self, worker: _Worker, kill: bool = False):
+        """Discard a worker that can no longer be trusted"""
+        worker.stop(kill=kill)
+        with self._cond:
+            self._busy.discard(worker)
+            self._size -= 1
+            self._stats['killed'] += 1
+            self._cond.notify()
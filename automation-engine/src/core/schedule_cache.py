@@ -0,0 +1,172 @@
+"""
+Schedule Cache
+Keeps active schedules in memory and syncs only rows that changed
+"""
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+import pytz
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleCache:
+    """In-memory copy of active schedules with delta sync from the database"""
+    
+    def __init__(self, db_manager, overlap_seconds: float = 5.0):
+        """
+        Initialize schedule cache
+        
+        Args:
+            db_manager: DatabaseManager used to fetch schedules
+            overlap_seconds: How far behind the watermark each delta query
+                starts, so rows committed late with an older updated_at are not missed
+        """
+        self.db_manager = db_manager
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._schedules: Dict[str, Dict[str, Any]] = {}
+        self._watermark: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'full_loads': 0,
+            'reconciles': 0,
+            'rows_fetched': 0,
+            'rows_removed': 0,
+            'last_sync_ms': 0.0,
+            'total_sync_ms': 0.0,
+        }
+    
+    def get(self, schedule_id: str) -> Optional[Dict[str, Any]]:
+        """Get a cached schedule by ID"""
+        return self._schedules.get(schedule_id)
+    
+    def values(self) -> List[Dict[str, Any]]:
+        """Get all cached schedules"""
+        return list(self._schedules.values())
+    
+    def __len__(self) -> int:
+        return len(self._schedules)
+    
+    def sync(self, reconcile: bool = False) -> Dict[str, List]:
+        """
+        Bring the cache up to date with the database
+        
+        The first call loads every active schedule. Later calls fetch only
+        schedules (or their tasks) whose updated_at advanced past the watermark.
+        
+        Args:
+            reconcile: Also compare the full set of active IDs to catch deletes
+        
+        Returns:
+            Dict with 'upserted' schedules, 'removed' schedule IDs and
+            'full' set when the cache was rebuilt from scratch
+        """
+        start_time = time.time()
+        with self._lock:
+            if self._watermark is None:
+                changes = self._full_load()
+            else:
+                changes = self._delta_load()
+                if reconcile:
+                    changes['removed'].extend(self._reconcile())
+            
+            if changes['upserted'] or changes['removed']:
+                self._stats['misses'] += 1
+            else:
+                self._stats['hits'] += 1
+            
+            sync_ms = (time.time() - start_time) * 1000
+            self._stats['last_sync_ms'] = sync_ms
+            self._stats['total_sync_ms'] += sync_ms
+        return changes
+    
+    def invalidate(self):
+        """Drop all cached schedules; the next sync performs a full load"""
+        with self._lock:
+            self._schedules = {}
+            self._watermark = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache hit/miss and sync timing metrics"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._schedules)
+            syncs = stats['hits'] + stats['misses']
+            stats['avg_sync_ms'] = stats['total_sync_ms'] / syncs if syncs else 0.0
+            return stats
+    
+    def _full_load(self) -> Dict[str, List]:
+        """Load every active schedule (lock held)"""
+        self._schedules = {}
+        self._watermark = None
+        rows = 0
+        for row in self.db_manager.iter_active_schedules():
+            self._store(row)
+            rows += 1
+        if self._watermark is None:
+            # Nothing active yet; pick up any row on the next delta
+            self._watermark = datetime(1970, 1, 1)
+        
+        self._stats['full_loads'] += 1
+        self._stats['rows_fetched'] += rows
+        logger.info(f"Schedule cache loaded {rows} active schedules")
+        return {'upserted': self.values(), 'removed': [], 'full': True}
+    
+    def _delta_load(self) -> Dict[str, List]:
+        """Apply schedules changed since the watermark (lock held)"""
+        rows = self.db_manager.get_schedules_changed_since(self._watermark - self.overlap)
+        self._stats['rows_fetched'] += len(rows)
+        
+        upserted, removed = [], []
+        for row in rows:
+            schedule_id = str(row['id'])
+            cached = self._schedules.get(schedule_id)
+            
+            if not (row['is_active'] and row['task_enabled']):
+                # Disabled schedule or task
+                if self._schedules.pop(schedule_id, None) is not None:
+                    removed.append(schedule_id)
+                self._advance_watermark(row['changed_at'])
+                continue
+            
+            # Rows inside the overlap window that we already hold are unchanged
+            if cached is not None and row['changed_at'] <= cached['changed_at']:
+                continue
+            
+            upserted.append(self._store(row))
+        
+        self._stats['rows_removed'] += len(removed)
+        return {'upserted': upserted, 'removed': removed, 'full': False}
+    
+    def _reconcile(self) -> List[str]:
+        """Remove cached schedules that no longer exist (lock held)"""
+        active_ids = {str(i) for i in self.db_manager.get_active_schedule_ids()}
+        removed = [sid for sid in self._schedules if sid not in active_ids]
+        for schedule_id in removed:
+            del self._schedules[schedule_id]
+        
+        self._stats['reconciles'] += 1
+        self._stats['rows_removed'] += len(removed)
+        if removed:
+            logger.info(f"Schedule cache dropped {len(removed)} deleted schedules")
+        return removed
+    
+    def _store(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Normalize and cache a schedule row (lock held)"""
+        schedule = dict(row)
+        next_run = schedule.get('next_run')
+        if next_run is not None and next_run.tzinfo is None:
+            schedule['next_run'] = pytz.UTC.localize(next_run)
+        
+        self._schedules[str(schedule['id'])] = schedule
+        self._advance_watermark(schedule['changed_at'])
+        return schedule
+    
+    def _advance_watermark(self, changed_at: datetime):
+        """Move the watermark forward (lock held)"""
+        if changed_at is not None and (self._watermark is None or changed_at > self._watermark):
+            self._watermark = changed_at
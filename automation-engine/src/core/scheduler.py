@@ -2,30 +2,68 @@
 Task Scheduler
 Handles cron-like scheduling of tasks
 """
+import os
+import asyncio
+import heapq
+import select
+import socket
 import logging
 import threading
 import time
 from datetime import datetime, timedelta
-from typing import Dict, List
-from croniter import croniter
+from typing import Dict, List, Any
 import pytz
 
 from src.database.db_manager import DatabaseManager
 from src.core.task_executor import TaskExecutor
+from src.core.worker_pool import TaskWorkerPool
+from src.core.schedule_cache import ScheduleCache
+from src.core.cron_plans import CronPlanCache, from_datetime64
 
 logger = logging.getLogger(__name__)
 
+SCHEDULE_CHANNEL = 'schedule_changes'
+
 
 class TaskScheduler:
     """Manages scheduled task execution"""
     
-    def __init__(self, db_manager: DatabaseManager, task_executor: TaskExecutor):
+    def __init__(self, db_manager: DatabaseManager, task_executor: TaskExecutor,
+                 worker_pool: TaskWorkerPool = None):
         """Initialize task scheduler"""
         self.db_manager = db_manager
         self.task_executor = task_executor
+        self.worker_pool = worker_pool or TaskWorkerPool(task_executor)
         self.running = False
         self.scheduler_thread = None
-        self.check_interval = 30  # Check every 30 seconds
+        self.listener_thread = None
+        # Upper bound on sleep; schedules are re-synced at least this often
+        # in case a change notification was missed
+        self.resync_interval = float(os.getenv('SCHEDULER_RESYNC_INTERVAL', 300))
+        self.retry_delay = 1.0  # Seconds before retrying a deferred dispatch
+        self.error_retry_delay = 60.0  # Seconds before retrying a failed dispatch
+        # Identity used for schedule leases when several engines share a database
+        self.node_id = os.getenv('ENGINE_NODE_ID') or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = int(os.getenv('SCHEDULE_LEASE_SECONDS', 60))
+        self.dispatch_timeout = float(os.getenv('TASK_DISPATCH_TIMEOUT', 5))
+        self.drain_timeout = float(os.getenv('TASK_DRAIN_TIMEOUT', 300))
+        self.listen_enabled = os.getenv('SCHEDULER_LISTEN', 'true').lower() == 'true'
+        
+        # In-memory schedule state: a delta-synced schedule cache and a min-heap
+        # of (next_run timestamp, schedule_id). Stale heap entries are skipped lazily.
+        self.schedule_cache = ScheduleCache(db_manager)
+        self.cron_plans = CronPlanCache()
+        self._heap: List[tuple] = []
+        self._queued: Dict[str, float] = {}  # schedule_id -> live heap timestamp
+        self._wakeup = threading.Event()
+        # Set when the scheduler runs on the async runner's event loop
+        self._async_wakeup = None
+        self._scheduler_future = None
+        self._refresh_requested = True
+        self._reconcile_requested = False
+        self._saturated = False
+        # schedule_id -> next_run of dispatched runs whose lease release failed
+        self._pending_releases: Dict[str, Any] = {}
     
     def start(self):
         """Start the scheduler in a background thread"""
@@ -34,109 +72,362 @@ class TaskScheduler:
             return
         
         self.running = True
-        self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        self.scheduler_thread.start()
-        logger.info("Task scheduler started")
+        self.worker_pool.start()
+        if getattr(self.worker_pool, 'loop', None) is not None:
+            # Share the event loop that supervises running tasks
+            self._scheduler_future = self.worker_pool.run_coroutine(self._run_scheduler_async())
+        else:
+            self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
+            self.scheduler_thread.start()
+        if self.listen_enabled:
+            self.listener_thread = threading.Thread(target=self._run_listener, daemon=True)
+            self.listener_thread.start()
+        logger.info(f"Task scheduler started (node: {self.node_id})")
     
     def stop(self):
-        """Stop the scheduler"""
+        """Stop the scheduler and drain running tasks"""
         self.running = False
+        self._wake()
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=5)
+        if self._scheduler_future:
+            try:
+                self._scheduler_future.result(timeout=5)
+            except Exception as e:
+                logger.warning(f"Scheduler loop did not stop cleanly: {e}")
+        if self.listener_thread:
+            self.listener_thread.join(timeout=5)
+        self.worker_pool.shutdown(wait=True, timeout=self.drain_timeout)
         logger.info("Task scheduler stopped")
     
+    def refresh(self, reconcile: bool = False):
+        """
+        Sync changed schedules and wake the scheduler loop
+        
+        Args:
+            reconcile: Also check for deleted schedules
+        """
+        if reconcile:
+            self._reconcile_requested = True
+        self._refresh_requested = True
+        self._wake()
+    
+    def _wake(self):
+        """Interrupt the scheduler's sleep, from any thread"""
+        self._wakeup.set()
+        if self._async_wakeup is not None and self.worker_pool.loop is not None:
+            self.worker_pool.call_soon(self._async_wakeup.set)
+    
     def _run_scheduler(self):
         """Main scheduler loop"""
         while self.running:
+            self._scheduler_pass()
+            
+            # Sleep until the earliest deadline, a schedule change, or the resync interval
+            timeout = self._seconds_until_next_run()
+            if not self._wakeup.wait(timeout):
+                self._on_idle_timeout(timeout)
+            self._wakeup.clear()
+    
+    async def _run_scheduler_async(self):
+        """
+        Main scheduler loop on the async runner's event loop
+        
+        Sleeping happens on the loop; each pass does blocking database work,
+        so it runs on the loop's default executor.
+        """
+        loop = asyncio.get_running_loop()
+        self._async_wakeup = asyncio.Event()
+        while self.running:
+            await loop.run_in_executor(None, self._scheduler_pass)
+            
+            timeout = self._seconds_until_next_run()
             try:
-                self._check_and_execute_scheduled_tasks()
+                await asyncio.wait_for(self._async_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                self._on_idle_timeout(timeout)
+            self._async_wakeup.clear()
+    
+    def _scheduler_pass(self):
+        """Sync schedules if requested and dispatch everything that is due"""
+        try:
+            if self._refresh_requested:
+                reconcile = self._reconcile_requested
+                self._refresh_requested = False
+                self._reconcile_requested = False
+                self._sync_schedules(reconcile)
+            self._dispatch_due_schedules()
+        except Exception as e:
+            logger.error(f"Error in scheduler loop: {e}")
+            self.db_manager.log_system_event(
+                level='error',
+                component='scheduler',
+                message='Scheduler loop error',
+                stack_trace=str(e)
+            )
+    
+    def _on_idle_timeout(self, timeout: float):
+        """Schedule a full resync after sleeping a whole resync interval"""
+        if timeout >= self.resync_interval:
+            self._refresh_requested = True
+            self._reconcile_requested = True
+    
+    def _run_listener(self):
+        """Listen for schedule change notifications from PostgreSQL"""
+        while self.running:
+            conn = None
+            try:
+                conn = self.db_manager.create_listener_connection(SCHEDULE_CHANNEL)
+                logger.info(f"Listening for schedule changes on '{SCHEDULE_CHANNEL}'")
+                # Anything may have changed while we were disconnected
+                self.refresh(reconcile=True)
+                
+                while self.running:
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    if conn.notifies:
+                        deleted = any(n.payload.endswith(':DELETE') for n in conn.notifies)
+                        conn.notifies.clear()
+                        self.refresh(reconcile=deleted)
             except Exception as e:
-                logger.error(f"Error in scheduler loop: {e}")
-                self.db_manager.log_system_event(
-                    level='error',
-                    component='scheduler',
-                    message='Scheduler loop error',
-                    stack_trace=str(e)
-                )
-            
-            # Sleep for check interval
-            time.sleep(self.check_interval)
+                logger.error(f"Schedule listener error: {e}")
+                time.sleep(5)
+            finally:
+                if conn is not None:
+                    conn.close()
+    
+    def _seconds_until_next_run(self) -> float:
+        """Seconds to sleep before the earliest scheduled run"""
+        # Failed lease releases are retried on the next pass
+        limit = self.retry_delay if self._pending_releases else self.resync_interval
+        if not self._heap or self._saturated:
+            # When saturated, a finishing task wakes the loop
+            return limit
+        delay = self._heap[0][0] - time.time()
+        return max(0.0, min(delay, limit))
     
-    def _check_and_execute_scheduled_tasks(self):
-        """Check for tasks that need to be executed"""
-        schedules = self.db_manager.get_active_schedules()
+    def _sync_schedules(self, reconcile: bool = False):
+        """Apply schedule changes from the cache to the run queue"""
+        changes = self.schedule_cache.sync(reconcile=reconcile)
         current_time = datetime.now(pytz.UTC)
         
-        for schedule in schedules:
+        if changes['full']:
+            self._heap = []
+            self._queued = {}
+        self._assign_first_runs(changes['upserted'], current_time)
+        for schedule in changes['upserted']:
+            self._add_schedule(schedule, heapify=not changes['full'])
+        if changes['full']:
+            heapq.heapify(self._heap)
+        
+        # Removed schedules are gone from the cache, so their heap entries are skipped
+        for schedule_id in changes['removed']:
+            self._queued.pop(schedule_id, None)
+        if changes['upserted'] or changes['removed']:
+            logger.debug(f"Synced schedules: {len(changes['upserted'])} changed, "
+                         f"{len(changes['removed'])} removed, {len(self.schedule_cache)} active")
+    
+    def _add_schedule(self, schedule: Dict[str, Any], heapify: bool = True):
+        """Queue a schedule at its next run time"""
+        self._queue(str(schedule['id']), schedule['next_run'].timestamp(), heapify=heapify)
+    
+    def _assign_first_runs(self, schedules: List[Dict[str, Any]], current_time: datetime):
+        """Compute next_run in one batch for schedules that have never been planned"""
+        unplanned = [s for s in schedules if s['next_run'] is None]
+        if not unplanned:
+            return
+        
+        next_runs = self.cron_plans.next_runs(
+            [s['cron_expression'] for s in unplanned],
+            [s['timezone'] for s in unplanned],
+            current_time
+        )
+        for schedule, next_run in zip(unplanned, next_runs):
+            schedule['next_run'] = from_datetime64(next_run)
+            self.db_manager.update_schedule_next_run(schedule['id'], schedule['next_run'])
+    
+    def _queue(self, schedule_id: str, run_at: float, heapify: bool = True):
+        """Queue a schedule run, superseding any earlier entry for it"""
+        if self._queued.get(schedule_id) == run_at:
+            return
+        self._queued[schedule_id] = run_at
+        if heapify:
+            heapq.heappush(self._heap, (run_at, schedule_id))
+        else:
+            self._heap.append((run_at, schedule_id))
+    
+    def _dispatch_due_schedules(self):
+        """Claim and dispatch schedules whose next run time has passed"""
+        current_time = datetime.now(pytz.UTC)
+        now = current_time.timestamp()
+        capacity = self.worker_pool.available_slots()
+        self._saturated = False
+        due = []
+        
+        while self._heap and self._heap[0][0] <= now:
+            if len(due) >= capacity:
+                # Pool is full; the rest stays queued until a worker frees up
+                self._saturated = True
+                break
+            run_at, schedule_id = heapq.heappop(self._heap)
+            
+            # Skip entries for removed schedules or superseded run times
+            if self.schedule_cache.get(schedule_id) is None or self._queued.get(schedule_id) != run_at:
+                continue
+            del self._queued[schedule_id]
+            due.append(schedule_id)
+        
+        if not due:
+            self._release_leases([])
+            return
+        
+        # Lease the due schedules; rows leased by other nodes are skipped
+        try:
+            claimed = set(self.db_manager.claim_schedules(
+                due, self.node_id, self.lease_seconds, current_time
+            ))
+        except Exception as e:
+            # They are off the heap and the delta sync will not bring them
+            # back, so keep them queued locally
+            logger.error(f"Could not claim {len(due)} due schedules, retrying in {self.retry_delay}s: {e}")
+            self._requeue(due, now + self.retry_delay)
+            return
+        
+        released = []
+        for schedule_id in due:
+            if schedule_id not in claimed:
+                continue
+            schedule = self.schedule_cache.get(schedule_id)
+            new_next_run, retry_after = self._dispatch_schedule(schedule, current_time)
+            released.append((schedule_id, new_next_run))
+            
+            if new_next_run is None:
+                # Keep next_run in the database and retry locally
+                retry_at = current_time + timedelta(seconds=retry_after)
+                self._queue(schedule_id, retry_at.timestamp())
+        
+        self._release_leases(released)
+        
+        unclaimed = [schedule_id for schedule_id in due if schedule_id not in claimed]
+        if unclaimed:
             try:
-                # Get timezone
-                tz = pytz.timezone(schedule['timezone'])
-                
-                # If next_run is None, calculate it
-                if schedule['next_run'] is None:
-                    next_run = self._calculate_next_run(
-                        schedule['cron_expression'],
-                        current_time,
-                        tz
-                    )
-                    self.db_manager.update_schedule_next_run(schedule['id'], next_run)
-                    continue
-                
-                # Make next_run timezone-aware if it isn't
-                next_run = schedule['next_run']
-                if next_run.tzinfo is None:
-                    next_run = pytz.UTC.localize(next_run)
-                
-                # Check if it's time to execute
-                if current_time >= next_run:
-                    logger.info(f"Executing scheduled task: {schedule['task_name']}")
-                    
-                    # Execute the task
-                    self.task_executor.execute_task(
-                        task_id=schedule['task_id'],
-                        triggered_by='schedule'
-                    )
-                    
-                    # Calculate next run time
-                    new_next_run = self._calculate_next_run(
-                        schedule['cron_expression'],
-                        current_time,
-                        tz
-                    )
-                    
-                    # Update schedule
-                    self.db_manager.update_schedule_next_run(schedule['id'], new_next_run)
-                    
-                    logger.info(f"Next run for '{schedule['task_name']}': {new_next_run}")
-                    
+                self._requeue_unclaimed(unclaimed, current_time)
             except Exception as e:
-                logger.error(f"Error processing schedule {schedule['id']}: {e}")
-                self.db_manager.log_system_event(
-                    level='error',
-                    component='scheduler',
-                    message=f"Error processing schedule: {schedule['task_name']}",
-                    stack_trace=str(e),
-                    metadata={'schedule_id': schedule['id']}
-                )
-    
-    def _calculate_next_run(self, cron_expression: str, base_time: datetime, 
-                           timezone: pytz.timezone) -> datetime:
-        """Calculate the next run time based on cron expression"""
+                logger.error(f"Could not read leases of {len(unclaimed)} schedules, "
+                             f"retrying in {self.retry_delay}s: {e}")
+                self._requeue(unclaimed, now + self.retry_delay)
+    
+    def _requeue(self, schedule_ids: List[str], run_at: float):
+        """Queue schedules for another claim attempt"""
+        for schedule_id in schedule_ids:
+            if self.schedule_cache.get(schedule_id) is not None:
+                self._queue(schedule_id, run_at)
+    
+    def _release_leases(self, released: List[tuple]):
+        """
+        Release leases along with any whose release failed earlier
+        
+        Failed releases are kept and retried on the next pass. Until then the
+        database still has the old next_run, and the lease is what stops
+        another node from firing the same run again.
+        """
+        for schedule_id, next_run in released:
+            # A deferral (None) must not discard a dispatched run's next_run
+            if next_run is not None or schedule_id not in self._pending_releases:
+                self._pending_releases[schedule_id] = next_run
+        if not self._pending_releases:
+            return
         try:
-            # Convert base_time to the schedule's timezone
-            local_time = base_time.astimezone(timezone)
+            self.db_manager.release_schedules(self.node_id, list(self._pending_releases.items()))
+            self._pending_releases.clear()
+        except Exception as e:
+            logger.error(f"Could not release {len(self._pending_releases)} schedule leases, "
+                         f"retrying in {self.retry_delay}s: {e}")
+    
+    def _requeue_unclaimed(self, schedule_ids: List[str], current_time: datetime):
+        """Re-plan schedules that another node claimed or is still holding"""
+        for state in self.db_manager.get_schedule_leases(schedule_ids):
+            schedule_id = str(state['id'])
+            schedule = self.schedule_cache.get(schedule_id)
+            if schedule is None or not state['is_active']:
+                continue
             
-            # Create croniter instance
-            cron = croniter(cron_expression, local_time)
+            next_run = state['next_run']
+            if next_run is not None and next_run.tzinfo is None:
+                next_run = pytz.UTC.localize(next_run)
+            lease_expires_at = state['lease_expires_at']
+            if lease_expires_at is not None and lease_expires_at.tzinfo is None:
+                lease_expires_at = pytz.UTC.localize(lease_expires_at)
             
-            # Get next occurrence
-            next_run_local = cron.get_next(datetime)
+            if next_run is not None and next_run > current_time:
+                # Another node already fired it
+                schedule['next_run'] = next_run
+                run_at = next_run
+            elif lease_expires_at is not None and lease_expires_at > current_time:
+                # Still leased; take over if the holder does not release in time
+                run_at = lease_expires_at
+            else:
+                run_at = current_time + timedelta(seconds=self.retry_delay)
+            self._queue(schedule_id, run_at.timestamp())
+    
+    def _dispatch_schedule(self, schedule: Dict[str, Any], current_time: datetime):
+        """
+        Hand a claimed schedule to the worker pool and compute its next run
+        
+        Returns:
+            Tuple of (new next_run, retry delay). new next_run is None when the
+            task was not queued and the schedule should be retried after the delay.
+        """
+        try:
+            logger.info(f"Dispatching scheduled task: {schedule['task_name']}")
             
-            # Convert back to UTC for storage
-            next_run_utc = next_run_local.astimezone(pytz.UTC)
+            queued = self.worker_pool.submit(
+                task_id=schedule['task_id'],
+                script_type=schedule['script_type'],
+                triggered_by='schedule',
+                on_complete=self._on_task_complete,
+                timeout=self.dispatch_timeout
+            )
+            if not queued:
+                logger.warning(f"Worker pool full, deferring '{schedule['task_name']}'")
+                return None, self.retry_delay
             
-            return next_run_utc
+            # Calculate next run time
+            new_next_run = self._calculate_next_run(
+                schedule['cron_expression'],
+                current_time,
+                schedule['timezone']
+            )
+            schedule['next_run'] = new_next_run
+            self._queue(str(schedule['id']), new_next_run.timestamp())
             
+            logger.info(f"Next run for '{schedule['task_name']}': {new_next_run}")
+            return new_next_run, 0
+        
+        except Exception as e:
+            logger.error(f"Error processing schedule {schedule['id']}: {e}")
+            self.db_manager.log_system_event(
+                level='error',
+                component='scheduler',
+                message=f"Error processing schedule: {schedule['task_name']}",
+                stack_trace=str(e),
+                metadata={'schedule_id': str(schedule['id'])}
+            )
+            return None, self.error_retry_delay
+    
+    def _on_task_complete(self, execution_id: str):
+        """Wake the scheduler when a worker frees up while it is saturated"""
+        if self._saturated:
+            self._wake()
+    
+    def _calculate_next_run(self, cron_expression: str, base_time: datetime,
+                           timezone: str) -> datetime:
+        """Calculate the next run time (UTC) based on cron expression"""
+        try:
+            # Compiled plans are cached per (expression, timezone)
+            return self.cron_plans.next_run(cron_expression, timezone, base_time)
+        
         except Exception as e:
             logger.error(f"Error calculating next run time: {e}")
             # Default to 1 hour from now if there's an error
@@ -0,0 +1,212 @@
+"""
+Task Cache
+LRU cache of task definitions and content-addressed script files
+"""
+import os
+import stat
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TaskDefinitionCache:
+    """
+    Task rows keyed by ID, revalidated against tasks.updated_at
+    
+    A cached task costs one indexed lookup of its updated_at per run instead
+    of transferring the full row (script body included). The row is fetched
+    again only when updated_at differs; a missing row evicts the entry.
+    """
+    
+    def __init__(self, db_manager, max_entries: int = None):
+        """
+        Initialize the cache
+        
+        Args:
+            db_manager: DatabaseManager used to load tasks
+            max_entries: Task definitions kept (least recently used are evicted)
+        """
+        self.db_manager = db_manager
+        self.max_entries = max_entries or int(os.getenv('TASK_CACHE_SIZE', 1024))
+        self._tasks: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+    
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a task definition, reloading it if it changed
+        
+        Returns:
+            A copy of the task row, None if the task does not exist
+        """
+        task_id = str(task_id)
+        with self._lock:
+            cached = self._tasks.get(task_id)
+        
+        if cached is not None:
+            updated_at = self.db_manager.get_task_version(task_id)
+            if updated_at is None:
+                self.invalidate(task_id)
+                return None
+            if updated_at == cached['updated_at']:
+                with self._lock:
+                    if task_id in self._tasks:
+                        self._tasks.move_to_end(task_id)
+                    self._stats['hits'] += 1
+                return dict(cached)
+            with self._lock:
+                self._stats['stale'] += 1
+        
+        task = self.db_manager.get_task_by_id(task_id)
+        with self._lock:
+            self._stats['misses'] += 1
+            if task is None:
+                self._tasks.pop(task_id, None)
+                return None
+            self._tasks[task_id] = task
+            self._tasks.move_to_end(task_id)
+            while len(self._tasks) > self.max_entries:
+                self._tasks.popitem(last=False)
+                self._stats['evictions'] += 1
+        return dict(task)
+    
+    def invalidate(self, task_id: str = None):
+        """Drop one task, or every task when no ID is given"""
+        with self._lock:
+            if task_id is None:
+                self._tasks.clear()
+            else:
+                self._tasks.pop(str(task_id), None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss counters and cache size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._tasks)
+            return stats
+
+
+class ScriptFileCache:
+    """
+    Script files on disk named by the SHA-256 of their content
+    
+    A script that has not changed is written once and reused by every run,
+    including concurrent runs of the same task. Files in use are pinned;
+    the least recently used unpinned files are deleted once the cache holds
+    more than max_files. The directory is private to the engine user.
+    """
+    
+    def __init__(self, directory: str = None, max_files: int = None):
+        """
+        Initialize the cache and adopt files left by a previous run
+        
+        Args:
+            directory: Where script files are stored
+            max_files: Files kept before unpinned ones are evicted
+        """
+        if directory is None:
+            # Per-user default so engines run by different users never share files
+            owner = f"_{os.getuid()}" if hasattr(os, 'getuid') else ''
+            directory = os.getenv('TASK_SCRIPT_CACHE_DIR') or \
+                os.path.join(tempfile.gettempdir(), f"omnitasker_scripts{owner}")
+        self.directory = directory
+        self.max_files = max_files or int(os.getenv('TASK_SCRIPT_CACHE_SIZE', 512))
+        self._files: 'OrderedDict[str, int]' = OrderedDict()  # path -> pin count
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'writes': 0, 'evictions': 0}
+        
+        self._prepare_directory()
+        existing = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file(follow_symlinks=False) and not entry.name.startswith('.'):
+                existing.append((entry.stat().st_mtime, entry.path))
+        for _, path in sorted(existing):
+            self._files[path] = 0
+    
+    def acquire(self, content: str, suffix: str, executable: bool = False) -> str:
+        """
+        Get the path of a file holding content, writing it if needed
+        
+        The file stays pinned (never evicted) until release() is called.
+        """
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        path = os.path.join(self.directory, f"{digest}{suffix}")
+        
+        with self._lock:
+            pins = self._files.get(path)
+            self._files[path] = (pins or 0) + 1
+            self._files.move_to_end(path)
+        
+        # Re-check the disk: temp cleaners may have removed the file
+        if pins is not None and os.path.exists(path):
+            with self._lock:
+                self._stats['hits'] += 1
+            return path
+        
+        try:
+            self._write(path, content, executable)
+        except Exception:
+            self.release(path)
+            raise
+        with self._lock:
+            self._stats['writes'] += 1
+        self._evict()
+        return path
+    
+    def release(self, path: str):
+        """Unpin a file returned by acquire()"""
+        with self._lock:
+            if self._files.get(path):
+                self._files[path] -= 1
+        self._evict()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/write/eviction counters and file count"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['files'] = len(self._files)
+            stats['pinned'] = sum(1 for pins in self._files.values() if pins)
+            return stats
+    
+    def _prepare_directory(self):
+        """Create the cache directory, refusing one another user could tamper with"""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        info = os.lstat(self.directory)
+        if not stat.S_ISDIR(info.st_mode) or \
+                (hasattr(os, 'getuid') and info.st_uid != os.getuid()):
+            raise PermissionError(f"Script cache directory {self.directory} is not owned by this user")
+        os.chmod(self.directory, 0o700)
+    
+    def _write(self, path: str, content: str, executable: bool):
+        """Write a file atomically so concurrent readers never see it half-written"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            os.chmod(tmp_path, 0o700 if executable else 0o600)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
+    def _evict(self):
+        """Delete least recently used unpinned files beyond max_files"""
+        with self._lock:
+            excess = len(self._files) - self.max_files
+            if excess <= 0:
+                return
+            victims = [path for path, pins in self._files.items() if not pins][:excess]
+            # Removed under the lock so a concurrent acquire() cannot re-create it in between
+            for path in victims:
+                del self._files[path]
+                self._stats['evictions'] += 1
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
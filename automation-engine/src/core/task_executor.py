@@ -4,17 +4,33 @@ Handles execution of tasks across multiple script types
 """
 import os
 import sys
+import asyncio
 import logging
-import subprocess
 import time
 import platform
-from typing import Dict, Any, Tuple
+import subprocess
+from typing import Dict, Any, List, Tuple
 from datetime import datetime
 
 from src.database.db_manager import DatabaseManager
+from src.core.output_capture import ExecutionLogWriter, run_process
+from src.core.async_executor import run_process_async
+from src.core.python_pool import PythonWorkerPool
+from src.core.lua_pool import get_lua_pool
+from src.core.task_cache import TaskDefinitionCache, ScriptFileCache
 
 logger = logging.getLogger(__name__)
 
+SCRIPT_TIMEOUT = 300  # 5 minute timeout
+
+# Interpreter command line and file suffix per script type
+SCRIPT_COMMANDS = {
+    'python': ([sys.executable], '.py'),
+    'bash': (['/bin/bash'], '.sh'),
+    'powershell': (['-ExecutionPolicy', 'Bypass', '-File'], '.ps1'),
+    'ruby': (['ruby'], '.rb'),
+}
+
 
 class TaskExecutor:
     """Executes tasks and manages their lifecycle"""
@@ -23,8 +39,19 @@ class TaskExecutor:
         """Initialize task executor"""
         self.db_manager = db_manager
         self.os_type = platform.system()
+        # Python tasks run in prewarmed interpreters unless the pool is disabled
+        self.python_pool = PythonWorkerPool() if int(os.getenv('PYTHON_POOL_SIZE', 4)) > 0 else None
+        self.lua_pool = get_lua_pool()
+        self.task_cache = TaskDefinitionCache(db_manager)
+        self.script_cache = ScriptFileCache()
         logger.info(f"Task executor initialized for {self.os_type}")
     
+    def shutdown(self):
+        """Stop helper processes owned by the executor"""
+        if self.python_pool:
+            self.python_pool.shutdown()
+        self.lua_pool.shutdown()
+    
     def execute_task(self, task_id: str, triggered_by: str = 'manual') -> str:
         """
         Execute a task and return the execution ID
@@ -32,19 +59,78 @@ class TaskExecutor:
         Args:
             task_id: UUID of the task to execute
             triggered_by: Source that triggered the execution
-            
+        
         Returns:
             execution_id: UUID of the task execution record
         """
-        # Get task details
-        task = self.db_manager.get_task_by_id(task_id)
+        task, execution_id = self._begin_execution(task_id, triggered_by)
+        if not execution_id:
+            return None
+        
+        # Full output is streamed to the execution log; only head/tail is kept in memory
+        log_writer = ExecutionLogWriter(self.db_manager, execution_id)
+        start_time = time.time()
+        
+        try:
+            result = self._run_task(task, log_writer)
+        except Exception as e:
+            self._fail_execution(task, execution_id, start_time, e)
+        else:
+            self._complete_execution(task, execution_id, start_time, result)
+        return execution_id
+    
+    async def execute_task_async(self, task_id: str, triggered_by: str = 'manual') -> str:
+        """
+        Execute a task on the running event loop and return the execution ID
+        
+        Subprocesses are supervised with asyncio instead of a blocking thread.
+        Database calls run on the loop's default executor.
+        
+        Args:
+            task_id: UUID of the task to execute
+            triggered_by: Source that triggered the execution
+        
+        Returns:
+            execution_id: UUID of the task execution record
+        """
+        loop = asyncio.get_running_loop()
+        task, execution_id = await loop.run_in_executor(
+            None, self._begin_execution, task_id, triggered_by
+        )
+        if not execution_id:
+            return None
+        
+        log_writer = ExecutionLogWriter(self.db_manager, execution_id)
+        start_time = time.time()
+        
+        try:
+            result = await self._run_task_async(task, log_writer)
+        except Exception as e:
+            await loop.run_in_executor(
+                None, self._fail_execution, task, execution_id, start_time, e
+            )
+        else:
+            await loop.run_in_executor(
+                None, self._complete_execution, task, execution_id, start_time, result
+            )
+        return execution_id
+    
+    def _begin_execution(self, task_id: str, triggered_by: str):
+        """
+        Load the task and create a running execution record
+        
+        Returns:
+            Tuple of (task, execution_id), or (task, None) if the task cannot run
+        """
+        # Get task details (cached; revalidated against updated_at)
+        task = self.task_cache.get(task_id)
         if not task:
             logger.error(f"Task {task_id} not found")
-            return None
+            return None, None
         
         if not task['is_enabled']:
             logger.warning(f"Task {task['name']} is disabled")
-            return None
+            return task, None
         
         # Create execution record
         execution_id = self.db_manager.create_task_execution(task_id, triggered_by)
@@ -52,205 +138,195 @@ class TaskExecutor:
         
         # Update status to running
         self.db_manager.update_task_execution_status(execution_id, 'running')
+        return task, execution_id
+    
+    def _complete_execution(self, task: Dict[str, Any], execution_id: str,
+                            start_time: float, result: Tuple[int, str, str]):
+        """Record the outcome of a task that ran to completion"""
+        exit_code, stdout, stderr = result
+        duration_ms = int((time.time() - start_time) * 1000)
         
-        # Execute based on script type
-        start_time = time.time()
+        # Determine status based on exit code
+        status = 'success' if exit_code == 0 else 'failed'
+        error_message = stderr if exit_code != 0 else None
         
-        try:
-            if task['script_type'] == 'python':
-                exit_code, stdout, stderr = self._execute_python(task)
-            elif task['script_type'] == 'bash':
-                exit_code, stdout, stderr = self._execute_bash(task)
-            elif task['script_type'] == 'powershell':
-                exit_code, stdout, stderr = self._execute_powershell(task)
-            elif task['script_type'] == 'lua':
-                exit_code, stdout, stderr = self._execute_lua(task)
-            elif task['script_type'] == 'ruby':
-                exit_code, stdout, stderr = self._execute_ruby(task)
-            else:
-                raise ValueError(f"Unsupported script type: {task['script_type']}")
-            
-            duration_ms = int((time.time() - start_time) * 1000)
-            
-            # Determine status based on exit code
-            status = 'success' if exit_code == 0 else 'failed'
-            error_message = stderr if exit_code != 0 else None
-            
-            # Update execution record
-            self.db_manager.complete_task_execution(
-                execution_id=execution_id,
-                status=status,
-                exit_code=exit_code,
-                stdout=stdout,
-                stderr=stderr,
-                duration_ms=duration_ms,
-                error_message=error_message
-            )
-            
-            logger.info(f"Task '{task['name']}' completed with status: {status} (duration: {duration_ms}ms)")
-            
-            return execution_id
-            
-        except Exception as e:
-            duration_ms = int((time.time() - start_time) * 1000)
-            error_message = str(e)
-            
-            self.db_manager.complete_task_execution(
-                execution_id=execution_id,
-                status='failed',
-                exit_code=-1,
-                stdout='',
-                stderr=error_message,
-                duration_ms=duration_ms,
-                error_message=error_message
-            )
-            
-            logger.error(f"Task '{task['name']}' failed: {error_message}")
-            
-            # Log to system logs
-            self.db_manager.log_system_event(
-                level='error',
-                component='task_executor',
-                message=f"Task execution failed: {task['name']}",
-                stack_trace=error_message,
-                metadata={'task_id': task_id, 'execution_id': execution_id}
-            )
-            
-            return execution_id
+        # Update execution record
+        self.db_manager.complete_task_execution(
+            execution_id=execution_id,
+            status=status,
+            exit_code=exit_code,
+            stdout=stdout,
+            stderr=stderr,
+            duration_ms=duration_ms,
+            error_message=error_message
+        )
+        
+        logger.info(f"Task '{task['name']}' completed with status: {status} (duration: {duration_ms}ms)")
     
-    def _execute_python(self, task: Dict[str, Any]) -> Tuple[int, str, str]:
-        """Execute Python script"""
-        script_content = task['script_content']
+    def _fail_execution(self, task: Dict[str, Any], execution_id: str,
+                        start_time: float, error: Exception):
+        """Record a task that raised instead of producing an exit code"""
+        duration_ms = int((time.time() - start_time) * 1000)
+        error_message = str(error)
+        # Raised by run_process, the Python pool and the Lua pool when a script
+        # (or the wait for a Lua runtime) outlasts its time limit
+        timed_out = isinstance(error, (subprocess.TimeoutExpired, TimeoutError))
+        status = 'timeout' if timed_out else 'failed'
+        outcome = 'timed out' if timed_out else 'failed'
         
-        # Create temporary script file
-        script_path = f"/tmp/omnitasker_python_{task['id']}.py"
-        with open(script_path, 'w') as f:
-            f.write(script_content)
+        self.db_manager.complete_task_execution(
+            execution_id=execution_id,
+            status=status,
+            exit_code=-1,
+            stdout='',
+            stderr=error_message,
+            duration_ms=duration_ms,
+            error_message=error_message
+        )
         
-        try:
-            result = subprocess.run(
-                [sys.executable, script_path],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
-            )
-            return result.returncode, result.stdout, result.stderr
-        finally:
-            # Clean up temporary file
-            if os.path.exists(script_path):
-                os.remove(script_path)
+        logger.error(f"Task '{task['name']}' {outcome}: {error_message}")
+        
+        # Log to system logs
+        self.db_manager.log_system_event(
+            level='error',
+            component='task_executor',
+            message=f"Task execution {outcome}: {task['name']}",
+            stack_trace=error_message,
+            metadata={'task_id': str(task['id']), 'execution_id': execution_id}
+        )
     
-    def _execute_bash(self, task: Dict[str, Any]) -> Tuple[int, str, str]:
-        """Execute Bash script"""
-        if self.os_type == 'Windows':
+    def _run_task(self, task: Dict[str, Any],
+                  log_writer: ExecutionLogWriter = None) -> Tuple[int, str, str]:
+        """Execute based on script type, blocking until the script finishes"""
+        if task['script_type'] == 'lua':
+            return self._execute_lua(task, log_writer)
+        if task['script_type'] == 'python' and self.python_pool:
+            return self.python_pool.run(task['script_content'], self._script_name(task),
+                                        timeout=SCRIPT_TIMEOUT, log_writer=log_writer)
+        
+        if task['script_type'] == 'bash' and self.os_type == 'Windows':
             logger.warning("Bash scripts not natively supported on Windows")
             return -1, '', 'Bash not supported on Windows'
         
-        script_content = task['script_content']
+        cmd, script_path = self._prepare_script(task)
         
-        # Create temporary script file
-        script_path = f"/tmp/omnitasker_bash_{task['id']}.sh"
-        with open(script_path, 'w') as f:
-            f.write(script_content)
+        try:
+            return run_process(cmd, timeout=SCRIPT_TIMEOUT, log_writer=log_writer)
+        except FileNotFoundError:
+            return -1, '', f"{cmd[0]} not found on system"
+        finally:
+            self.script_cache.release(script_path)
+    
+    async def _run_task_async(self, task: Dict[str, Any],
+                              log_writer: ExecutionLogWriter = None) -> Tuple[int, str, str]:
+        """Execute based on script type without blocking the event loop"""
+        if task['script_type'] == 'lua':
+            return await self._execute_lua_async(task, log_writer)
+        if task['script_type'] == 'python' and self.python_pool:
+            return await self.python_pool.run_async(task['script_content'], self._script_name(task),
+                                                    timeout=SCRIPT_TIMEOUT, log_writer=log_writer)
         
-        # Make executable
-        os.chmod(script_path, 0o755)
+        if task['script_type'] == 'bash' and self.os_type == 'Windows':
+            logger.warning("Bash scripts not natively supported on Windows")
+            return -1, '', 'Bash not supported on Windows'
+        
+        cmd, script_path = self._prepare_script(task)
         
         try:
-            result = subprocess.run(
-                ['/bin/bash', script_path],
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            return result.returncode, result.stdout, result.stderr
+            return await run_process_async(cmd, timeout=SCRIPT_TIMEOUT, log_writer=log_writer)
+        except FileNotFoundError:
+            return -1, '', f"{cmd[0]} not found on system"
         finally:
-            if os.path.exists(script_path):
-                os.remove(script_path)
+            self.script_cache.release(script_path)
     
-    def _execute_powershell(self, task: Dict[str, Any]) -> Tuple[int, str, str]:
-        """Execute PowerShell script"""
-        script_content = task['script_content']
+    def _script_name(self, task: Dict[str, Any]) -> str:
+        """Name a pooled script is run under, shown in tracebacks"""
+        return f"omnitasker_python_{task['id']}.py"
+    
+    def _prepare_script(self, task: Dict[str, Any]) -> Tuple[List[str], str]:
+        """
+        Materialize the task script as a file and build its command line
         
-        # Determine PowerShell executable
-        if self.os_type == 'Windows':
-            ps_executable = 'powershell.exe'
-        else:
-            ps_executable = 'pwsh'  # PowerShell Core for Linux/macOS
+        Files are shared by content hash; release the path with
+        script_cache.release() once the process has finished.
+        
+        Returns:
+            Tuple of (command, script_path)
         
-        # Create temporary script file
-        script_path = f"/tmp/omnitasker_ps_{task['id']}.ps1"
-        with open(script_path, 'w') as f:
-            f.write(script_content)
+        Raises:
+            ValueError: If the script type is not supported
+        """
+        script_type = task['script_type']
+        if script_type not in SCRIPT_COMMANDS:
+            raise ValueError(f"Unsupported script type: {script_type}")
+        
+        prefix, suffix = SCRIPT_COMMANDS[script_type]
+        if script_type == 'powershell':
+            # Determine PowerShell executable
+            if self.os_type == 'Windows':
+                ps_executable = 'powershell.exe'
+            else:
+                ps_executable = 'pwsh'  # PowerShell Core for Linux/macOS
+            prefix = [ps_executable] + prefix
         
+        script_path = self.script_cache.acquire(task['script_content'], suffix,
+                                                executable=script_type == 'bash')
+        return prefix + [script_path], script_path
+    
+    def _execute_lua(self, task: Dict[str, Any],
+                     log_writer: ExecutionLogWriter = None) -> Tuple[int, str, str]:
+        """Execute Lua script on a pooled runtime"""
+        error = None
         try:
-            result = subprocess.run(
-                [ps_executable, '-ExecutionPolicy', 'Bypass', '-File', script_path],
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            return result.returncode, result.stdout, result.stderr
-        except FileNotFoundError:
-            return -1, '', f'{ps_executable} not found on system'
+            output = self.lua_pool.execute(task['script_content'], name=f"task {task['name']}",
+                                           timeout=SCRIPT_TIMEOUT, on_print=self._lua_printer(log_writer))
+            return 0, '\n'.join(output), ''
+        
+        except (subprocess.TimeoutExpired, TimeoutError):
+            raise  # Recorded with the timeout status like other script types
+        except Exception as e:
+            error = str(e)
+            return -1, '', error
         finally:
-            if os.path.exists(script_path):
-                os.remove(script_path)
+            self._finish_lua_log(log_writer, error)
     
-    def _execute_lua(self, task: Dict[str, Any]) -> Tuple[int, str, str]:
-        """Execute Lua script using lupa"""
+    async def _execute_lua_async(self, task: Dict[str, Any],
+                                 log_writer: ExecutionLogWriter = None) -> Tuple[int, str, str]:
+        """Execute Lua script on a pooled runtime without blocking the event loop"""
+        error = None
         try:
-            from lupa import LuaRuntime
-            
-            lua = LuaRuntime(unpack_returned_tuples=True)
-            script_content = task['script_content']
-            
-            # Capture output
-            output = []
-            
-            # Override print function to capture output
-            lua.execute("""
-                original_print = print
-                print = function(...)
-                    local args = {...}
-                    for i, v in ipairs(args) do
-                        table.insert(output_buffer, tostring(v))
-                    end
-                end
-                output_buffer = {}
-            """)
-            
-            # Execute the script
-            lua.execute(script_content)
-            
-            # Get output
-            output_buffer = lua.eval('output_buffer')
-            stdout = '\n'.join([str(item) for item in output_buffer])
-            
-            return 0, stdout, ''
-            
+            # lupa runs in-process, on the Lua pool's threads rather than the loop's default executor
+            output = await self.lua_pool.execute_async(task['script_content'], name=f"task {task['name']}",
+                                                       timeout=SCRIPT_TIMEOUT,
+                                                       on_print=self._lua_printer(log_writer))
+            return 0, '\n'.join(output), ''
+        
+        except (subprocess.TimeoutExpired, TimeoutError):
+            raise  # Recorded with the timeout status like other script types
         except Exception as e:
-            return -1, '', str(e)
+            error = str(e)
+            return -1, '', error
+        finally:
+            await asyncio.get_running_loop().run_in_executor(None, self._finish_lua_log, log_writer, error)
     
-    def _execute_ruby(self, task: Dict[str, Any]) -> Tuple[int, str, str]:
-        """Execute Ruby script"""
-        script_content = task['script_content']
+    def _lua_printer(self, log_writer: ExecutionLogWriter = None):
+        """
+        Callback streaming a Lua script's printed lines to the execution log
         
-        # Create temporary script file
-        script_path = f"/tmp/omnitasker_ruby_{task['id']}.rb"
-        with open(script_path, 'w') as f:
-            f.write(script_content)
+        It runs on the Lua pool's thread, so it may block on the database.
+        """
+        if log_writer is None:
+            return None
         
-        try:
-            result = subprocess.run(
-                ['ruby', script_path],
-                capture_output=True,
-                text=True,
-                timeout=300
-            )
-            return result.returncode, result.stdout, result.stderr
-        except FileNotFoundError:
-            return -1, '', 'Ruby not found on system'
-        finally:
-            if os.path.exists(script_path):
-                os.remove(script_path)
+        def on_print(line: str):
+            log_writer.write('stdout', line + '\n')
+            log_writer.flush_if_due()
+        return on_print
+    
+    def _finish_lua_log(self, log_writer: ExecutionLogWriter = None, error: str = None):
+        """Write a Lua error to the execution log's stderr and flush what is buffered"""
+        if log_writer is None:
+            return
+        if error:
+            log_writer.write('stderr', error + '\n')
+        log_writer.flush()
@@ -0,0 +1,209 @@
+"""
+Task Worker Pool
+Bounded thread pool that dispatches task executions concurrently
+"""
+import os
+import logging
+import threading
+from collections import deque
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def parse_type_limits(spec: str) -> Dict[str, int]:
+    """
+    Parse a per-script-type concurrency spec such as "powershell=2,ruby=4"
+    
+    Args:
+        spec: Comma separated list of script_type=limit pairs
+    
+    Returns:
+        Dict mapping script type to its maximum parallelism
+    """
+    limits = {}
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        script_type, _, value = item.partition('=')
+        try:
+            limits[script_type.strip()] = max(1, int(value))
+        except ValueError:
+            logger.warning(f"Ignoring invalid concurrency limit: {item}")
+    return limits
+
+
+class TaskWorkerPool:
+    """Runs task executions on a bounded set of worker threads"""
+    
+    def __init__(self, task_executor, max_workers: int = None,
+                 max_queue_size: int = None, type_limits: Dict[str, int] = None):
+        """
+        Initialize the worker pool
+        
+        Args:
+            task_executor: TaskExecutor used to run each task
+            max_workers: Number of worker threads (total parallelism)
+            max_queue_size: Number of tasks allowed to wait for a free worker
+            type_limits: Maximum parallelism per script_type
+        """
+        self.task_executor = task_executor
+        self.max_workers = max_workers or int(os.getenv('TASK_WORKER_POOL_SIZE', 8))
+        self.max_queue_size = max_queue_size if max_queue_size is not None else \
+            int(os.getenv('TASK_WORKER_QUEUE_SIZE', 100))
+        self.type_limits = type_limits if type_limits is not None else \
+            parse_type_limits(os.getenv('TASK_TYPE_CONCURRENCY', ''))
+        
+        # Admission slots: running + queued tasks, used for backpressure
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue_size)
+        self._cond = threading.Condition()
+        self._pending: Dict[str, deque] = {}
+        self._running: Dict[str, int] = {}
+        self._admitted = 0  # Tasks holding an admission slot
+        self._accepting = False
+        self._workers = []
+    
+    def start(self):
+        """Start the worker threads"""
+        with self._cond:
+            if self._accepting:
+                return
+            self._accepting = True
+        
+        for i in range(self.max_workers):
+            worker = threading.Thread(
+                target=self._worker_loop,
+                name=f"task-worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+        
+        logger.info(f"Task worker pool started with {self.max_workers} workers "
+                    f"(queue size: {self.max_queue_size}, type limits: {self.type_limits or 'none'})")
+    
+    def submit(self, task_id: str, script_type: str, triggered_by: str = 'manual',
+               on_complete: Callable[[Optional[str]], None] = None,
+               timeout: float = None) -> bool:
+        """
+        Queue a task for execution
+        
+        Blocks for up to `timeout` seconds while the pool is full.
+        
+        Args:
+            task_id: UUID of the task to execute
+            script_type: Script type of the task, used for per-type limits
+            triggered_by: Source that triggered the execution
+            on_complete: Optional callback receiving the execution ID
+            timeout: Seconds to wait for a free slot (None waits forever)
+        
+        Returns:
+            True if the task was queued, False if the pool is full or stopped
+        """
+        if not self._accepting:
+            logger.warning(f"Worker pool is not accepting tasks, rejected task {task_id}")
+            return False
+        
+        if not self._slots.acquire(timeout=timeout):
+            logger.warning(f"Worker pool is full, could not queue task {task_id}")
+            return False
+        
+        with self._cond:
+            if not self._accepting:
+                self._slots.release()
+                return False
+            self._admitted += 1
+            self._pending.setdefault(script_type, deque()).append(
+                (task_id, triggered_by, on_complete)
+            )
+            self._cond.notify()
+        return True
+    
+    def shutdown(self, wait: bool = True, timeout: float = None):
+        """
+        Stop accepting tasks and drain the queue
+        
+        Args:
+            wait: Whether to wait for queued and running tasks to finish
+            timeout: Maximum seconds to wait for the drain
+        """
+        with self._cond:
+            self._accepting = False
+            self._cond.notify_all()
+        
+        if wait:
+            for worker in self._workers:
+                worker.join(timeout=timeout)
+            remaining = [w for w in self._workers if w.is_alive()]
+            if remaining:
+                logger.warning(f"{len(remaining)} task workers still busy after drain timeout")
+        
+        self._workers = []
+        logger.info("Task worker pool stopped")
+    
+    def available_slots(self) -> int:
+        """Number of tasks that can be submitted without blocking"""
+        with self._cond:
+            if not self._accepting:
+                return 0
+            return self.max_workers + self.max_queue_size - self._admitted
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get current queue and running counts per script type"""
+        with self._cond:
+            return {
+                'max_workers': self.max_workers,
+                'queued': {t: len(q) for t, q in self._pending.items() if q},
+                'running': {t: n for t, n in self._running.items() if n},
+            }
+    
+    def _next_task(self):
+        """Pop the next task whose script type has spare capacity (lock held)"""
+        for script_type, queue in self._pending.items():
+            if not queue:
+                continue
+            limit = self.type_limits.get(script_type)
+            if limit is not None and self._running.get(script_type, 0) >= limit:
+                continue
+            return script_type, queue.popleft()
+        return None
+    
+    def _has_pending(self) -> bool:
+        """Check whether any task is still queued (lock held)"""
+        return any(self._pending.values())
+    
+    def _worker_loop(self):
+        """Worker thread loop"""
+        while True:
+            with self._cond:
+                item = self._next_task()
+                while item is None:
+                    if not self._accepting and not self._has_pending():
+                        return
+                    self._cond.wait()
+                    item = self._next_task()
+                
+                script_type, (task_id, triggered_by, on_complete) = item
+                self._running[script_type] = self._running.get(script_type, 0) + 1
+            
+            execution_id = None
+            try:
+                execution_id = self.task_executor.execute_task(
+                    task_id=task_id,
+                    triggered_by=triggered_by
+                )
+            except Exception as e:
+                logger.error(f"Unhandled error executing task {task_id}: {e}")
+            finally:
+                with self._cond:
+                    self._running[script_type] -= 1
+                    self._admitted -= 1
+                    self._cond.notify_all()
+                self._slots.release()
+            
+            if on_complete:
+                try:
+                    on_complete(execution_id)
+                except Exception as e:
+                    logger.error(f"Error in completion callback for task {task_id}: {e}")
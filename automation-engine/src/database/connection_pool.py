@@ -0,0 +1,271 @@
+"""
+Connection Pool
+Thread-safe PostgreSQL connection pool with bounded waits, validation and metrics
+"""
+import os
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """No connection became available within the checkout timeout"""
+
+
+class ConnectionPool:
+    """
+    Blocking connection pool shared by the scheduler, workers and writers
+    
+    When every connection is checked out, getconn() waits up to `timeout`
+    seconds for one to be returned instead of failing at once. Connections
+    older than max_lifetime are closed on return, connections idle for
+    longer than validate_after are checked with a round-trip before reuse,
+    and broken connections are replaced transparently.
+    
+    Wait time, checkout duration and saturation counters are kept so that
+    starvation is visible in get_stats() before it turns into timeouts.
+    """
+    
+    def __init__(self, min_size: int = None, max_size: int = None, timeout: float = None,
+                 max_lifetime: float = None, validate_after: float = None, **connect_kwargs):
+        """
+        Initialize the pool and open min_size connections
+        
+        Args:
+            min_size: Connections kept open even when idle
+            max_size: Maximum open connections
+            timeout: Seconds getconn() waits for a free connection
+            max_lifetime: Seconds after which a connection is replaced
+            validate_after: Idle seconds after which a connection is pinged before reuse
+            **connect_kwargs: Passed to psycopg2.connect
+        """
+        self.min_size = min_size if min_size is not None else int(os.getenv('DB_POOL_MIN', 1))
+        self.max_size = max_size or int(os.getenv('DB_POOL_MAX', 10))
+        self.timeout = timeout if timeout is not None else float(os.getenv('DB_POOL_TIMEOUT', 30))
+        self.max_lifetime = max_lifetime if max_lifetime is not None else \
+            float(os.getenv('DB_POOL_MAX_LIFETIME', 1800))
+        self.validate_after = validate_after if validate_after is not None else \
+            float(os.getenv('DB_POOL_VALIDATE_AFTER', 30))
+        if self.min_size > self.max_size:
+            raise ValueError(f"DB_POOL_MIN ({self.min_size}) exceeds DB_POOL_MAX ({self.max_size})")
+        self.connect_kwargs = connect_kwargs
+        
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        # id(conn) -> [created_at, last_returned_at, checked_out_at]
+        self._meta: Dict[int, list] = {}
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_closed': 0,
+            'recycled_lifetime': 0,
+            'validation_failures': 0,
+            'broken_returns': 0,
+            'peak_in_use': 0,
+            'total_wait_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'total_checkout_ms': 0.0,
+            'max_checkout_ms': 0.0,
+        }
+        
+        for _ in range(self.min_size):
+            with self._cond:
+                self._size += 1
+            self._idle.append(self._connect())
+    
+    def getconn(self, timeout: float = None):
+        """
+        Check out a connection, waiting for one if the pool is exhausted
+        
+        Raises:
+            PoolTimeout: If none is available within the timeout
+            PoolError: If the pool is closed
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+        
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()  # Most recently used: warmest and least likely stale
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f"No database connection available within {timeout}s "
+                            f"({self._size} open, {self._waiting} waiting)"
+                        )
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+            
+            if conn is None:
+                conn = self._connect()
+            elif not self._usable(conn):
+                self._discard(conn)
+                continue
+            break
+        
+        now = time.monotonic()
+        wait_ms = (now - start) * 1000
+        with self._cond:
+            self._meta[id(conn)][2] = now
+            self._stats['checkouts'] += 1
+            self._stats['total_wait_ms'] += wait_ms
+            self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], wait_ms)
+            in_use = self._size - len(self._idle)
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'], in_use)
+        return conn
+    
+    def putconn(self, conn, close: bool = False):
+        """Return a connection, closing it if broken, expired or requested"""
+        now = time.monotonic()
+        with self._cond:
+            meta = self._meta.get(id(conn))
+            if meta is None:
+                raise PoolError("trying to put unkeyed connection")
+            if meta[2] is not None:
+                held_ms = (now - meta[2]) * 1000
+                self._stats['total_checkout_ms'] += held_ms
+                self._stats['max_checkout_ms'] = max(self._stats['max_checkout_ms'], held_ms)
+                meta[2] = None
+            closed = self._closed
+        
+        if not close and not closed and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                    with self._cond:
+                        self._stats['broken_returns'] += 1
+                    close = True
+                elif status != extensions.TRANSACTION_STATUS_IDLE:
+                    # Leave no transaction open for the next borrower
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+            if not close and now - meta[0] >= self.max_lifetime:
+                with self._cond:
+                    self._stats['recycled_lifetime'] += 1
+                close = True
+        
+        if close or closed or conn.closed:
+            self._discard(conn)
+            return
+        with self._cond:
+            meta[1] = now
+            self._idle.append(conn)
+            self._cond.notify()
+    
+    @contextmanager
+    def connection(self, timeout: float = None):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+    
+    def closeall(self):
+        """Close idle connections now and checked-out ones when they are returned"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get pool size, utilisation, wait and checkout-duration metrics"""
+        with self._cond:
+            stats = dict(self._stats)
+            in_use = self._size - len(self._idle)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': in_use,
+                'waiting': self._waiting,
+                'max_size': self.max_size,
+                'saturation': in_use / self.max_size,
+                'avg_wait_ms': stats['total_wait_ms'] / stats['checkouts'] if stats['checkouts'] else 0.0,
+                'avg_checkout_ms': stats['total_checkout_ms'] / stats['checkouts'] if stats['checkouts'] else 0.0,
+            })
+            return stats
+    
+    def _connect(self):
+        """Open a connection for a slot already counted in _size"""
+        try:
+            conn = psycopg2.connect(**self.connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        now = time.monotonic()
+        with self._cond:
+            self._meta[id(conn)] = [now, now, None]
+            self._stats['connections_created'] += 1
+        return conn
+    
+    def _usable(self, conn) -> bool:
+        """Check an idle connection before handing it out"""
+        if conn.closed:
+            return False
+        meta = self._meta[id(conn)]
+        now = time.monotonic()
+        if now - meta[0] >= self.max_lifetime:
+            with self._cond:
+                self._stats['recycled_lifetime'] += 1
+            return False
+        if now - meta[1] < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Discarding stale database connection: {e}")
+            with self._cond:
+                self._stats['validation_failures'] += 1
+            return False
+    
+    def _discard(self, conn):
+        """Close a connection and free its slot"""
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            if self._meta.pop(id(conn), None) is not None:
+                self._size -= 1
+                self._stats['connections_closed'] += 1
+            self._cond.notify()
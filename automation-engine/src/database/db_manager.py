@@ -3,15 +3,28 @@ Database Manager
 Handles all database operations for OmniTasker
 """
 import os
+import uuid
 import logging
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Iterator, Sequence
 from datetime import datetime
 import psycopg2
-from psycopg2.extras import RealDictCursor, Json
-from psycopg2.pool import SimpleConnectionPool
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, Json, execute_batch, execute_values
+from src.database.connection_pool import ConnectionPool
+from src.database.prepared import PreparedStatements
+from src.database.write_buffer import ExecutionWriteBuffer
+from src.database.log_sink import SystemLogSink
 
 logger = logging.getLogger(__name__)
 
+# Task columns for listings; script bodies are fetched per task when it runs
+TASK_SUMMARY_COLUMNS = ('id', 'user_id', 'name', 'script_type', 'script_path',
+                        'is_enabled', 'created_at', 'updated_at', 'metadata')
+
+# Plugin columns needed to resolve, load and run a plugin
+PLUGIN_COLUMNS = ('id', 'name', 'plugin_type', 'version', 'file_path',
+                  'is_enabled', 'config', 'updated_at')
+
 
 class DatabaseManager:
     """Manages database connections and operations"""
@@ -26,122 +39,275 @@ class DatabaseManager:
             'password': os.getenv('DB_PASSWORD', 'omnitasker_secure_pass')
         }
         
-        # Create connection pool
-        self.pool = SimpleConnectionPool(
-            minconn=1,
-            maxconn=10,
-            **self.db_config
-        )
-        logger.info("Database connection pool created")
+        # Create connection pool (shared by the scheduler, task workers and
+        # background writers); sized by DB_POOL_MIN / DB_POOL_MAX
+        self.pool = ConnectionPool(**self.db_config)
+        logger.info(f"Database connection pool created (max {self.pool.max_size} connections)")
+        
+        # Rows per round-trip when streaming large result sets
+        self.fetch_size = int(os.getenv('DB_FETCH_SIZE', 500))
+        
+        # Hot statements are parsed and planned once per connection
+        self.statements = PreparedStatements()
+        
+        # Execution lifecycle writes are buffered and flushed in batches
+        self.execution_buffer = ExecutionWriteBuffer(self)
+        self.execution_buffer.start()
+        
+        # System events are queued and bulk-loaded off the calling thread
+        self.log_sink = SystemLogSink(self)
+        self.log_sink.start()
     
     def get_connection(self):
-        """Get a connection from the pool"""
+        """
+        Get a connection from the pool
+        
+        Waits up to DB_POOL_TIMEOUT seconds when all connections are in use.
+        
+        Raises:
+            PoolTimeout: If no connection became available in time
+        """
         return self.pool.getconn()
     
     def return_connection(self, conn):
         """Return a connection to the pool"""
         self.pool.putconn(conn)
     
+    def get_pool_stats(self):
+        """Get connection pool utilisation, wait and checkout metrics"""
+        return self.pool.get_stats()
+    
+    def get_statement_stats(self) -> Dict[str, Any]:
+        """Get prepared statement counters"""
+        return self.statements.get_stats()
+    
+    def create_listener_connection(self, channel: str):
+        """
+        Open a dedicated connection subscribed to a NOTIFY channel
+        
+        The connection is not taken from the pool; the caller owns it and
+        must close it when done.
+        """
+        conn = psycopg2.connect(**self.db_config)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {channel}")
+        return conn
+    
     def close(self):
-        """Close all connections in the pool"""
+        """Flush buffered writes and close all connections in the pool"""
+        self.log_sink.stop()
+        self.execution_buffer.stop()
         self.pool.closeall()
         logger.info("Database connections closed")
     
-    # ==================== Task Operations ====================
-    
-    def get_enabled_tasks(self) -> List[Dict[str, Any]]:
-        """Get all enabled tasks"""
+    def _stream(self, query, params=None, fetch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield rows from a server-side cursor, fetch_size rows per round-trip
+        
+        Only one batch is held in memory at a time. The connection stays
+        checked out until the generator is exhausted or closed, so consume
+        it promptly (or close it) rather than keeping it around.
+        """
         conn = self.get_connection()
         try:
-            with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
-                    SELECT * FROM tasks 
-                    WHERE is_enabled = TRUE
-                    ORDER BY created_at DESC
-                """)
-                return [dict(row) for row in cur.fetchall()]
+            with conn.cursor(name=f"omnitasker_{uuid.uuid4().hex}",
+                             cursor_factory=RealDictCursor) as cur:
+                cur.itersize = fetch_size or self.fetch_size
+                cur.execute(query, params)
+                for row in cur:
+                    yield dict(row)
         finally:
+            # Ends the read transaction the named cursor lived in
+            conn.rollback()
             self.return_connection(conn)
     
+    @staticmethod
+    def _columns(columns: Optional[Sequence[str]]):
+        """Build a SELECT column list; None selects every column"""
+        if columns is None:
+            return sql.SQL("*")
+        return sql.SQL(', ').join(sql.Identifier(c) for c in columns)
+    
+    # ==================== Task Operations ====================
+    
+    def iter_enabled_tasks(self, columns: Optional[Sequence[str]] = TASK_SUMMARY_COLUMNS,
+                           fetch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream enabled tasks
+        
+        Args:
+            columns: Columns to fetch (defaults to everything but script bodies; None for all)
+            fetch_size: Rows per round-trip (defaults to DB_FETCH_SIZE)
+        """
+        query = sql.SQL("""
+            SELECT {columns} FROM tasks
+            WHERE is_enabled = TRUE
+            ORDER BY created_at DESC
+        """).format(columns=self._columns(columns))
+        return self._stream(query, fetch_size=fetch_size)
+    
+    def get_enabled_tasks(self, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get all enabled tasks (prefer iter_enabled_tasks for large tables)"""
+        return list(self.iter_enabled_tasks(columns))
+    
     def get_task_by_id(self, task_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific task by ID"""
         conn = self.get_connection()
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("SELECT * FROM tasks WHERE id = %s", (task_id,))
+                self.statements.execute(cur, 'get_task_by_id', (task_id,))
                 result = cur.fetchone()
                 return dict(result) if result else None
         finally:
             self.return_connection(conn)
     
-    # ==================== Task Execution Operations ====================
-    
-    def create_task_execution(self, task_id: str, triggered_by: str = 'manual') -> str:
-        """Create a new task execution record"""
+    def get_task_version(self, task_id: str) -> Optional[datetime]:
+        """Get a task's updated_at without loading the row, None if it does not exist"""
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO task_executions (task_id, status, triggered_by)
-                    VALUES (%s, 'pending', %s)
-                    RETURNING id
-                """, (task_id, triggered_by))
-                execution_id = cur.fetchone()[0]
-                conn.commit()
-                return execution_id
+                self.statements.execute(cur, 'get_task_version', (task_id,))
+                result = cur.fetchone()
+                return result[0] if result else None
         finally:
             self.return_connection(conn)
     
-    def update_task_execution_status(self, execution_id: str, status: str):
-        """Update task execution status"""
+    # ==================== Task Execution Operations ====================
+    
+    def create_task_execution(self, task_id: str, triggered_by: str = 'manual') -> str:
+        """
+        Create a new task execution record
+        
+        The ID is generated client-side and the row is written by the next
+        buffer flush, so this does not wait on the database.
+        """
+        return self.execution_buffer.create(task_id, triggered_by)
+    
+    def update_task_execution_status(self, execution_id: str, status: str, sync: bool = False):
+        """Update task execution status (buffered unless sync)"""
+        self.execution_buffer.set_status(execution_id, status, sync=sync)
+    
+    def complete_task_execution(self, execution_id: str, status: str, 
+                               exit_code: int, stdout: str, stderr: str,
+                               duration_ms: int, error_message: str = None,
+                               sync: bool = None):
+        """
+        Complete a task execution with results
+        
+        Args:
+            sync: Wait until the result is committed (defaults to
+                EXECUTION_SYNC_COMPLETE); concurrent completions share one flush
+        """
+        self.execution_buffer.complete(execution_id, {
+            'status': status,
+            'exit_code': exit_code,
+            'stdout': stdout,
+            'stderr': stderr,
+            'duration_ms': duration_ms,
+            'error_message': error_message,
+        }, sync=sync)
+    
+    def get_execution_buffer_stats(self) -> Dict[str, Any]:
+        """Get execution write buffer flush metrics"""
+        return self.execution_buffer.get_stats()
+    
+    def append_execution_logs(self, chunks: List[tuple]):
+        """
+        Append output chunks to the execution log
+        
+        Args:
+            chunks: (execution_id, seq, stream, content) tuples
+        """
+        self.execution_buffer.ensure_persisted({chunk[0] for chunk in chunks})
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE task_executions 
-                    SET status = %s, updated_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (status, execution_id))
+                execute_values(cur, """
+                    INSERT INTO task_execution_logs (execution_id, seq, stream, content)
+                    VALUES %s
+                """, chunks)
+                # Wake anyone following these executions
+                for execution_id in {str(chunk[0]) for chunk in chunks}:
+                    cur.execute("SELECT pg_notify('execution_logs', %s)", (execution_id,))
                 conn.commit()
         finally:
             self.return_connection(conn)
     
-    def complete_task_execution(self, execution_id: str, status: str, 
-                               exit_code: int, stdout: str, stderr: str,
-                               duration_ms: int, error_message: str = None):
-        """Complete a task execution with results"""
+    def get_execution_logs(self, execution_id: str, after_seq: int = -1,
+                           limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Get execution log chunks after a sequence number
+        
+        Followers pass the last seq they have seen, so each poll reads only
+        new chunks through the (execution_id, seq) index.
+        """
         conn = self.get_connection()
         try:
-            with conn.cursor() as cur:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
-                    UPDATE task_executions 
-                    SET status = %s, 
-                        exit_code = %s,
-                        stdout = %s,
-                        stderr = %s,
-                        duration_ms = %s,
-                        error_message = %s,
-                        completed_at = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (status, exit_code, stdout, stderr, duration_ms, error_message, execution_id))
-                conn.commit()
+                    SELECT seq, stream, content, created_at
+                    FROM task_execution_logs
+                    WHERE execution_id = %s AND seq > %s
+                    ORDER BY seq
+                    LIMIT %s
+                """, (execution_id, after_seq, limit))
+                return [dict(row) for row in cur.fetchall()]
         finally:
             self.return_connection(conn)
     
     # ==================== Schedule Operations ====================
     
+    def iter_active_schedules(self, fetch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """Stream active schedules with the task fields the scheduler needs"""
+        return self._stream("""
+            SELECT s.*, t.name as task_name, t.script_type,
+                   t.is_enabled as task_enabled,
+                   GREATEST(s.updated_at, t.updated_at) as changed_at
+            FROM schedules s
+            JOIN tasks t ON s.task_id = t.id
+            WHERE s.is_active = TRUE AND t.is_enabled = TRUE
+        """, fetch_size=fetch_size)
+    
     def get_active_schedules(self) -> List[Dict[str, Any]]:
-        """Get all active schedules"""
+        """Get all active schedules (prefer iter_active_schedules for large tables)"""
+        return list(self.iter_active_schedules())
+    
+    def get_schedules_changed_since(self, since: datetime) -> List[Dict[str, Any]]:
+        """
+        Get schedules whose row or task changed after a timestamp
+        
+        Inactive schedules and disabled tasks are included so callers can
+        evict them.
+        """
         conn = self.get_connection()
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
-                    SELECT s.*, t.name as task_name, t.script_type
+                    SELECT s.*, t.name as task_name, t.script_type,
+                           t.is_enabled as task_enabled,
+                           GREATEST(s.updated_at, t.updated_at) as changed_at
+                    FROM schedules s
+                    JOIN tasks t ON s.task_id = t.id
+                    WHERE s.updated_at > %s OR t.updated_at > %s
+                    ORDER BY changed_at
+                """, (since, since))
+                return [dict(row) for row in cur.fetchall()]
+        finally:
+            self.return_connection(conn)
+    
+    def get_active_schedule_ids(self) -> List[str]:
+        """Get the IDs of all active schedules"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT s.id
                     FROM schedules s
                     JOIN tasks t ON s.task_id = t.id
                     WHERE s.is_active = TRUE AND t.is_enabled = TRUE
                 """)
-                return [dict(row) for row in cur.fetchall()]
+                return [row[0] for row in cur.fetchall()]
         finally:
             self.return_connection(conn)
     
@@ -150,57 +316,182 @@ class DatabaseManager:
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
-                cur.execute("""
-                    UPDATE schedules 
-                    SET next_run = %s, last_run = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (next_run, schedule_id))
+                self.statements.execute(cur, 'update_schedule_next_run', (next_run, schedule_id))
                 conn.commit()
         finally:
             self.return_connection(conn)
     
-    # ==================== Plugin Operations ====================
+    def claim_schedules(self, schedule_ids: List[str], node_id: str,
+                        lease_seconds: int, due_before: datetime) -> List[str]:
+        """
+        Lease due schedules for this node
+        
+        Rows locked by a concurrent claim are skipped, and rows whose lease
+        has not expired are left alone, so each due run is claimed by exactly
+        one engine node. Expired leases (from a dead node) can be taken over.
+        
+        Returns:
+            IDs of the schedules this node now holds
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                self.statements.execute(cur, 'claim_schedules',
+                                        (node_id, lease_seconds, schedule_ids, due_before))
+                claimed = [str(row[0]) for row in cur.fetchall()]
+                conn.commit()
+                return claimed
+        finally:
+            self.return_connection(conn)
+    
+    def release_schedules(self, node_id: str, releases: List[tuple]):
+        """
+        Release schedule leases held by this node
+        
+        Args:
+            node_id: Node that holds the leases
+            releases: (schedule_id, next_run) pairs; a next_run of None keeps
+                the current value so the run can be picked up again
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                execute_batch(cur, """
+                    UPDATE schedules
+                    SET next_run = COALESCE(%(next_run)s, next_run),
+                        last_run = CASE WHEN %(next_run)s IS NULL THEN last_run
+                                        ELSE CURRENT_TIMESTAMP END,
+                        lease_owner = NULL,
+                        lease_expires_at = NULL
+                    WHERE id = %(id)s AND lease_owner = %(node_id)s
+                """, [{'id': schedule_id, 'next_run': next_run, 'node_id': node_id}
+                      for schedule_id, next_run in releases])
+                conn.commit()
+        finally:
+            self.return_connection(conn)
     
-    def get_enabled_plugins(self) -> List[Dict[str, Any]]:
-        """Get all enabled plugins"""
+    def get_schedule_leases(self, schedule_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get next_run and lease state for a set of schedules"""
         conn = self.get_connection()
         try:
             with conn.cursor(cursor_factory=RealDictCursor) as cur:
                 cur.execute("""
-                    SELECT * FROM plugins 
-                    WHERE is_enabled = TRUE
-                    ORDER BY name
-                """)
+                    SELECT id, is_active, next_run, lease_owner, lease_expires_at
+                    FROM schedules
+                    WHERE id = ANY(%s::uuid[])
+                """, (schedule_ids,))
+                return [dict(row) for row in cur.fetchall()]
+        finally:
+            self.return_connection(conn)
+    
+    # ==================== Plugin Operations ====================
+    
+    def iter_enabled_plugins(self, columns: Optional[Sequence[str]] = PLUGIN_COLUMNS,
+                             fetch_size: int = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream enabled plugins
+        
+        Args:
+            columns: Columns to fetch (defaults to PLUGIN_COLUMNS; None for all)
+            fetch_size: Rows per round-trip (defaults to DB_FETCH_SIZE)
+        """
+        query = sql.SQL("""
+            SELECT {columns} FROM plugins
+            WHERE is_enabled = TRUE
+            ORDER BY name
+        """).format(columns=self._columns(columns))
+        return self._stream(query, fetch_size=fetch_size)
+    
+    def get_enabled_plugins(self, columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Get all enabled plugins (prefer iter_enabled_plugins for large tables)"""
+        return list(self.iter_enabled_plugins(columns))
+    
+    def get_plugins_changed_since(self, since: datetime,
+                                  columns: Optional[Sequence[str]] = PLUGIN_COLUMNS) -> List[Dict[str, Any]]:
+        """
+        Get plugins updated after a timestamp
+        
+        Disabled plugins are included so callers can evict them.
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                cur.execute(sql.SQL("""
+                    SELECT {columns} FROM plugins
+                    WHERE updated_at > %s
+                    ORDER BY updated_at
+                """).format(columns=self._columns(columns)), (since,))
                 return [dict(row) for row in cur.fetchall()]
         finally:
             self.return_connection(conn)
     
+    def get_enabled_plugin_ids(self) -> List[str]:
+        """Get the IDs of all enabled plugins"""
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id FROM plugins WHERE is_enabled = TRUE")
+                return [row[0] for row in cur.fetchall()]
+        finally:
+            self.return_connection(conn)
+    
     # ==================== AI Results Operations ====================
     
     def save_ai_result(self, task_execution_id: str, ai_type: str,
                       input_data: str, output_data: Dict[str, Any],
                       confidence_score: float = None, processing_time_ms: int = None,
-                      model_name: str = None):
+                      model_name: str = None, input_file_path: str = None,
+                      metadata: Dict[str, Any] = None):
         """Save AI processing results"""
+        if task_execution_id:
+            self.execution_buffer.ensure_persisted([task_execution_id])
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
                 cur.execute("""
                     INSERT INTO ai_results 
-                    (task_execution_id, ai_type, input_data, output_data, 
-                     confidence_score, processing_time_ms, model_name)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (task_execution_id, ai_type, input_data, Json(output_data),
-                      confidence_score, processing_time_ms, model_name))
+                    (task_execution_id, ai_type, input_data, input_file_path, output_data, 
+                     confidence_score, processing_time_ms, model_name, metadata)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (task_execution_id, ai_type, input_data, input_file_path, Json(output_data),
+                      confidence_score, processing_time_ms, model_name, Json(metadata or {})))
                 conn.commit()
         finally:
             self.return_connection(conn)
     
+    def find_ai_result(self, cache_key: str, max_age_days: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Latest output saved for an AI result cache key
+        
+        Args:
+            cache_key: metadata cache_key written by the AI result cache
+            max_age_days: Ignore results older than this (0 for no limit)
+        
+        Returns:
+            The output_data dict, None if there is none
+        """
+        conn = self.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT output_data FROM ai_results
+                    WHERE metadata->>'cache_key' = %s
+                      AND (%s = 0 OR created_at >= CURRENT_TIMESTAMP - make_interval(days => %s))
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                """, (cache_key, max_age_days, max_age_days))
+                row = cur.fetchone()
+                return row[0] if row else None
+        finally:
+            self.return_connection(conn)
+    
     # ==================== Notification Operations ====================
     
     def create_notification(self, task_execution_id: str, notification_type: str,
                           recipient: str, subject: str, message: str):
         """Create a notification record"""
+        if task_execution_id:
+            self.execution_buffer.ensure_persisted([task_execution_id])
         conn = self.get_connection()
         try:
             with conn.cursor() as cur:
@@ -234,16 +525,18 @@ class DatabaseManager:
     # ==================== System Logs ====================
     
     def log_system_event(self, level: str, component: str, message: str,
-                        stack_trace: str = None, metadata: Dict = None):
-        """Log a system event"""
-        conn = self.get_connection()
-        try:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    INSERT INTO system_logs 
-                    (level, component, message, stack_trace, metadata)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (level, component, message, stack_trace, Json(metadata or {})))
-                conn.commit()
-        finally:
-            self.return_connection(conn)
+                        stack_trace: str = None, metadata: Dict = None) -> bool:
+        """
+        Log a system event
+        
+        The event is queued and written in the background; this never waits
+        on the database. Under overload low-severity events may be discarded.
+        
+        Returns:
+            True if the event was queued
+        """
+        return self.log_sink.emit(level, component, message, stack_trace, metadata)
+    
+    def get_log_sink_stats(self) -> Dict[str, Any]:
+        """Get system log queue depth and drop counters"""
+        return self.log_sink.get_stats()
@@ -0,0 +1,244 @@
+"""
+System Log Sink
+Bounded, non-blocking queue that bulk-loads system_logs rows with COPY
+"""
+import io
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any
+import pytz
+
+logger = logging.getLogger(__name__)
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40, 'critical': 50}
+
+# Events below this level are sampled under pressure and dropped first on overflow
+HIGH_SEVERITY = LEVELS['error']
+
+COLUMNS = ('level', 'component', 'message', 'stack_trace', 'created_at', 'metadata')
+
+
+def _copy_field(value) -> str:
+    """Encode one value for COPY text format"""
+    if value is None:
+        return '\\N'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+class SystemLogSink:
+    """
+    Asynchronous writer for system_logs
+    
+    emit() only appends to an in-memory queue, so an error storm never
+    waits on the database. A background thread drains the queue in batches
+    with COPY. The queue is bounded:
+    
+    - above the high-water mark only every Nth low-severity event is kept;
+    - when full, low-severity events are dropped, and error/critical events
+      evict the oldest low-severity event (or are dropped if there is none).
+    
+    Dropped events are counted per level and reported in a warning row
+    written with the next batch.
+    """
+    
+    def __init__(self, db_manager, max_queue: int = None, batch_size: int = None,
+                 flush_interval: float = None, sample_every: int = None):
+        """
+        Initialize the log sink
+        
+        Args:
+            db_manager: DatabaseManager providing connections
+            max_queue: Maximum queued events
+            batch_size: Maximum events written per COPY
+            flush_interval: Seconds between flushes when the queue is not full
+            sample_every: Keep one in N low-severity events above the high-water mark
+        """
+        self.db_manager = db_manager
+        self.max_queue = max_queue or int(os.getenv('SYSTEM_LOG_QUEUE_SIZE', 10000))
+        self.batch_size = batch_size or int(os.getenv('SYSTEM_LOG_BATCH_SIZE', 1000))
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            float(os.getenv('SYSTEM_LOG_FLUSH_INTERVAL', 1.0))
+        self.sample_every = sample_every or int(os.getenv('SYSTEM_LOG_SAMPLE_EVERY', 10))
+        self.high_water = self.max_queue * 3 // 4
+        
+        self._high: deque = deque()
+        self._low: deque = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._sample_counter = 0
+        self._unreported_drops: Dict[str, int] = {}
+        self._stats = {
+            'emitted': 0,
+            'written': 0,
+            'sampled_out': 0,
+            'dropped': 0,
+            'write_failed': 0,
+            'flushes': 0,
+            'last_flush_ms': 0.0,
+        }
+        self._dropped_by_level: Dict[str, int] = {}
+    
+    def start(self):
+        """Start the background flusher"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='system-log-sink', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the flusher and write whatever is still queued"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        while self.flush():
+            pass
+    
+    def emit(self, level: str, component: str, message: str,
+             stack_trace: str = None, metadata: Dict = None) -> bool:
+        """
+        Queue a system event without blocking
+        
+        Returns:
+            True if the event was queued, False if it was sampled out or dropped
+        """
+        level = level.lower()
+        severity = LEVELS.get(level, LEVELS['info'])
+        event = (level, component, message, stack_trace,
+                 datetime.now(pytz.UTC), json.dumps(metadata or {}, default=str))
+        
+        with self._lock:
+            self._stats['emitted'] += 1
+            queued = len(self._high) + len(self._low)
+            if severity < HIGH_SEVERITY:
+                if queued >= self.max_queue:
+                    self._drop(level)
+                    return False
+                if queued >= self.high_water:
+                    self._sample_counter += 1
+                    if self._sample_counter % self.sample_every:
+                        self._stats['sampled_out'] += 1
+                        self._count_unreported(level)
+                        return False
+                self._low.append(event)
+            else:
+                if queued >= self.max_queue:
+                    if not self._low:
+                        self._drop(level)
+                        return False
+                    self._drop(self._low.popleft()[0])
+                self._high.append(event)
+            full = queued + 1 >= self.batch_size
+        
+        if full:
+            self._wakeup.set()
+        return True
+    
+    def flush(self) -> int:
+        """
+        Write up to one batch of queued events
+        
+        Returns:
+            Number of events taken from the queue
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = []
+                while len(batch) < self.batch_size and (self._high or self._low):
+                    batch.append((self._high or self._low).popleft())
+                drops, self._unreported_drops = self._unreported_drops, {}
+            if drops:
+                batch.append(('warning', 'engine',
+                              f"System log queue overloaded; discarded {sum(drops.values())} events",
+                              None, datetime.now(pytz.UTC), json.dumps({'discarded': drops})))
+            if not batch:
+                return 0
+            
+            start_time = time.time()
+            try:
+                self._copy(batch)
+            except Exception as e:
+                # Not retried: a database outage must not grow the queue without bound
+                with self._lock:
+                    self._stats['write_failed'] += len(batch)
+                logger.error(f"Error writing {len(batch)} system log events: {e}")
+                return len(batch)
+            
+            with self._lock:
+                self._stats['written'] += len(batch)
+                self._stats['flushes'] += 1
+                self._stats['last_flush_ms'] = (time.time() - start_time) * 1000
+            return len(batch)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth and emitted/written/dropped counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._high) + len(self._low)
+            stats['dropped_by_level'] = dict(self._dropped_by_level)
+            return stats
+    
+    def _drop(self, level: str):
+        """Count a dropped event (lock held)"""
+        self._stats['dropped'] += 1
+        self._dropped_by_level[level] = self._dropped_by_level.get(level, 0) + 1
+        self._count_unreported(level)
+    
+    def _count_unreported(self, level: str):
+        """Remember a discarded event for the next overload warning (lock held)"""
+        self._unreported_drops[level] = self._unreported_drops.get(level, 0) + 1
+    
+    def _copy(self, batch):
+        """Load a batch through a session-local staging table"""
+        data = io.StringIO()
+        for event in batch:
+            data.write('\t'.join(_copy_field(value) for value in event))
+            data.write('\n')
+        data.seek(0)
+        
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                # Staged as timestamptz so event times keep their zone, then
+                # stored as UTC wall time like execution timestamps
+                cur.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS system_logs_incoming (
+                        level TEXT, component TEXT, message TEXT, stack_trace TEXT,
+                        created_at TIMESTAMPTZ, metadata JSONB
+                    ) ON COMMIT DELETE ROWS
+                """)
+                cur.copy_expert(f"COPY system_logs_incoming ({', '.join(COLUMNS)}) FROM STDIN", data)
+                cur.execute(f"""
+                    INSERT INTO system_logs ({', '.join(COLUMNS)})
+                    SELECT level, component, message, stack_trace,
+                           created_at AT TIME ZONE 'UTC', metadata
+                    FROM system_logs_incoming
+                """)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.db_manager.return_connection(conn)
+    
+    def _run(self):
+        """Background flush loop"""
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                # Drain in batches while there is a backlog
+                while self.flush() >= self.batch_size and self._running:
+                    pass
+            except Exception as e:
+                logger.error(f"System log sink error: {e}")
@@ -0,0 +1,395 @@
+"""
+Partition Manager
+Creates monthly partitions for history tables and retires expired ones in bulk
+"""
+import os
+import re
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+# Partitioned table -> partition key column
+PARTITIONED_TABLES = {
+    'task_executions': 'started_at',
+    'task_execution_logs': 'created_at',
+    'ai_results': 'created_at',
+    'system_logs': 'created_at',
+}
+
+ARCHIVE_SCHEMA = 'omnitasker_archive'
+
+# Converts the unpartitioned tables of databases created before partitioning
+MIGRATION_SCRIPT = 'database/migrations/001_partition_history_tables.sql'
+
+# Fine-grained execution rollups kept before pruning; day and all-time rows are kept
+ROLLUP_RETENTION = {
+    'minute': ('hours', int(os.getenv('ROLLUP_MINUTE_RETENTION_HOURS', 48))),
+    'hour': ('days', int(os.getenv('ROLLUP_HOUR_RETENTION_DAYS', 90))),
+}
+
+# Serializes maintenance across engine nodes sharing a database
+ADVISORY_LOCK_KEY = 'omnitasker_partition_maintenance'
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    """First day of the month `months` after the month containing `month`"""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+class PartitionManager:
+    """
+    Keeps history tables range-partitioned by month
+    
+    Each maintenance pass, per table:
+    
+    - creates partitions for the current month and `months_ahead` months,
+      plus any month that has rows sitting in the DEFAULT partition (those
+      rows are moved into the new partition);
+    - retires partitions entirely older than the table's retention, either
+      dropping them or detaching them into the archive schema.
+    
+    Retiring a month is a catalog operation, so no row-by-row DELETE ever
+    runs and each table's indexes only cover the months it retains. The
+    pass also prunes minute and hour execution rollups past ROLLUP_RETENTION.
+    """
+    
+    def __init__(self, db_manager, months_ahead: int = None, retention: Dict[str, int] = None,
+                 action: str = None, interval: float = None):
+        """
+        Initialize the partition manager
+        
+        Args:
+            db_manager: DatabaseManager providing connections
+            months_ahead: Future monthly partitions kept ready
+            retention: Months kept per table (0 keeps everything)
+            action: 'drop' or 'archive' for expired partitions
+            interval: Seconds between maintenance passes
+        """
+        self.db_manager = db_manager
+        self.months_ahead = months_ahead if months_ahead is not None else \
+            int(os.getenv('PARTITION_PREMAKE_MONTHS', 2))
+        execution_months = int(os.getenv('EXECUTION_RETENTION_MONTHS', 12))
+        self.retention = retention or {
+            'task_executions': execution_months,
+            'task_execution_logs': execution_months,
+            'ai_results': int(os.getenv('AI_RESULT_RETENTION_MONTHS', 12)),
+            'system_logs': int(os.getenv('SYSTEM_LOG_RETENTION_MONTHS', 3)),
+        }
+        self.action = (action or os.getenv('PARTITION_RETENTION_ACTION', 'archive')).lower()
+        if self.action not in ('drop', 'archive'):
+            raise ValueError(f"PARTITION_RETENTION_ACTION must be 'drop' or 'archive', not {self.action}")
+        self.interval = interval if interval is not None else \
+            float(os.getenv('PARTITION_MAINTENANCE_INTERVAL', 3600))
+        
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'runs': 0,
+            'errors': 0,
+            'partitions_created': 0,
+            'rows_moved': 0,
+            'partitions_dropped': 0,
+            'partitions_archived': 0,
+            'rollup_rows_pruned': 0,
+            'last_run_ms': 0.0,
+        }
+    
+    def start(self):
+        """Run maintenance now and then every interval in the background"""
+        if self.interval <= 0:
+            logger.info("Partition maintenance disabled")
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='partition-manager', daemon=True)
+        self._thread.start()
+    
+    def check_schema(self):
+        """
+        Verify that the history tables are partitioned
+        
+        schema.sql does not convert existing tables, so a database created
+        before partitioning keeps plain tables until MIGRATION_SCRIPT runs.
+        
+        Raises:
+            RuntimeError: If a history table is not partitioned
+        """
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT relname FROM pg_class
+                    WHERE relname = ANY(%s) AND relkind = 'r' AND pg_table_is_visible(oid)
+                """, (list(PARTITIONED_TABLES),))
+                unpartitioned = sorted(row[0] for row in cur.fetchall())
+            conn.rollback()
+        finally:
+            self.db_manager.return_connection(conn)
+        
+        if unpartitioned:
+            raise RuntimeError(f"History tables are not partitioned ({', '.join(unpartitioned)}); "
+                               f"run {MIGRATION_SCRIPT} to migrate this database")
+    
+    def stop(self):
+        """Stop the background maintenance loop"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+    
+    def run_maintenance(self) -> Dict[str, Any]:
+        """
+        Run one maintenance pass over every partitioned table
+        
+        Returns:
+            Dict with created/retired partition names per table
+        """
+        start_time = time.time()
+        summary = {}
+        for table, column in PARTITIONED_TABLES.items():
+            created = self.ensure_partitions(table, column)
+            retired = self.apply_retention(table)
+            summary[table] = {'created': created, 'retired': retired}
+        self.prune_rollups()
+        
+        with self._lock:
+            self._stats['runs'] += 1
+            self._stats['last_run_ms'] = (time.time() - start_time) * 1000
+        return summary
+    
+    def ensure_partitions(self, table: str, column: str) -> List[str]:
+        """Create missing monthly partitions for a table; returns their names"""
+        current = self._current_month()
+        months = {add_months(current, offset) for offset in range(self.months_ahead + 1)}
+        # Stray rows (e.g. written while no partition existed) get a proper
+        # partition too, so expired ones are retired like any other month
+        months.update(self._months_in_default(table, column))
+        
+        existing = {start for _, start in self.list_partitions(table)}
+        return [self._create_partition(table, column, month)
+                for month in sorted(months) if month not in existing]
+    
+    def apply_retention(self, table: str) -> List[str]:
+        """Drop or archive partitions older than the table's retention; returns their names"""
+        keep_from = self._retention_cutoff(table, self._current_month())
+        if keep_from is None:
+            return []
+        
+        retired = []
+        for name, start in self.list_partitions(table):
+            if add_months(start, 1) > keep_from:
+                continue
+            self._retire_partition(table, name)
+            retired.append(name)
+        return retired
+    
+    def prune_rollups(self) -> int:
+        """Delete minute and hour rollups older than their retention; returns rows deleted"""
+        deleted = 0
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                for bucket_size, (unit, amount) in ROLLUP_RETENTION.items():
+                    if amount <= 0:
+                        continue
+                    cur.execute(f"""
+                        DELETE FROM task_execution_rollups
+                        WHERE bucket_size = %s
+                          AND bucket_start < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') - make_interval({unit} => %s)
+                    """, (bucket_size, amount))
+                    deleted += cur.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            self.db_manager.return_connection(conn)
+        
+        with self._lock:
+            self._stats['rollup_rows_pruned'] += deleted
+        if deleted:
+            logger.info(f"Pruned {deleted} expired execution rollup rows")
+        return deleted
+    
+    def list_partitions(self, table: str) -> List[Tuple[str, datetime]]:
+        """Monthly partitions of a table as (name, month start), oldest first"""
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    SELECT c.relname
+                    FROM pg_inherits i
+                    JOIN pg_class c ON c.oid = i.inhrelid
+                    JOIN pg_class p ON p.oid = i.inhparent
+                    WHERE p.relname = %s
+                """, (table,))
+                names = [row[0] for row in cur.fetchall()]
+            conn.rollback()
+        finally:
+            self.db_manager.return_connection(conn)
+        
+        pattern = re.compile(rf'^{re.escape(table)}_p(\d{{4}})(\d{{2}})$')
+        partitions = []
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                partitions.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(partitions, key=lambda p: p[1])
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get maintenance counters"""
+        with self._lock:
+            return dict(self._stats)
+    
+    def _retention_cutoff(self, table: str, current: datetime):
+        """First month kept for a table, None when it is kept forever"""
+        months = self.retention.get(table, 0)
+        if months <= 0:
+            return None
+        # The current month plus `months` full months before it
+        return add_months(current, -months)
+    
+    def _current_month(self) -> datetime:
+        """Current month start by the database's clock, in UTC like the stored timestamps"""
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT date_trunc('month', CURRENT_TIMESTAMP AT TIME ZONE 'UTC')")
+                month = cur.fetchone()[0]
+            conn.rollback()
+            return month
+        finally:
+            self.db_manager.return_connection(conn)
+    
+    def _months_in_default(self, table: str, column: str) -> List[datetime]:
+        """Months that have rows in the DEFAULT partition (normally none)"""
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql.SQL("SELECT DISTINCT date_trunc('month', {column}) FROM {default}").format(
+                    column=sql.Identifier(column),
+                    default=sql.Identifier(f"{table}_default")
+                ))
+                months = [row[0] for row in cur.fetchall()]
+            conn.rollback()
+            return months
+        finally:
+            self.db_manager.return_connection(conn)
+    
+    def _create_partition(self, table: str, column: str, month: datetime) -> str:
+        """Create one monthly partition, moving matching rows out of DEFAULT"""
+        name = f"{table}_p{month:%Y%m}"
+        params = {'start': month, 'end': add_months(month, 1)}
+        identifiers = {
+            'parent': sql.Identifier(table),
+            'partition': sql.Identifier(name),
+            'default': sql.Identifier(f"{table}_default"),
+            'column': sql.Identifier(column),
+        }
+        
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (ADVISORY_LOCK_KEY,))
+                cur.execute("SELECT to_regclass(%s)", (name,))
+                if cur.fetchone()[0] is not None:
+                    conn.rollback()
+                    return name  # Another node created it
+                
+                cur.execute(sql.SQL("""
+                    SELECT 1 FROM {default}
+                    WHERE {column} >= %(start)s AND {column} < %(end)s
+                    LIMIT 1
+                """).format(**identifiers), params)
+                moved = 0
+                if cur.fetchone() is None:
+                    cur.execute(sql.SQL("""
+                        CREATE TABLE {partition} PARTITION OF {parent}
+                        FOR VALUES FROM (%(start)s) TO (%(end)s)
+                    """).format(**identifiers), params)
+                else:
+                    # Attaching over rows still in DEFAULT would fail, so move them first
+                    cur.execute(sql.SQL("""
+                        CREATE TABLE {partition} (LIKE {parent} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                    """).format(**identifiers))
+                    cur.execute(sql.SQL("""
+                        WITH moved AS (
+                            DELETE FROM {default}
+                            WHERE {column} >= %(start)s AND {column} < %(end)s
+                            RETURNING *
+                        )
+                        INSERT INTO {partition} SELECT * FROM moved
+                    """).format(**identifiers), params)
+                    moved = cur.rowcount
+                    cur.execute(sql.SQL("""
+                        ALTER TABLE {parent} ATTACH PARTITION {partition}
+                        FOR VALUES FROM (%(start)s) TO (%(end)s)
+                    """).format(**identifiers), params)
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            self.db_manager.return_connection(conn)
+        
+        with self._lock:
+            self._stats['partitions_created'] += 1
+            self._stats['rows_moved'] += moved
+        logger.info(f"Created partition {name}" + (f" ({moved} rows moved from default)" if moved else ""))
+        return name
+    
+    def _retire_partition(self, table: str, name: str):
+        """Drop an expired partition, or detach it into the archive schema"""
+        identifiers = {
+            'parent': sql.Identifier(table),
+            'partition': sql.Identifier(name),
+            'archive': sql.Identifier(ARCHIVE_SCHEMA),
+        }
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (ADVISORY_LOCK_KEY,))
+                cur.execute("SELECT to_regclass(%s)", (name,))
+                if cur.fetchone()[0] is None:
+                    conn.rollback()
+                    return  # Another node retired it
+                if self.action == 'drop':
+                    cur.execute(sql.SQL("DROP TABLE {partition}").format(**identifiers))
+                else:
+                    cur.execute(sql.SQL("ALTER TABLE {parent} DETACH PARTITION {partition}").format(**identifiers))
+                    cur.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {archive}").format(**identifiers))
+                    cur.execute(sql.SQL("ALTER TABLE {partition} SET SCHEMA {archive}").format(**identifiers))
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            with self._lock:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            self.db_manager.return_connection(conn)
+        
+        with self._lock:
+            self._stats['partitions_dropped' if self.action == 'drop' else 'partitions_archived'] += 1
+        logger.info(f"{'Dropped' if self.action == 'drop' else 'Archived'} expired partition {name}")
+    
+    def _run(self):
+        """Background maintenance loop"""
+        while not self._stop.is_set():
+            try:
+                summary = self.run_maintenance()
+                changes = sum(len(s['created']) + len(s['retired']) for s in summary.values())
+                if changes:
+                    logger.info(f"Partition maintenance: {summary}")
+            except Exception as e:
+                logger.error(f"Partition maintenance failed: {e}")
+                self.db_manager.log_system_event('error', 'engine', f"Partition maintenance failed: {e}")
+            self._stop.wait(self.interval)
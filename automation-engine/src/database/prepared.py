@@ -0,0 +1,209 @@
+"""
+Prepared Statements
+Per-connection registry of server-side prepared statements for hot queries
+"""
+import os
+import re
+import logging
+import threading
+import weakref
+from typing import Dict, Any, Sequence, Tuple
+from psycopg2 import errors, extensions
+
+logger = logging.getLogger(__name__)
+
+# name -> (parameter types, statement with $1..$n placeholders in order).
+# Batch writes take one array per column and unnest them, so a single
+# statement (and plan) serves any batch size.
+STATEMENTS: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    'get_task_by_id': (
+        ('uuid',),
+        "SELECT * FROM tasks WHERE id = $1",
+    ),
+    'get_task_version': (
+        ('uuid',),
+        "SELECT updated_at FROM tasks WHERE id = $1",
+    ),
+    'update_schedule_next_run': (
+        ('timestamp', 'uuid'),
+        """
+        UPDATE schedules
+        SET next_run = $1, last_run = CURRENT_TIMESTAMP
+        WHERE id = $2
+        """,
+    ),
+    # next_run and lease_expires_at hold UTC wall time, like execution timestamps
+    'claim_schedules': (
+        ('text', 'double precision', 'uuid[]', 'timestamptz'),
+        """
+        UPDATE schedules s
+        SET lease_owner = $1,
+            lease_expires_at = (CURRENT_TIMESTAMP AT TIME ZONE 'UTC') + make_interval(secs => $2)
+        FROM (
+            SELECT id FROM schedules
+            WHERE id = ANY($3)
+              AND is_active = TRUE
+              AND next_run <= ($4 AT TIME ZONE 'UTC')
+              AND (lease_expires_at IS NULL
+                   OR lease_expires_at < (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'))
+            FOR UPDATE SKIP LOCKED
+        ) due
+        WHERE s.id = due.id
+        RETURNING s.id
+        """,
+    ),
+    # Execution timestamps are bound as timestamptz and stored as UTC wall time,
+    # independent of the session TimeZone
+    'insert_executions': (
+        ('uuid[]', 'uuid[]', 'text[]', 'text[]', 'timestamptz[]', 'timestamptz[]',
+         'integer[]', 'integer[]', 'text[]', 'text[]', 'text[]'),
+        """
+        INSERT INTO task_executions (id, task_id, status, triggered_by, started_at, completed_at,
+                                     duration_ms, exit_code, stdout, stderr, error_message)
+        SELECT id, task_id, status, triggered_by,
+               started_at AT TIME ZONE 'UTC', completed_at AT TIME ZONE 'UTC',
+               duration_ms, exit_code, stdout, stderr, error_message
+        FROM unnest($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11)
+            AS v(id, task_id, status, triggered_by, started_at, completed_at,
+                 duration_ms, exit_code, stdout, stderr, error_message)
+        """,
+    ),
+    'update_executions': (
+        ('uuid[]', 'text[]', 'timestamptz[]', 'integer[]', 'integer[]',
+         'text[]', 'text[]', 'text[]'),
+        """
+        UPDATE task_executions AS t
+        SET status = COALESCE(v.status, t.status),
+            completed_at = COALESCE(v.completed_at AT TIME ZONE 'UTC', t.completed_at),
+            duration_ms = COALESCE(v.duration_ms, t.duration_ms),
+            exit_code = COALESCE(v.exit_code, t.exit_code),
+            stdout = COALESCE(v.stdout, t.stdout),
+            stderr = COALESCE(v.stderr, t.stderr),
+            error_message = COALESCE(v.error_message, t.error_message)
+        FROM unnest($1, $2, $3, $4, $5, $6, $7, $8)
+            AS v(id, status, completed_at, duration_ms, exit_code, stdout, stderr, error_message)
+        WHERE t.id = v.id
+        """,
+    ),
+    'record_execution_rollups': (
+        ('uuid[]', 'timestamptz[]', 'text[]', 'integer[]'),
+        """
+        SELECT record_execution_rollups(
+            $1,
+            ARRAY(SELECT s AT TIME ZONE 'UTC' FROM unnest($2) WITH ORDINALITY AS u(s, n) ORDER BY n),
+            $3, $4)
+        """,
+    ),
+    'notify_executions': (
+        ('text[]',),
+        "SELECT pg_notify('execution_logs', id) FROM unnest($1) AS id",
+    ),
+}
+
+PLACEHOLDER = re.compile(r'\$(\d+)')
+
+
+class PreparedStatements:
+    """
+    Prepares hot statements once per connection and executes them by name
+    
+    Connections are tracked weakly together with their server backend PID,
+    so a replaced or reconnected session is prepared again on first use.
+    If the server lost the statements anyway (e.g. DISCARD ALL), the
+    statement is re-prepared and, when no transaction was open, retried.
+    With DB_PREPARED_STATEMENTS=false the same SQL is sent as plain text.
+    """
+    
+    def __init__(self, statements: Dict[str, Tuple[Tuple[str, ...], str]] = None,
+                 enabled: bool = None):
+        """
+        Initialize the registry
+        
+        Args:
+            statements: name -> (parameter types, SQL with $n placeholders)
+            enabled: Use server-side prepared statements (else plain SQL)
+        """
+        self.enabled = enabled if enabled is not None else \
+            os.getenv('DB_PREPARED_STATEMENTS', 'true').lower() == 'true'
+        self._prepare_sql: Dict[str, str] = {}
+        self._execute_sql: Dict[str, str] = {}
+        self._plain_sql: Dict[str, str] = {}
+        for name, (types, body) in (statements or STATEMENTS).items():
+            self._register(name, types, body)
+        # connection -> (backend pid, names prepared on it)
+        self._prepared: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._stats = {'executions': 0, 'prepares': 0, 'reprepares': 0}
+    
+    def execute(self, cur, name: str, params: Sequence[Any] = ()):
+        """
+        Execute a registered statement on a cursor
+        
+        Results are read from the cursor as usual.
+        """
+        if not self.enabled:
+            cur.execute(self._plain_sql[name], params)
+            return
+        
+        conn = cur.connection
+        idle = conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+        self._ensure_prepared(cur, name)
+        try:
+            cur.execute(self._execute_sql[name], params)
+        except errors.InvalidSqlStatementName:
+            # The session lost its prepared statements behind our back
+            conn.rollback()
+            self._forget(conn)
+            with self._lock:
+                self._stats['reprepares'] += 1
+            if not idle:
+                # Earlier statements in the transaction are gone; let the caller retry
+                raise
+            logger.warning(f"Prepared statement {name} missing on connection; re-preparing")
+            self._ensure_prepared(cur, name)
+            cur.execute(self._execute_sql[name], params)
+        with self._lock:
+            self._stats['executions'] += 1
+    
+    def sql(self, name: str) -> str:
+        """Plain-text form of a statement (%s placeholders)"""
+        return self._plain_sql[name]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get execution and prepare counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['connections'] = len(self._prepared)
+            stats['enabled'] = self.enabled
+            return stats
+    
+    def _register(self, name: str, types: Tuple[str, ...], body: str):
+        """Build the PREPARE, EXECUTE and plain forms of a statement"""
+        numbers = [int(n) for n in PLACEHOLDER.findall(body)]
+        if numbers != list(range(1, len(types) + 1)):
+            raise ValueError(f"Statement {name} must use $1..${len(types)} once each, in order")
+        self._prepare_sql[name] = f"PREPARE {name} ({', '.join(types)}) AS {body}"
+        # Explicit casts so array and NULL arguments get the declared types
+        self._execute_sql[name] = f"EXECUTE {name} ({', '.join(f'%s::{t}' for t in types)})"
+        self._plain_sql[name] = PLACEHOLDER.sub(lambda m: f"%s::{types[int(m.group(1)) - 1]}", body)
+    
+    def _ensure_prepared(self, cur, name: str):
+        """PREPARE the statement on this connection if it is not already"""
+        conn = cur.connection
+        pid = conn.info.backend_pid
+        with self._lock:
+            state = self._prepared.get(conn)
+            if state is None or state[0] != pid:
+                state = (pid, set())
+                self._prepared[conn] = state
+            if name in state[1]:
+                return
+        cur.execute(self._prepare_sql[name])
+        with self._lock:
+            state[1].add(name)
+            self._stats['prepares'] += 1
+    
+    def _forget(self, conn):
+        """Drop what we know about a connection's prepared statements"""
+        with self._lock:
+            self._prepared.pop(conn, None)
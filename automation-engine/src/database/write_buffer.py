@@ -0,0 +1,297 @@
+"""
+Execution Write Buffer
+Write-behind buffer that coalesces task execution lifecycle writes
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, Iterable, List
+import pytz
+
+logger = logging.getLogger(__name__)
+
+# Columns written for every buffered execution, in statement parameter order
+INSERT_COLUMNS = ('id', 'task_id', 'status', 'triggered_by', 'started_at', 'completed_at',
+                  'duration_ms', 'exit_code', 'stdout', 'stderr', 'error_message')
+UPDATE_COLUMNS = ('id', 'status', 'completed_at', 'duration_ms', 'exit_code',
+                  'stdout', 'stderr', 'error_message')
+# Fields of a completed execution folded into the statistics rollups
+ROLLUP_COLUMNS = ('task_id', 'started_at', 'status', 'duration_ms')
+
+# Flushes a record may fail on its own before it is dropped
+MAX_WRITE_ATTEMPTS = 3
+
+
+class ExecutionWriteBuffer:
+    """
+    Buffers task_executions inserts and status transitions
+    
+    Execution IDs are generated client-side, so creating an execution needs
+    no round-trip. Records are kept in memory until a flush writes every
+    changed record in one transaction: rows not yet in the database with a
+    multi-row INSERT (already carrying their latest status, so a short task
+    often costs a single INSERT), the rest with one multi-row UPDATE.
+    
+    Flushes happen when max_batch records are dirty, every flush_interval
+    seconds, or synchronously when a write asks for durability (task
+    completion by default).
+    
+    Completions are added to the execution statistics rollups in the same
+    transaction, once per execution.
+    """
+    
+    def __init__(self, db_manager, max_batch: int = None, flush_interval: float = None,
+                 sync_complete: bool = None):
+        """
+        Initialize the write buffer
+        
+        Args:
+            db_manager: DatabaseManager providing connections
+            max_batch: Dirty records that trigger an immediate background flush
+            flush_interval: Maximum seconds an intermediate state stays unwritten
+            sync_complete: Whether completions are flushed before returning
+        """
+        self.db_manager = db_manager
+        self.max_batch = max_batch or int(os.getenv('EXECUTION_BUFFER_SIZE', 500))
+        self.flush_interval = flush_interval if flush_interval is not None else \
+            float(os.getenv('EXECUTION_FLUSH_INTERVAL', 0.5))
+        self.sync_complete = sync_complete if sync_complete is not None else \
+            os.getenv('EXECUTION_SYNC_COMPLETE', 'true').lower() == 'true'
+        
+        # execution_id -> record; records stay until their completion is written
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One flush at a time keeps INSERT before UPDATE
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        self._stats = {
+            'flushes': 0,
+            'sync_flushes': 0,
+            'rows_inserted': 0,
+            'rows_updated': 0,
+            'rows_rolled_up': 0,
+            'writes_coalesced': 0,
+            'flush_errors': 0,
+            'records_dropped': 0,
+            'max_batch_rows': 0,
+            'last_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+        }
+    
+    def start(self):
+        """Start the background flusher"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='execution-write-buffer', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the flusher and write everything still buffered"""
+        self._running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self.flush()
+    
+    def create(self, task_id: str, triggered_by: str = 'manual', sync: bool = False) -> str:
+        """Buffer a new pending execution and return its (client-generated) ID"""
+        execution_id = str(uuid.uuid4())
+        record = dict.fromkeys(INSERT_COLUMNS)
+        record.update({
+            'id': execution_id,
+            'task_id': str(task_id),
+            'status': 'pending',
+            'triggered_by': triggered_by,
+            'started_at': datetime.now(pytz.UTC),
+        })
+        record.update({'_inserted': False, '_version': 0, '_failures': 0})
+        with self._lock:
+            self._records[execution_id] = record
+        self._mark_dirty(execution_id, sync)
+        return execution_id
+    
+    def set_status(self, execution_id: str, status: str, sync: bool = False):
+        """Buffer a status transition"""
+        self.update(execution_id, {'status': status}, sync=sync)
+    
+    def complete(self, execution_id: str, fields: Dict[str, Any], sync: bool = None):
+        """
+        Buffer the final state of an execution
+        
+        Args:
+            execution_id: Execution to complete
+            fields: status, exit_code, stdout, stderr, duration_ms, error_message
+            sync: Flush before returning (defaults to sync_complete)
+        """
+        fields = dict(fields, completed_at=datetime.now(pytz.UTC))
+        self.update(execution_id, fields, complete=True,
+                    sync=self.sync_complete if sync is None else sync)
+    
+    def update(self, execution_id: str, fields: Dict[str, Any], complete: bool = False,
+               sync: bool = False):
+        """Merge field changes into a buffered execution"""
+        execution_id = str(execution_id)
+        with self._lock:
+            record = self._records.get(execution_id)
+            if record is None:
+                # Created before buffering, or already completed and written
+                record = dict.fromkeys(INSERT_COLUMNS)
+                record.update({'id': execution_id, '_inserted': True, '_version': 0, '_failures': 0})
+                self._records[execution_id] = record
+            elif execution_id in self._dirty:
+                self._stats['writes_coalesced'] += 1
+            record.update(fields)
+            record['_complete'] = record.get('_complete') or complete
+        self._mark_dirty(execution_id, sync)
+    
+    def ensure_persisted(self, execution_ids: Iterable[str]):
+        """Flush now if any of these executions has not been inserted yet (for FK references)"""
+        with self._lock:
+            pending = any(
+                not self._records[eid]['_inserted']
+                for eid in map(str, execution_ids) if eid in self._records
+            )
+        if pending:
+            self.flush()
+    
+    def flush(self, required: str = None):
+        """
+        Write all dirty records in one transaction
+        
+        If the batch fails, records are retried one at a time so a single bad
+        row (e.g. its task was deleted) cannot hold back the others; a record
+        that keeps failing is dropped after MAX_WRITE_ATTEMPTS.
+        
+        Args:
+            required: Execution that must be written; its failure is raised
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch = [(eid, self._records[eid]['_version'], dict(self._records[eid]))
+                         for eid in self._dirty]
+            if not batch:
+                return
+            
+            start_time = time.time()
+            failed = {}
+            try:
+                self._write([r for _, _, r in batch])
+            except Exception as e:
+                with self._lock:
+                    self._stats['flush_errors'] += 1
+                logger.error(f"Error flushing {len(batch)} execution records: {e}")
+                for execution_id, _, record in batch:
+                    try:
+                        self._write([record])
+                    except Exception as record_error:
+                        failed[execution_id] = record_error
+            flush_ms = (time.time() - start_time) * 1000
+            
+            with self._lock:
+                for execution_id, version, written in batch:
+                    record = self._records.get(execution_id)
+                    if record is None:
+                        continue
+                    if execution_id in failed:
+                        record['_failures'] += 1
+                        if record['_failures'] >= MAX_WRITE_ATTEMPTS:
+                            logger.error(f"Dropping execution record {execution_id} after "
+                                         f"{record['_failures']} failed writes: {failed[execution_id]}")
+                            self._stats['records_dropped'] += 1
+                            self._dirty.discard(execution_id)
+                            del self._records[execution_id]
+                        continue
+                    record['_inserted'] = True
+                    record['_failures'] = 0
+                    if written['_inserted']:
+                        self._stats['rows_updated'] += 1
+                    else:
+                        self._stats['rows_inserted'] += 1
+                    if written.get('_complete') and not written.get('_rolled_up'):
+                        record['_rolled_up'] = True
+                        if written['task_id'] is not None and written['started_at'] is not None:
+                            self._stats['rows_rolled_up'] += 1
+                    if record['_version'] != version:
+                        continue  # Changed during the flush; stays dirty
+                    self._dirty.discard(execution_id)
+                    if record.get('_complete'):
+                        del self._records[execution_id]
+                self._stats['flushes'] += 1
+                self._stats['sync_flushes'] += 1 if required else 0
+                self._stats['max_batch_rows'] = max(self._stats['max_batch_rows'], len(batch))
+                self._stats['last_flush_ms'] = flush_ms
+                self._stats['total_flush_ms'] += flush_ms
+            
+            if required in failed:
+                raise failed[required]
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get flush counters and current buffer size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['buffered'] = len(self._records)
+            stats['dirty'] = len(self._dirty)
+            stats['avg_flush_ms'] = stats['total_flush_ms'] / stats['flushes'] if stats['flushes'] else 0.0
+            return stats
+    
+    def _mark_dirty(self, execution_id: str, sync: bool):
+        """Record a change and trigger a flush if needed"""
+        with self._lock:
+            self._records[execution_id]['_version'] += 1
+            self._dirty.add(execution_id)
+            full = len(self._dirty) >= self.max_batch
+        if sync or not self._running:
+            self.flush(required=execution_id)
+        elif full:
+            self._wakeup.set()
+    
+    def _write(self, records: List[Dict[str, Any]]):
+        """Insert new executions and update existing ones in one transaction"""
+        inserts = [r for r in records if not r['_inserted']]
+        updates = [r for r in records if r['_inserted']]
+        statements = self.db_manager.statements
+        conn = self.db_manager.get_connection()
+        try:
+            with conn.cursor() as cur:
+                # One array per column; the prepared statements unnest them
+                if inserts:
+                    statements.execute(cur, 'insert_executions',
+                                       [[r[c] for r in inserts] for c in INSERT_COLUMNS])
+                if updates:
+                    statements.execute(cur, 'update_executions',
+                                       [[r[c] for r in updates] for c in UPDATE_COLUMNS])
+                
+                # Count each completion in the rollups exactly once; executions
+                # created before buffering lack the fields and are skipped
+                finished = [r for r in records if r.get('_complete') and not r.get('_rolled_up')
+                            and r['task_id'] is not None and r['started_at'] is not None]
+                if finished:
+                    statements.execute(cur, 'record_execution_rollups',
+                                       [[r[c] for r in finished] for c in ROLLUP_COLUMNS])
+                
+                # Wake anyone following executions that just finished
+                completed = [r['id'] for r in records if r.get('_complete')]
+                if completed:
+                    statements.execute(cur, 'notify_executions', (completed,))
+                conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.db_manager.return_connection(conn)
+    
+    def _run(self):
+        """Background flush loop"""
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Execution write buffer error: {e}")
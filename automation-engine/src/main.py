@@ -11,7 +11,10 @@ from dotenv import load_dotenv
 
 from src.core.scheduler import TaskScheduler
 from src.database.db_manager import DatabaseManager
+from src.database.partition_manager import PartitionManager
 from src.core.task_executor import TaskExecutor
+from src.core.worker_pool import TaskWorkerPool
+from src.core.async_executor import AsyncTaskRunner
 
 # Load environment variables
 load_dotenv()
@@ -36,17 +39,35 @@ def main():
         logger.error(f"✗ Failed to connect to database: {e}")
         sys.exit(1)
     
+    # Keep monthly history partitions ahead of time and retire expired ones
+    try:
+        partition_manager = PartitionManager(db_manager)
+        partition_manager.check_schema()
+    except Exception as e:
+        logger.error(f"✗ {e}")
+        sys.exit(1)
+    partition_manager.start()
+    
     # Initialize task executor
     try:
         task_executor = TaskExecutor(db_manager)
+        if task_executor.python_pool:
+            task_executor.python_pool.start()
         logger.info("✓ Task executor initialized")
     except Exception as e:
         logger.error(f"✗ Failed to initialize task executor: {e}")
         sys.exit(1)
     
+    # Tasks run as coroutines on one event loop by default; 'threads' uses a worker thread per task
+    execution_mode = os.getenv('TASK_EXECUTION_MODE', 'async').lower()
+    if execution_mode == 'threads':
+        worker_pool = TaskWorkerPool(task_executor)
+    else:
+        worker_pool = AsyncTaskRunner(task_executor)
+    
     # Initialize scheduler
     try:
-        scheduler = TaskScheduler(db_manager, task_executor)
+        scheduler = TaskScheduler(db_manager, task_executor, worker_pool)
         logger.info("✓ Task scheduler initialized")
     except Exception as e:
         logger.error(f"✗ Failed to initialize scheduler: {e}")
@@ -54,7 +75,7 @@ def main():
     
     # Start the scheduler in a separate thread
     scheduler.start()
-    logger.info("✓ Scheduler started")
+    logger.info(f"✓ Scheduler started ({execution_mode} execution)")
     
     logger.info("=" * 60)
     logger.info("OmniTasker Automation Engine is running!")
@@ -68,6 +89,8 @@ def main():
     except KeyboardInterrupt:
         logger.info("\n🛑 Shutting down gracefully...")
         scheduler.stop()
+        task_executor.shutdown()
+        partition_manager.stop()
         db_manager.close()
         logger.info("✓ Shutdown complete")
         sys.exit(0)
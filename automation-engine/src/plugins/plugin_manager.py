@@ -7,17 +7,29 @@ import logging
 from typing import Dict, Any, List, Optional
 import subprocess
 
+from src.core.lua_pool import LuaRuntimePool, get_lua_pool
+from src.plugins.plugin_registry import PluginRegistry
+from src.plugins.ruby_host import RubyPluginHost, RubyHostError, RubyPluginError
+
 logger = logging.getLogger(__name__)
 
 
 class PluginManager:
     """Manages plugin lifecycle and execution"""
     
-    def __init__(self, db_manager, plugin_dir: str = '/app/plugins'):
+    def __init__(self, db_manager, plugin_dir: str = '/app/plugins',
+                 lua_pool: LuaRuntimePool = None, ruby_host: RubyPluginHost = None):
         """Initialize plugin manager"""
         self.db_manager = db_manager
         self.plugin_dir = plugin_dir
-        self.loaded_plugins = {}
+        # Shared with TaskExecutor, so Lua tasks and plugins draw on one set of runtimes
+        self.lua_pool = lua_pool or get_lua_pool()
+        # Persistent Ruby interpreters; RUBY_HOST_POOL_SIZE=0 starts ruby per call
+        if ruby_host is None and int(os.getenv('RUBY_HOST_POOL_SIZE', 2)) > 0:
+            ruby_host = RubyPluginHost()
+        self.ruby_host = ruby_host
+        self.registry = PluginRegistry(db_manager, loader=self._load_plugin,
+                                       compile_errors=(SyntaxError, RubyPluginError))
         logger.info(f"Plugin Manager initialized with directory: {plugin_dir}")
     
     def discover_plugins(self) -> List[Dict[str, Any]]:
@@ -59,7 +71,7 @@ class PluginManager:
             
             logger.info(f"Loaded Lua plugin: {plugin_path}")
             return lua
-            
+        
         except Exception as e:
             logger.error(f"Error loading Lua plugin {plugin_path}: {e}")
             return None
@@ -73,44 +85,26 @@ class PluginManager:
             plugin_path: Path to Lua plugin file
             function_name: Name of function to execute
             args: Arguments to pass to the function
-            
+        
         Returns:
             Dict containing execution results
         """
         try:
-            from lupa import LuaRuntime
-            
-            lua = LuaRuntime(unpack_returned_tuples=True)
-            
-            # Read and execute plugin
-            with open(plugin_path, 'r') as f:
-                plugin_code = f.read()
-            
-            lua.execute(plugin_code)
-            
-            # Get the function
-            func = lua.eval(function_name)
-            
-            if func is None:
-                return {
-                    'success': False,
-                    'error': f'Function {function_name} not found in plugin'
-                }
-            
-            # Execute function
-            if args:
-                # Convert Python dict to Lua table
-                lua_args = lua.table_from(args)
-                result = func(lua_args)
-            else:
-                result = func()
+            # Compiled once per pooled runtime; recompiled when the file changes
+            result, output = self.lua_pool.call(plugin_path, function_name, args)
             
             return {
                 'success': True,
                 'result': result,
+                'output': '\n'.join(output),
                 'plugin_path': plugin_path
             }
-            
+        
+        except LookupError as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
         except Exception as e:
             logger.error(f"Error executing Lua plugin: {e}")
             return {
@@ -125,11 +119,21 @@ class PluginManager:
         Args:
             plugin_path: Path to Ruby plugin file
             args: Command-line arguments to pass
-            
+        
         Returns:
             Dict containing execution results
         """
         try:
+            if self.ruby_host:
+                result = self.ruby_host.run(plugin_path, args, timeout=300)
+                return {
+                    'success': result['exit_code'] == 0,
+                    'exit_code': result['exit_code'],
+                    'stdout': result['stdout'],
+                    'stderr': result['stderr'],
+                    'plugin_path': plugin_path
+                }
+            
             cmd = ['ruby', plugin_path]
             if args:
                 cmd.extend(args)
@@ -148,7 +152,7 @@ class PluginManager:
                 'stderr': result.stderr,
                 'plugin_path': plugin_path
             }
-            
+        
         except subprocess.TimeoutExpired:
             return {
                 'success': False,
@@ -159,6 +163,11 @@ class PluginManager:
                 'success': False,
                 'error': 'Ruby interpreter not found'
             }
+        except RubyHostError as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
         except Exception as e:
             logger.error(f"Error executing Ruby plugin: {e}")
             return {
@@ -168,18 +177,22 @@ class PluginManager:
     
     def execute_plugin(self, plugin_id: str, args: Any = None) -> Dict[str, Any]:
         """
-        Execute a plugin by its database ID
+        Execute a plugin by its database ID or name
         
         Args:
-            plugin_id: UUID of the plugin
+            plugin_id: UUID or name of the plugin
             args: Arguments to pass to the plugin
-            
+        
         Returns:
             Dict containing execution results
         """
-        # Get plugin from database
-        plugins = self.db_manager.get_enabled_plugins()
-        plugin = next((p for p in plugins if str(p['id']) == plugin_id), None)
+        try:
+            plugin = self.registry.get(plugin_id)
+        except RuntimeError as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
         
         if not plugin:
             return {
@@ -200,6 +213,27 @@ class PluginManager:
                 'error': f'Unsupported plugin type: {plugin_type}'
             }
     
+    def shutdown(self):
+        """Stop the persistent Ruby plugin host"""
+        if self.ruby_host:
+            self.ruby_host.shutdown()
+    
+    def get_registry_stats(self) -> Dict[str, Any]:
+        """Get plugin registry cache statistics"""
+        return self.registry.get_stats()
+    
+    def _load_plugin(self, plugin: Dict[str, Any]):
+        """Prepare a plugin for execution; called once per file version"""
+        if plugin['plugin_type'] == 'lua':
+            self.lua_pool.compile_file(plugin['file_path'])
+        elif plugin['plugin_type'] == 'ruby':
+            if self.ruby_host:
+                self.ruby_host.load(plugin['file_path'])
+            elif not os.access(plugin['file_path'], os.R_OK):
+                raise PermissionError(f"Cannot read {plugin['file_path']}")
+        else:
+            raise ValueError(f"Unsupported plugin type: {plugin['plugin_type']}")
+    
     def register_plugin(self, name: str, plugin_type: str, file_path: str,
                        description: str = '', version: str = '1.0.0',
                        author: str = '', config: Dict = None) -> bool:
@@ -0,0 +1,263 @@
+"""
+Plugin Registry
+In-process index of enabled plugins with lazy loading and change tracking
+"""
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PluginRegistry:
+    """
+    Enabled plugins indexed by ID and name
+    
+    Plugin rows are synced from the database at most once per sync
+    interval (delta on updated_at plus a check for deletions), so lookups
+    normally touch no database. Each plugin is loaded through the `loader`
+    callback on first use and reloaded only when its file or row changes.
+    
+    Database queries and plugin loads run outside the index lock: one
+    caller syncs while the others keep using the current index, and a
+    plugin being loaded only holds up lookups of that plugin.
+    """
+    
+    def __init__(self, db_manager, loader: Callable[[Dict[str, Any]], None],
+                 sync_interval: float = None, overlap_seconds: float = 5.0,
+                 compile_errors: Tuple[type, ...] = (SyntaxError,)):
+        """
+        Initialize plugin registry
+        
+        Args:
+            db_manager: DatabaseManager used to fetch plugins
+            loader: Called with the plugin row to load/compile it
+            sync_interval: Seconds between database syncs
+            overlap_seconds: How far behind the watermark each delta query starts
+            compile_errors: Loader exceptions meaning the file itself is broken;
+                these mark the plugin as failed until its file or row changes,
+                any other exception is retried on the next lookup
+        """
+        self.db_manager = db_manager
+        self.loader = loader
+        self.compile_errors = compile_errors
+        self.sync_interval = sync_interval if sync_interval is not None else \
+            float(os.getenv('PLUGIN_REGISTRY_SYNC_INTERVAL', 30))
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._plugins: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, str] = {}
+        # Load state per plugin ID: file signature it was loaded from and any error
+        self._loaded: Dict[str, Tuple[Optional[Tuple[int, int]], Optional[str]]] = {}
+        self._watermark: Optional[datetime] = None
+        self._last_sync = 0.0
+        self._generation = 0  # Bumped by a full invalidate, discarding syncs in flight
+        self._lock = threading.RLock()  # Guards the index and stats; never held during I/O
+        self._sync_lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'loads': 0,
+            'load_errors': 0,
+            'file_invalidations': 0,
+            'db_invalidations': 0,
+            'syncs': 0,
+            'sync_errors': 0,
+        }
+    
+    def get(self, plugin_ref: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a loaded plugin by ID or name
+        
+        Returns:
+            The plugin row, None if unknown or disabled
+        
+        Raises:
+            RuntimeError: If the plugin failed to load
+        """
+        if time.monotonic() - self._last_sync >= self.sync_interval:
+            self._sync_if_due()
+        
+        with self._lock:
+            plugin_id = plugin_ref if plugin_ref in self._plugins else self._by_name.get(plugin_ref)
+            if plugin_id is None:
+                self._stats['misses'] += 1
+                return None
+            plugin = self._plugins[plugin_id]
+        self._ensure_loaded(plugin_id, plugin)
+        return plugin
+    
+    def sync(self):
+        """Bring the registry up to date with the database"""
+        with self._sync_lock:
+            self._sync()
+    
+    def _sync_if_due(self):
+        """
+        Sync unless another caller already is; until the first sync there is
+        nothing to serve, so wait for it and let its errors propagate
+        """
+        if not self._sync_lock.acquire(blocking=self._watermark is None):
+            return
+        try:
+            if time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+        except Exception as e:
+            if self._watermark is None:
+                raise
+            # Keep serving the index we have and retry after the next interval
+            logger.error(f"Error syncing plugin registry, using the cached index: {e}")
+            with self._lock:
+                self._last_sync = time.monotonic()
+                self._stats['sync_errors'] += 1
+        finally:
+            self._sync_lock.release()
+    
+    def _sync(self):
+        """Query the database without the index lock, then apply the rows under it (sync lock held)"""
+        with self._lock:
+            generation, watermark = self._generation, self._watermark
+        if watermark is None:
+            rows = list(self.db_manager.iter_enabled_plugins())
+        else:
+            rows = self.db_manager.get_plugins_changed_since(watermark - self.overlap)
+            enabled_ids = {str(i) for i in self.db_manager.get_enabled_plugin_ids()}
+        
+        with self._lock:
+            if generation != self._generation:
+                return  # Invalidated meanwhile; the next lookup syncs from scratch
+            if watermark is None:
+                self._full_load(rows)
+            else:
+                self._delta_load(rows, enabled_ids)
+            self._last_sync = time.monotonic()
+            self._stats['syncs'] += 1
+    
+    def invalidate(self, plugin_ref: str = None):
+        """Force a reload of one plugin, or a full resync of all of them"""
+        with self._lock:
+            if plugin_ref is None:
+                self._plugins, self._by_name, self._loaded = {}, {}, {}
+                self._watermark = None
+                self._last_sync = 0.0
+                self._generation += 1
+                return
+            plugin_id = plugin_ref if plugin_ref in self._plugins else self._by_name.get(plugin_ref)
+            self._loaded.pop(plugin_id, None)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get registry size and cache counters"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['plugins'] = len(self._plugins)
+            stats['loaded'] = len(self._loaded)
+            return stats
+    
+    def _ensure_loaded(self, plugin_id: str, plugin: Dict[str, Any]):
+        """Load the plugin if it is new or its file changed, holding only its own load lock"""
+        try:
+            stat = os.stat(plugin['file_path'])
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            signature = None
+        if self._is_loaded(plugin_id, signature):
+            return
+        
+        with self._lock:
+            load_lock = self._load_locks.setdefault(plugin_id, threading.Lock())
+        with load_lock:
+            # Another caller may have loaded it while we waited
+            if self._is_loaded(plugin_id, signature):
+                return
+            with self._lock:
+                if plugin_id in self._loaded:
+                    self._stats['file_invalidations'] += 1
+                self._stats['loads'] += 1
+            
+            error = None
+            cache = True
+            try:
+                if signature is None:
+                    raise FileNotFoundError(f"Plugin file not found: {plugin['file_path']}")
+                self.loader(plugin)
+                logger.info(f"Loaded plugin: {plugin['name']} ({plugin['plugin_type']})")
+            except Exception as e:
+                error = f"Error loading plugin {plugin['name']}: {e}"
+                # Timeouts, dead interpreters etc. say nothing about the file; retry next time
+                cache = signature is None or isinstance(e, self.compile_errors)
+                logger.error(error)
+            
+            with self._lock:
+                # A sync may have replaced or dropped the row while it loaded
+                if cache and self._plugins.get(plugin_id) is plugin:
+                    self._loaded[plugin_id] = (signature, error)
+                if error:
+                    self._stats['load_errors'] += 1
+        if error:
+            raise RuntimeError(error)
+    
+    def _is_loaded(self, plugin_id: str, signature: Optional[Tuple[int, int]]) -> bool:
+        """
+        Whether the plugin is loaded from this file version
+        
+        Raises:
+            RuntimeError: If loading this file version failed
+        """
+        with self._lock:
+            state = self._loaded.get(plugin_id)
+            if state is None or state[0] != signature:
+                return False
+            self._stats['hits'] += 1
+        if state[1]:
+            raise RuntimeError(state[1])
+        return True
+    
+    def _full_load(self, rows: List[Dict[str, Any]]):
+        """Index every enabled plugin row (lock held)"""
+        self._plugins, self._by_name, self._loaded = {}, {}, {}
+        self._watermark = datetime(1970, 1, 1)
+        for row in rows:
+            self._store(row)
+        logger.info(f"Plugin registry loaded {len(self._plugins)} enabled plugins")
+    
+    def _delta_load(self, rows: List[Dict[str, Any]], enabled_ids: Set[str]):
+        """Apply plugin rows changed since the watermark and drop deleted ones (lock held)"""
+        for row in rows:
+            plugin_id = str(row['id'])
+            cached = self._plugins.get(plugin_id)
+            if cached is not None and row['updated_at'] <= cached['updated_at']:
+                continue
+            self._remove(plugin_id)
+            if row['is_enabled']:
+                self._store(row)
+            else:
+                self._advance_watermark(row['updated_at'])
+        
+        for plugin_id in [pid for pid in self._plugins if pid not in enabled_ids]:
+            self._remove(plugin_id)
+    
+    def _store(self, row: Dict[str, Any]):
+        """Index a plugin row (lock held)"""
+        plugin = dict(row)
+        plugin_id = str(plugin['id'])
+        self._plugins[plugin_id] = plugin
+        self._by_name[plugin['name']] = plugin_id
+        self._advance_watermark(plugin['updated_at'])
+    
+    def _remove(self, plugin_id: str):
+        """Drop a plugin and its load state (lock held)"""
+        plugin = self._plugins.pop(plugin_id, None)
+        if plugin is None:
+            return
+        if self._by_name.get(plugin['name']) == plugin_id:
+            del self._by_name[plugin['name']]
+        if self._loaded.pop(plugin_id, None) is not None:
+            self._stats['db_invalidations'] += 1
+    
+    def _advance_watermark(self, updated_at: datetime):
+        """Move the watermark forward (lock held)"""
+        if updated_at is not None and updated_at > self._watermark:
+            self._watermark = updated_at
@@ -0,0 +1,267 @@
+"""
+Ruby Plugin Host
+Pool of long-lived Ruby processes that run plugins over a framed JSON protocol
+"""
+import os
+import json
+import time
+import select
+import struct
+import logging
+import threading
+import subprocess
+from collections import deque
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+HOST_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ruby_host.rb')
+HEADER = struct.Struct('>I')
+
+
+class RubyHostError(Exception):
+    """A host process failed or broke the protocol"""
+
+
+class RubyPluginError(RubyHostError):
+    """The host handled the request but the plugin failed, e.g. did not compile"""
+
+
+class _RubyWorker:
+    """One ruby_host.rb process and its request/response pipes"""
+    
+    def __init__(self, ruby: str):
+        request_r, request_w = os.pipe()
+        response_r, response_w = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                [ruby, HOST_SCRIPT, str(request_r), str(response_w)],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                pass_fds=(request_r, response_w)
+            )
+        except Exception:
+            for fd in (request_r, request_w, response_r, response_w):
+                os.close(fd)
+            raise
+        os.close(request_r)
+        os.close(response_w)
+        self.requests = os.fdopen(request_w, 'wb')
+        self.response_fd = response_r
+        self.calls = 0
+        self.last_used = time.monotonic()
+    
+    def request(self, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """
+        Send one request and wait for its response
+        
+        Raises:
+            subprocess.TimeoutExpired: If no response arrives within timeout
+            RubyHostError: If the host exited or sent a malformed frame
+        """
+        data = json.dumps(message).encode('utf-8')
+        try:
+            self.requests.write(HEADER.pack(len(data)) + data)
+            self.requests.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise RubyHostError(f"Ruby host is not accepting requests: {e}")
+        
+        deadline = time.monotonic() + timeout
+        header = self._read_exact(HEADER.size, deadline, timeout, message)
+        body = self._read_exact(HEADER.unpack(header)[0], deadline, timeout, message)
+        self.calls += 1
+        self.last_used = time.monotonic()
+        return json.loads(body.decode('utf-8'))
+    
+    def stop(self, kill: bool = False):
+        """Close the pipes and stop the process"""
+        for close in (self.requests.close, lambda: os.close(self.response_fd)):
+            try:
+                close()
+            except OSError:
+                pass
+        # Closing the request pipe makes an idle host exit on its own
+        if kill:
+            self.process.kill()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+    
+    def _read_exact(self, size: int, deadline: float, timeout: float,
+                    message: Dict[str, Any]) -> bytes:
+        """Read exactly size bytes from the response pipe before the deadline"""
+        chunks = []
+        while size > 0:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.response_fd], [], [], remaining)[0]:
+                raise subprocess.TimeoutExpired(message.get('path', 'ruby_host'), timeout)
+            chunk = os.read(self.response_fd, min(size, 65536))
+            if not chunk:
+                raise RubyHostError("Ruby host exited unexpectedly")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+
+class RubyPluginHost:
+    """
+    Pool of persistent Ruby interpreters for plugin calls
+    
+    Each worker compiles a plugin file once (recompiling when it changes)
+    and runs it in-process per call with ARGV and fd-level stdout/stderr
+    set up as for `ruby plugin.rb args...`. Workers idle for longer than
+    the health check interval are pinged before use, and are replaced after
+    max_calls calls, on timeout, or when they stop responding.
+    """
+    
+    def __init__(self, max_workers: int = None, max_calls: int = None,
+                 health_check_interval: float = None, ruby: str = 'ruby'):
+        """
+        Initialize the host pool
+        
+        Args:
+            max_workers: Number of Ruby processes (parallel plugin calls)
+            max_calls: Calls a worker serves before it is replaced
+            health_check_interval: Idle seconds after which a worker is pinged before use
+            ruby: Ruby executable
+        """
+        self.max_workers = max_workers or int(os.getenv('RUBY_HOST_POOL_SIZE', 2))
+        self.max_calls = max_calls or int(os.getenv('RUBY_HOST_MAX_CALLS', 500))
+        self.health_check_interval = health_check_interval if health_check_interval is not None else \
+            float(os.getenv('RUBY_HOST_HEALTH_INTERVAL', 30))
+        self.ruby = ruby
+        self._cond = threading.Condition()
+        self._idle: deque = deque()
+        self._size = 0
+        self._closed = False
+        self._stats = {'calls': 0, 'spawned': 0, 'recycled': 0, 'failed': 0, 'health_checks': 0}
+    
+    def run(self, plugin_path: str, args: List[str] = None, timeout: float = 300) -> Dict[str, Any]:
+        """
+        Run a Ruby plugin file as a script
+        
+        Returns:
+            Dict with exit_code, stdout and stderr
+        
+        Raises:
+            subprocess.TimeoutExpired: If the call exceeds timeout
+            RubyHostError: If the host failed or rejected the request
+        """
+        return self._call({'op': 'run', 'path': plugin_path, 'args': args or []}, timeout)
+    
+    def load(self, plugin_path: str, timeout: float = 30):
+        """
+        Compile a plugin in a worker, surfacing syntax errors up front
+        
+        Raises:
+            RubyPluginError: If the plugin does not compile
+            RubyHostError: If the host failed
+        """
+        self._call({'op': 'load', 'path': plugin_path}, timeout)
+    
+    def shutdown(self):
+        """Stop idle workers; busy ones are stopped when their call returns"""
+        with self._cond:
+            self._closed = True
+            workers = list(self._idle)
+            self._idle.clear()
+            self._size -= len(workers)
+            self._cond.notify_all()
+        for worker in workers:
+            worker.stop()
+        logger.info("Ruby plugin host stopped")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker counts and lifetime counters"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['workers'] = self._size
+            stats['idle'] = len(self._idle)
+            return stats
+    
+    def _call(self, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """Send a request to a healthy worker and unwrap its response"""
+        worker = self._checkout()
+        try:
+            response = worker.request(message, timeout)
+        except Exception:
+            self._discard(worker, kill=True)
+            raise
+        self._checkin(worker)
+        
+        if not response.get('ok'):
+            raise RubyPluginError(response.get('error', 'Unknown Ruby host error'))
+        return response
+    
+    def _checkout(self) -> _RubyWorker:
+        """Take an idle worker that passes its health check, or start one"""
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RubyHostError("Ruby plugin host is shut down")
+                    if self._idle:
+                        worker = self._idle.popleft()
+                        break
+                    if self._size < self.max_workers:
+                        self._size += 1
+                        worker = None
+                        break
+                    self._cond.wait()
+            
+            if worker is None:
+                return self._spawn()
+            if self._healthy(worker):
+                return worker
+            self._discard(worker, kill=True)
+    
+    def _healthy(self, worker: _RubyWorker) -> bool:
+        """Check a worker that may have died while idle"""
+        if worker.process.poll() is not None:
+            return False
+        if time.monotonic() - worker.last_used < self.health_check_interval:
+            return True
+        with self._cond:
+            self._stats['health_checks'] += 1
+        try:
+            return bool(worker.request({'op': 'ping'}, timeout=5).get('ok'))
+        except Exception as e:
+            logger.warning(f"Ruby host failed health check: {e}")
+            return False
+    
+    def _spawn(self) -> _RubyWorker:
+        """Start a worker for a slot already counted in _size"""
+        try:
+            worker = _RubyWorker(self.ruby)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats['spawned'] += 1
+        return worker
+    
+    def _checkin(self, worker: _RubyWorker):
+        """Return a worker, recycling it once it has served max_calls"""
+        with self._cond:
+            self._stats['calls'] += 1
+            if not self._closed and worker.calls < self.max_calls:
+                self._idle.append(worker)
+                self._cond.notify()
+                return
+            self._size -= 1
+            self._stats['recycled'] += 1
+            self._cond.notify()
+        worker.stop()
+    
+    def _discard(self, worker: _RubyWorker, kill: bool = False):
+        """Drop a worker that timed out or failed"""
+        worker.stop(kill=kill)
+        with self._cond:
+            self._size -= 1
+            self._stats['failed'] += 1
+            self._cond.notify()
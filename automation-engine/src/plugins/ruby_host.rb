@@ -0,0 +1,130 @@
+# OmniTasker Ruby plugin host
+#
+# Long-lived worker that runs Ruby plugins without paying interpreter boot
+# per call. Requests and responses are length-prefixed JSON frames (4-byte
+# big-endian length + UTF-8 JSON) on the file descriptors given as ARGV[0]
+# (requests) and ARGV[1] (responses), so plugin output can never corrupt
+# the protocol.
+#
+# Requests:
+#   {"op": "ping"}
+#   {"op": "load", "path": "..."}               compile only (syntax check)
+#   {"op": "run", "path": "...", "args": [...]} run the file as a script
+#
+# Responses carry "ok" plus either the result fields or "error".
+
+require 'json'
+require 'tempfile'
+
+class PluginHost
+  def initialize(request_io, response_io)
+    @requests = request_io
+    @responses = response_io
+    # path => [mtime, size, compiled instruction sequence]
+    @compiled = {}
+  end
+
+  def serve
+    while (request = read_frame)
+      write_frame(handle(request))
+    end
+  end
+
+  private
+
+  def handle(request)
+    case request['op']
+    when 'ping'
+      { ok: true, pid: Process.pid, plugins: @compiled.size }
+    when 'load'
+      compile(request['path'])
+      { ok: true }
+    when 'run'
+      exit_code, stdout, stderr = run(request['path'], request['args'] || [])
+      { ok: true, exit_code: exit_code, stdout: stdout, stderr: stderr }
+    else
+      { ok: false, error: "Unknown op: #{request['op']}" }
+    end
+  rescue SyntaxError, StandardError => e
+    { ok: false, error: "#{e.class}: #{e.message}" }
+  end
+
+  # Compile once per file version; edits are picked up by mtime/size
+  def compile(path)
+    stat = File.stat(path)
+    cached = @compiled[path]
+    return cached[2] if cached && cached[0] == stat.mtime && cached[1] == stat.size
+
+    iseq = RubyVM::InstructionSequence.compile_file(path)
+    @compiled[path] = [stat.mtime, stat.size, iseq]
+    iseq
+  end
+
+  # Run a plugin as if started with `ruby path args...`, capturing fd-level
+  # output so subprocesses and direct STDOUT writes are included
+  def run(path, args)
+    iseq = compile(path)
+    out = Tempfile.new('omnitasker_out')
+    err = Tempfile.new('omnitasker_err')
+    saved_out = STDOUT.dup
+    saved_err = STDERR.dup
+    saved_argv = ARGV.dup
+    saved_verbose = $VERBOSE
+    exit_code = 0
+
+    begin
+      STDOUT.reopen(out)
+      STDERR.reopen(err)
+      $stdout = STDOUT
+      $stderr = STDERR
+      ARGV.replace(args.map(&:to_s))
+      $0 = path
+      # Re-running a file redefines its constants; that is expected here
+      $VERBOSE = nil
+      iseq.eval
+    rescue SystemExit => e
+      exit_code = e.status
+    rescue Exception => e # rubocop:disable Lint/RescueException
+      STDERR.puts(e.full_message(highlight: false))
+      exit_code = 1
+    ensure
+      $VERBOSE = saved_verbose
+      STDOUT.flush
+      STDERR.flush
+      STDOUT.reopen(saved_out)
+      STDERR.reopen(saved_err)
+      saved_out.close
+      saved_err.close
+      $stdout = STDOUT
+      $stderr = STDERR
+      ARGV.replace(saved_argv)
+    end
+
+    [exit_code, read_output(out), read_output(err)]
+  end
+
+  def read_output(file)
+    file.rewind
+    file.read.force_encoding(Encoding::UTF_8).scrub
+  ensure
+    file.close!
+  end
+
+  def read_frame
+    header = @requests.read(4)
+    return nil if header.nil? || header.bytesize < 4
+
+    JSON.parse(@requests.read(header.unpack1('N')))
+  end
+
+  def write_frame(message)
+    data = JSON.generate(message)
+    @responses.write([data.bytesize].pack('N'), data)
+    @responses.flush
+  end
+end
+
+request_io = IO.for_fd(Integer(ARGV[0]), 'rb')
+response_io = IO.for_fd(Integer(ARGV[1]), 'wb')
+ARGV.clear
+PluginHost.new(request_io, response_io).serve
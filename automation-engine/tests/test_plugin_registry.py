@@ -0,0 +1,78 @@
+"""Tests for the plugin registry's load and sync error handling"""
+from datetime import datetime
+
+import pytest
+
+from src.plugins.plugin_registry import PluginRegistry
+
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.fail = False
+    
+    def iter_enabled_plugins(self):
+        return iter(self.rows)
+    
+    def get_plugins_changed_since(self, since):
+        if self.fail:
+            raise ConnectionError("database is down")
+        return []
+    
+    def get_enabled_plugin_ids(self):
+        return [row['id'] for row in self.rows]
+
+
+@pytest.fixture
+def plugin_row(tmp_path):
+    path = tmp_path / 'plugin.lua'
+    path.write_text('function main() end')
+    return {'id': 'p1', 'name': 'alpha', 'plugin_type': 'lua', 'file_path': str(path),
+            'updated_at': datetime(2026, 1, 1), 'is_enabled': True}
+
+
+def test_transient_load_error_is_retried(plugin_row):
+    errors = [TimeoutError("No Lua runtime free after 30s")]
+    
+    def loader(plugin):
+        if errors:
+            raise errors.pop()
+    
+    registry = PluginRegistry(FakeDatabase([plugin_row]), loader, sync_interval=60)
+    with pytest.raises(RuntimeError):
+        registry.get('alpha')
+    assert registry.get('alpha')['id'] == 'p1'
+
+
+def test_compile_error_is_cached(plugin_row):
+    calls = []
+    
+    def loader(plugin):
+        calls.append(plugin['name'])
+        raise SyntaxError("unexpected symbol")
+    
+    registry = PluginRegistry(FakeDatabase([plugin_row]), loader, sync_interval=60)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            registry.get('alpha')
+    assert calls == ['alpha']
+
+
+def test_sync_error_keeps_serving_the_index(plugin_row):
+    db = FakeDatabase([plugin_row])
+    registry = PluginRegistry(db, lambda plugin: None, sync_interval=0)
+    registry.get('alpha')
+    
+    db.fail = True
+    assert registry.get('alpha')['id'] == 'p1'
+    assert registry.get_stats()['sync_errors'] == 1
+
+
+def test_first_sync_error_propagates(plugin_row):
+    class DownDatabase(FakeDatabase):
+        def iter_enabled_plugins(self):
+            raise ConnectionError("database is down")
+    
+    registry = PluginRegistry(DownDatabase([plugin_row]), lambda plugin: None)
+    with pytest.raises(ConnectionError):
+        registry.get('alpha')
@@ -0,0 +1,49 @@
+"""Tests for the prewarmed Python worker pool"""
+import textwrap
+
+import pytest
+
+from src.core.python_pool import PythonWorkerPool
+
+
+@pytest.fixture
+def pool():
+    pool = PythonWorkerPool(max_workers=1, preload=[], start_method='forkserver')
+    yield pool
+    pool.shutdown()
+
+
+def test_script_can_use_multiprocessing_pool(pool):
+    script = textwrap.dedent("""
+        import multiprocessing
+        
+        def square(x):
+            return x * x
+        
+        if __name__ == '__main__':
+            with multiprocessing.Pool(2) as p:
+                print(sum(p.map(square, range(10))))
+    """)
+    exit_code, stdout, stderr = pool.run(script, 'mp_task.py', timeout=60)
+    assert (exit_code, stdout.strip()) == (0, '285'), stderr
+
+
+def test_script_can_use_process_pool_executor(pool):
+    script = textwrap.dedent("""
+        from concurrent.futures import ProcessPoolExecutor
+        
+        def square(x):
+            return x * x
+        
+        if __name__ == '__main__':
+            with ProcessPoolExecutor(2) as executor:
+                print(sum(executor.map(square, range(10))))
+    """)
+    exit_code, stdout, stderr = pool.run(script, 'executor_task.py', timeout=60)
+    assert (exit_code, stdout.strip()) == (0, '285'), stderr
+
+
+def test_main_module_is_restored_between_tasks(pool):
+    pool.run("value = 1", 'first.py', timeout=60)
+    exit_code, stdout, stderr = pool.run("print('value' in globals())", 'second.py', timeout=60)
+    assert (exit_code, stdout.strip()) == (0, 'False'), stderr
@@ -128,6 +128,45 @@ def task_run(task_id):
         console.print(f"[red]✗ Error: {str(e)}[/red]")
 
 
+@task.command('logs')
+@click.argument('execution_id')
+@click.option('--follow', '-f', is_flag=True, help='Keep streaming output until the execution finishes')
+def task_logs(execution_id, follow):
+    """Show output of a task execution"""
+    token = get_token()
+    if not token:
+        return
+    
+    after = -1
+    try:
+        while True:
+            response = requests.get(
+                f"{API_URL}/api/tasks/executions/{execution_id}/logs",
+                params={'after': after, 'limit': 500, 'wait': 25 if follow else 0},
+                headers={'Authorization': f'Bearer {token}'},
+                timeout=60
+            )
+            
+            if response.status_code != 200:
+                console.print(f"[red]✗ Failed to fetch logs: {response.json().get('error')}[/red]")
+                return
+            
+            data = response.json()
+            for chunk in data['chunks']:
+                click.echo(chunk['content'], nl=False, err=chunk['stream'] == 'stderr')
+            after = data['next_after']
+            
+            if data['complete']:
+                console.print(f"\n[cyan]Execution {data['status']}[/cyan]")
+                return
+            if not follow and not data['chunks']:
+                return
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        console.print(f"[red]✗ Error: {str(e)}[/red]")
+
+
 @cli.group()
 def plugin():
     """Plugin management commands"""
@@ -0,0 +1,189 @@
+-- Migration: partition history tables by month
+--
+-- Converts task_executions, task_execution_logs, ai_results and system_logs
+-- from the plain tables of earlier schemas into the monthly range-partitioned
+-- tables defined in schema.sql. schema.sql only creates missing tables, so an
+-- existing database needs this script once before running an engine that
+-- manages partitions.
+--
+-- Each table is renamed, recreated partitioned, and its rows are copied into
+-- the new DEFAULT partition; the engine's PartitionManager moves them into
+-- monthly partitions on its first maintenance pass. Everything runs in one
+-- transaction, so a failure leaves the database unchanged.
+--
+-- Foreign keys to task_executions(id) are dropped: a partitioned table's
+-- primary key must include the partition key (started_at), so nothing can
+-- reference executions by id alone. Affected columns:
+--   ai_results.task_execution_id, notifications.task_execution_id,
+--   task_execution_logs.execution_id (its ON DELETE CASCADE is gone too;
+--   logs are retired with their month's partition instead).
+--
+-- Usage (with the engine stopped):
+--   psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f database/migrations/001_partition_history_tables.sql
+
+BEGIN;
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'task_executions'::regclass) = 'p' THEN
+        RAISE EXCEPTION 'task_executions is already partitioned; nothing to migrate';
+    END IF;
+END $$;
+
+-- Databases from before execution log streaming have no task_execution_logs
+CREATE TABLE IF NOT EXISTS task_execution_logs (
+    id BIGSERIAL PRIMARY KEY,
+    execution_id UUID,
+    seq INTEGER NOT NULL,
+    stream VARCHAR(10) NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Views over the old tables are recreated once the new tables exist
+CREATE TEMPORARY TABLE migration_views ON COMMIT DROP AS
+SELECT c.oid, c.relname AS name, rtrim(pg_get_viewdef(c.oid), E'; \n') AS definition
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+WHERE c.relkind = 'v' AND n.nspname = current_schema();
+
+DO $$
+DECLARE
+    v RECORD;
+BEGIN
+    FOR v IN SELECT name FROM migration_views LOOP
+        EXECUTE format('DROP VIEW IF EXISTS %I CASCADE', v.name);
+    END LOOP;
+END $$;
+
+ALTER TABLE ai_results DROP CONSTRAINT IF EXISTS ai_results_task_execution_id_fkey;
+ALTER TABLE notifications DROP CONSTRAINT IF EXISTS notifications_task_execution_id_fkey;
+ALTER TABLE task_execution_logs DROP CONSTRAINT IF EXISTS task_execution_logs_execution_id_fkey;
+
+-- Move the old tables aside; their primary keys and the log sequence would
+-- otherwise clash with the names the new tables take
+ALTER TABLE task_executions RENAME TO task_executions_unpartitioned;
+ALTER TABLE task_executions_unpartitioned RENAME CONSTRAINT task_executions_pkey TO task_executions_unpartitioned_pkey;
+ALTER TABLE task_execution_logs RENAME TO task_execution_logs_unpartitioned;
+ALTER TABLE task_execution_logs_unpartitioned RENAME CONSTRAINT task_execution_logs_pkey TO task_execution_logs_unpartitioned_pkey;
+ALTER SEQUENCE task_execution_logs_id_seq RENAME TO task_execution_logs_unpartitioned_id_seq;
+ALTER TABLE ai_results RENAME TO ai_results_unpartitioned;
+ALTER TABLE ai_results_unpartitioned RENAME CONSTRAINT ai_results_pkey TO ai_results_unpartitioned_pkey;
+ALTER TABLE system_logs RENAME TO system_logs_unpartitioned;
+ALTER TABLE system_logs_unpartitioned RENAME CONSTRAINT system_logs_pkey TO system_logs_unpartitioned_pkey;
+
+-- Same definitions as schema.sql
+CREATE TABLE task_executions (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    task_id UUID REFERENCES tasks(id) ON DELETE CASCADE,
+    status VARCHAR(50) NOT NULL, -- pending, running, success, failed, timeout
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,
+    duration_ms INTEGER,
+    exit_code INTEGER,
+    stdout TEXT,
+    stderr TEXT,
+    error_message TEXT,
+    triggered_by VARCHAR(50) DEFAULT 'manual', -- manual, schedule, api, plugin
+    metadata JSONB DEFAULT '{}'::jsonb,
+    PRIMARY KEY (id, started_at)
+) PARTITION BY RANGE (started_at);
+
+CREATE TABLE task_executions_default PARTITION OF task_executions DEFAULT;
+
+CREATE TABLE task_execution_logs (
+    id BIGSERIAL,
+    execution_id UUID NOT NULL, -- task_executions.id
+    seq INTEGER NOT NULL,
+    stream VARCHAR(10) NOT NULL, -- stdout, stderr
+    content TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE task_execution_logs_default PARTITION OF task_execution_logs DEFAULT;
+
+CREATE TABLE ai_results (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    task_execution_id UUID, -- task_executions.id
+    ai_type VARCHAR(50) NOT NULL, -- nlp_summary, image_classification, sentiment_analysis
+    input_data TEXT,
+    input_file_path VARCHAR(500),
+    output_data JSONB NOT NULL,
+    confidence_score FLOAT,
+    processing_time_ms INTEGER,
+    model_name VARCHAR(255),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE ai_results_default PARTITION OF ai_results DEFAULT;
+
+CREATE TABLE system_logs (
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    level VARCHAR(20) NOT NULL, -- debug, info, warning, error, critical
+    component VARCHAR(100) NOT NULL, -- engine, api, plugin, scheduler
+    message TEXT NOT NULL,
+    stack_trace TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE system_logs_default PARTITION OF system_logs DEFAULT;
+
+-- Copy the rows; partition keys were nullable before
+INSERT INTO task_executions (id, task_id, status, started_at, completed_at, duration_ms, exit_code,
+                             stdout, stderr, error_message, triggered_by, metadata)
+SELECT id, task_id, status, COALESCE(started_at, completed_at, CURRENT_TIMESTAMP), completed_at,
+       duration_ms, exit_code, stdout, stderr, error_message, triggered_by, metadata
+FROM task_executions_unpartitioned;
+
+INSERT INTO task_execution_logs (id, execution_id, seq, stream, content, created_at)
+SELECT id, execution_id, seq, stream, content, COALESCE(created_at, CURRENT_TIMESTAMP)
+FROM task_execution_logs_unpartitioned
+WHERE execution_id IS NOT NULL;
+
+SELECT setval(pg_get_serial_sequence('task_execution_logs', 'id'),
+              GREATEST((SELECT MAX(id) FROM task_execution_logs), 1));
+
+INSERT INTO ai_results (id, task_execution_id, ai_type, input_data, input_file_path, output_data,
+                        confidence_score, processing_time_ms, model_name, created_at, metadata)
+SELECT id, task_execution_id, ai_type, input_data, input_file_path, output_data,
+       confidence_score, processing_time_ms, model_name, COALESCE(created_at, CURRENT_TIMESTAMP), metadata
+FROM ai_results_unpartitioned;
+
+INSERT INTO system_logs (id, level, component, message, stack_trace, created_at, metadata)
+SELECT id, level, component, message, stack_trace, COALESCE(created_at, CURRENT_TIMESTAMP), metadata
+FROM system_logs_unpartitioned;
+
+-- Dropping the old tables also drops their indexes, freeing the index names
+DROP TABLE task_executions_unpartitioned;
+DROP TABLE task_execution_logs_unpartitioned;
+DROP TABLE ai_results_unpartitioned;
+DROP TABLE system_logs_unpartitioned;
+
+CREATE INDEX idx_task_executions_task_id ON task_executions(task_id);
+CREATE INDEX idx_task_executions_status ON task_executions(status);
+CREATE INDEX idx_task_executions_started_at ON task_executions(started_at DESC);
+CREATE INDEX idx_task_executions_active ON task_executions(started_at) WHERE status IN ('pending', 'running');
+CREATE INDEX idx_task_execution_logs_execution_seq ON task_execution_logs(execution_id, seq);
+CREATE INDEX idx_ai_results_task_execution_id ON ai_results(task_execution_id);
+CREATE INDEX idx_ai_results_ai_type ON ai_results(ai_type);
+CREATE INDEX idx_ai_results_cache_key ON ai_results((metadata->>'cache_key'), created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_task_execution_id ON notifications(task_execution_id);
+CREATE INDEX idx_system_logs_level ON system_logs(level);
+CREATE INDEX idx_system_logs_created_at ON system_logs(created_at DESC);
+
+DO $$
+DECLARE
+    v RECORD;
+BEGIN
+    -- Creation order, so views built on other views come after them
+    FOR v IN SELECT name, definition FROM migration_views ORDER BY oid LOOP
+        EXECUTE format('CREATE VIEW %I AS %s', v.name, v.definition);
+    END LOOP;
+END $$;
+
+COMMIT;
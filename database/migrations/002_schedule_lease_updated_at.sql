@@ -0,0 +1,27 @@
+-- Migration: stop schedule leases from bumping schedules.updated_at
+--
+-- Claiming and releasing a schedule lease is engine bookkeeping. With the
+-- generic updated_at trigger every fired schedule looked edited, so the
+-- scheduler's delta sync fetched it again. Same definitions as schema.sql.
+--
+-- Usage:
+--   psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f database/migrations/002_schedule_lease_updated_at.sql
+
+BEGIN;
+
+CREATE OR REPLACE FUNCTION update_schedules_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.lease_owner IS NOT DISTINCT FROM OLD.lease_owner
+       AND NEW.lease_expires_at IS NOT DISTINCT FROM OLD.lease_expires_at THEN
+        NEW.updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
+DROP TRIGGER IF EXISTS update_schedules_updated_at ON schedules;
+CREATE TRIGGER update_schedules_updated_at BEFORE UPDATE ON schedules
+    FOR EACH ROW EXECUTE FUNCTION update_schedules_updated_at_column();
+
+COMMIT;
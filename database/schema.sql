@@ -39,16 +39,25 @@ CREATE TABLE IF NOT EXISTS schedules (
     is_active BOOLEAN DEFAULT TRUE,
     next_run TIMESTAMP,
     last_run TIMESTAMP,
+    lease_owner VARCHAR(255), -- engine node currently dispatching this schedule
+    lease_expires_at TIMESTAMP,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- History tables below are range-partitioned by month on their timestamp.
+-- The automation engine creates upcoming monthly partitions and drops or
+-- archives expired ones (see automation-engine/src/database/partition_manager.py);
+-- the DEFAULT partitions catch rows for months that have no partition yet.
+-- Partition keys must be part of every unique constraint, so other tables
+-- reference executions by ID without a foreign key.
+
 -- Task execution history
 CREATE TABLE IF NOT EXISTS task_executions (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     task_id UUID REFERENCES tasks(id) ON DELETE CASCADE,
     status VARCHAR(50) NOT NULL, -- pending, running, success, failed, timeout
-    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     completed_at TIMESTAMP,
     duration_ms INTEGER,
     exit_code INTEGER,
@@ -56,8 +65,24 @@ CREATE TABLE IF NOT EXISTS task_executions (
     stderr TEXT,
     error_message TEXT,
     triggered_by VARCHAR(50) DEFAULT 'manual', -- manual, schedule, api, plugin
-    metadata JSONB DEFAULT '{}'::jsonb
-);
+    metadata JSONB DEFAULT '{}'::jsonb,
+    PRIMARY KEY (id, started_at)
+) PARTITION BY RANGE (started_at);
+
+CREATE TABLE IF NOT EXISTS task_executions_default PARTITION OF task_executions DEFAULT;
+
+-- Task execution output, stored incrementally in sequence-numbered chunks
+CREATE TABLE IF NOT EXISTS task_execution_logs (
+    id BIGSERIAL,
+    execution_id UUID NOT NULL, -- task_executions.id
+    seq INTEGER NOT NULL,
+    stream VARCHAR(10) NOT NULL, -- stdout, stderr
+    content TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS task_execution_logs_default PARTITION OF task_execution_logs DEFAULT;
 
 -- Plugins
 CREATE TABLE IF NOT EXISTS plugins (
@@ -76,8 +101,8 @@ CREATE TABLE IF NOT EXISTS plugins (
 
 -- AI processing results
 CREATE TABLE IF NOT EXISTS ai_results (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    task_execution_id UUID REFERENCES task_executions(id) ON DELETE CASCADE,
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
+    task_execution_id UUID, -- task_executions.id
     ai_type VARCHAR(50) NOT NULL, -- nlp_summary, image_classification, sentiment_analysis
     input_data TEXT,
     input_file_path VARCHAR(500),
@@ -85,14 +110,17 @@ CREATE TABLE IF NOT EXISTS ai_results (
     confidence_score FLOAT,
     processing_time_ms INTEGER,
     model_name VARCHAR(255),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    metadata JSONB DEFAULT '{}'::jsonb
-);
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS ai_results_default PARTITION OF ai_results DEFAULT;
 
 -- Notifications
 CREATE TABLE IF NOT EXISTS notifications (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
-    task_execution_id UUID REFERENCES task_executions(id) ON DELETE CASCADE,
+    task_execution_id UUID, -- task_executions.id
     notification_type VARCHAR(50) NOT NULL, -- email, slack, webhook
     recipient VARCHAR(255) NOT NULL,
     subject VARCHAR(500),
@@ -106,15 +134,45 @@ CREATE TABLE IF NOT EXISTS notifications (
 
 -- System logs
 CREATE TABLE IF NOT EXISTS system_logs (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     level VARCHAR(20) NOT NULL, -- debug, info, warning, error, critical
     component VARCHAR(100) NOT NULL, -- engine, api, plugin, scheduler
     message TEXT NOT NULL,
     stack_trace TEXT,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    metadata JSONB DEFAULT '{}'::jsonb
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    metadata JSONB DEFAULT '{}'::jsonb,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+CREATE TABLE IF NOT EXISTS system_logs_default PARTITION OF system_logs DEFAULT;
+
+-- Execution statistics per task and time bucket, maintained incrementally by
+-- record_execution_rollups() as executions complete. bucket_size is minute,
+-- hour, day, or 'all' (a single all-time row per task at the epoch), so
+-- analytics read a bounded number of rows however long history grows.
+-- duration_histogram holds counts per log-scaled duration bucket (see
+-- histogram_bucket()); histograms merge by adding counts element-wise.
+CREATE TABLE IF NOT EXISTS task_execution_rollups (
+    task_id UUID NOT NULL REFERENCES tasks(id) ON DELETE CASCADE,
+    bucket_size VARCHAR(10) NOT NULL, -- minute, hour, day, all
+    bucket_start TIMESTAMP NOT NULL,
+    total BIGINT NOT NULL DEFAULT 0,
+    successful BIGINT NOT NULL DEFAULT 0,
+    failed BIGINT NOT NULL DEFAULT 0,
+    timed_out BIGINT NOT NULL DEFAULT 0,
+    duration_count BIGINT NOT NULL DEFAULT 0,
+    duration_sum BIGINT NOT NULL DEFAULT 0,
+    duration_min INTEGER,
+    duration_max INTEGER,
+    duration_histogram BIGINT[] NOT NULL DEFAULT '{}',
+    last_execution_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (task_id, bucket_size, bucket_start)
 );
 
+-- Schema that expired history partitions are moved to when archived
+CREATE SCHEMA IF NOT EXISTS omnitasker_archive;
+
 -- Create indexes for performance
 CREATE INDEX idx_tasks_user_id ON tasks(user_id);
 CREATE INDEX idx_tasks_is_enabled ON tasks(is_enabled);
@@ -123,12 +181,17 @@ CREATE INDEX idx_schedules_next_run ON schedules(next_run) WHERE is_active = TRU
 CREATE INDEX idx_task_executions_task_id ON task_executions(task_id);
 CREATE INDEX idx_task_executions_status ON task_executions(status);
 CREATE INDEX idx_task_executions_started_at ON task_executions(started_at DESC);
+CREATE INDEX idx_task_execution_logs_execution_seq ON task_execution_logs(execution_id, seq);
 CREATE INDEX idx_plugins_is_enabled ON plugins(is_enabled);
 CREATE INDEX idx_ai_results_task_execution_id ON ai_results(task_execution_id);
 CREATE INDEX idx_ai_results_ai_type ON ai_results(ai_type);
+CREATE INDEX idx_ai_results_cache_key ON ai_results((metadata->>'cache_key'), created_at DESC);
 CREATE INDEX idx_notifications_status ON notifications(status);
+CREATE INDEX idx_notifications_task_execution_id ON notifications(task_execution_id);
 CREATE INDEX idx_system_logs_level ON system_logs(level);
 CREATE INDEX idx_system_logs_created_at ON system_logs(created_at DESC);
+CREATE INDEX idx_task_executions_active ON task_executions(started_at) WHERE status IN ('pending', 'running');
+CREATE INDEX idx_task_execution_rollups_bucket ON task_execution_rollups(bucket_size, bucket_start);
 
 -- Create updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -146,31 +209,181 @@ CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
 CREATE TRIGGER update_tasks_updated_at BEFORE UPDATE ON tasks
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Claiming or releasing a lease (which also writes next_run and last_run) is
+-- engine bookkeeping, not an edit; bumping updated_at would make the
+-- scheduler's delta sync re-fetch every schedule that fires
+CREATE OR REPLACE FUNCTION update_schedules_updated_at_column()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.lease_owner IS NOT DISTINCT FROM OLD.lease_owner
+       AND NEW.lease_expires_at IS NOT DISTINCT FROM OLD.lease_expires_at THEN
+        NEW.updated_at = CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$ language 'plpgsql';
+
 CREATE TRIGGER update_schedules_updated_at BEFORE UPDATE ON schedules
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+    FOR EACH ROW EXECUTE FUNCTION update_schedules_updated_at_column();
 
 CREATE TRIGGER update_plugins_updated_at BEFORE UPDATE ON plugins
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Notify the automation engine when schedules change so it can wake its
+-- scheduler instead of polling. Only fields that affect timing are watched.
+CREATE OR REPLACE FUNCTION notify_schedule_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('schedule_changes', TG_TABLE_NAME || ':' || TG_OP);
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+CREATE TRIGGER notify_schedules_insert_delete AFTER INSERT OR DELETE ON schedules
+    FOR EACH ROW EXECUTE FUNCTION notify_schedule_change();
+
+CREATE TRIGGER notify_schedules_update AFTER UPDATE ON schedules
+    FOR EACH ROW
+    WHEN (OLD.cron_expression IS DISTINCT FROM NEW.cron_expression
+          OR OLD.timezone IS DISTINCT FROM NEW.timezone
+          OR OLD.is_active IS DISTINCT FROM NEW.is_active
+          OR OLD.task_id IS DISTINCT FROM NEW.task_id)
+    EXECUTE FUNCTION notify_schedule_change();
+
+CREATE TRIGGER notify_tasks_update AFTER UPDATE ON tasks
+    FOR EACH ROW
+    WHEN (OLD.is_enabled IS DISTINCT FROM NEW.is_enabled
+          OR OLD.name IS DISTINCT FROM NEW.name
+          OR OLD.script_type IS DISTINCT FROM NEW.script_type)
+    EXECUTE FUNCTION notify_schedule_change();
+
+-- Duration histograms: bucket 0 holds durations under 1 ms, bucket i > 0
+-- holds [2^((i-1)/8), 2^(i/8)) ms, i.e. 8 buckets per doubling (at most ~9%
+-- relative error) and 250 buckets for the whole INTEGER range. Arrays are
+-- trimmed after the highest non-empty bucket.
+CREATE OR REPLACE FUNCTION histogram_bucket(duration_ms INTEGER)
+RETURNS INTEGER AS $$
+    SELECT CASE
+        WHEN duration_ms IS NULL THEN NULL
+        WHEN duration_ms < 1 THEN 0
+        ELSE floor(ln(duration_ms) / ln(2) * 8)::integer + 1
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION histogram_from_durations(durations INTEGER[])
+RETURNS BIGINT[] AS $$
+    SELECT COALESCE(array_agg(COALESCE(c.n, 0) ORDER BY b.idx), '{}')
+    FROM generate_series(0, (SELECT MAX(histogram_bucket(d)) FROM unnest(durations) AS d)) AS b(idx)
+    LEFT JOIN (
+        SELECT histogram_bucket(d) AS idx, COUNT(*) AS n
+        FROM unnest(durations) AS d
+        WHERE d IS NOT NULL
+        GROUP BY 1
+    ) c ON c.idx = b.idx
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION histogram_merge(a BIGINT[], b BIGINT[])
+RETURNS BIGINT[] AS $$
+    SELECT CASE
+        WHEN a IS NULL THEN b
+        WHEN b IS NULL THEN a
+        ELSE (SELECT COALESCE(array_agg(COALESCE(x, 0) + COALESCE(y, 0) ORDER BY n), '{}')
+              FROM unnest(a, b) WITH ORDINALITY AS t(x, y, n))
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE AGGREGATE histogram_sum(BIGINT[]) (
+    SFUNC = histogram_merge,
+    STYPE = BIGINT[]
+);
+
+-- Approximate duration (ms) at quantile q: the geometric midpoint of the
+-- bucket holding that rank
+CREATE OR REPLACE FUNCTION histogram_percentile(histogram BIGINT[], q DOUBLE PRECISION)
+RETURNS DOUBLE PRECISION AS $$
+DECLARE
+    total BIGINT;
+    seen BIGINT := 0;
+BEGIN
+    SELECT SUM(n) INTO total FROM unnest(histogram) AS n;
+    IF total IS NULL OR total = 0 THEN
+        RETURN NULL;
+    END IF;
+    FOR i IN 1 .. array_length(histogram, 1) LOOP
+        seen := seen + histogram[i];
+        IF seen > 0 AND seen >= q * total THEN
+            RETURN CASE WHEN i = 1 THEN 0 ELSE power(2, (i - 1.5) / 8.0) END;
+        END IF;
+    END LOOP;
+    RETURN power(2, (array_length(histogram, 1) - 1.5) / 8.0);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- Fold a batch of completed executions into the minute, hour, day and
+-- all-time rollups. Called by the automation engine in the transaction that
+-- writes the completions, so each execution is counted exactly once.
+-- Rows are upserted in key order so concurrent writers cannot deadlock.
+CREATE OR REPLACE FUNCTION record_execution_rollups(
+    task_ids UUID[], started TIMESTAMP[], statuses TEXT[], durations INTEGER[])
+RETURNS VOID AS $$
+    INSERT INTO task_execution_rollups AS r (
+        task_id, bucket_size, bucket_start, total, successful, failed, timed_out,
+        duration_count, duration_sum, duration_min, duration_max, duration_histogram,
+        last_execution_at)
+    SELECT e.task_id, g.bucket_size,
+           CASE WHEN g.bucket_size = 'all' THEN TIMESTAMP 'epoch'
+                ELSE date_trunc(g.bucket_size, e.started_at) END,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE e.status = 'success'),
+           COUNT(*) FILTER (WHERE e.status = 'failed'),
+           COUNT(*) FILTER (WHERE e.status = 'timeout'),
+           COUNT(e.duration_ms),
+           COALESCE(SUM(e.duration_ms), 0),
+           MIN(e.duration_ms),
+           MAX(e.duration_ms),
+           histogram_from_durations(array_agg(e.duration_ms)),
+           MAX(e.started_at)
+    FROM unnest(task_ids, started, statuses, durations) AS e(task_id, started_at, status, duration_ms)
+    CROSS JOIN (VALUES ('minute'), ('hour'), ('day'), ('all')) AS g(bucket_size)
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    ON CONFLICT (task_id, bucket_size, bucket_start) DO UPDATE SET
+        total = r.total + EXCLUDED.total,
+        successful = r.successful + EXCLUDED.successful,
+        failed = r.failed + EXCLUDED.failed,
+        timed_out = r.timed_out + EXCLUDED.timed_out,
+        duration_count = r.duration_count + EXCLUDED.duration_count,
+        duration_sum = r.duration_sum + EXCLUDED.duration_sum,
+        duration_min = LEAST(r.duration_min, EXCLUDED.duration_min),
+        duration_max = GREATEST(r.duration_max, EXCLUDED.duration_max),
+        duration_histogram = histogram_merge(r.duration_histogram, EXCLUDED.duration_histogram),
+        last_execution_at = GREATEST(r.last_execution_at, EXCLUDED.last_execution_at),
+        updated_at = CURRENT_TIMESTAMP
+$$ LANGUAGE sql;
+
 -- Insert default admin user (password: admin123 - CHANGE IN PRODUCTION)
 -- Password hash generated using bcrypt with cost factor 12
 INSERT INTO users (username, email, password_hash) VALUES
     ('admin', 'admin@omnitasker.local', '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewY5GyYqVr/VrZC6')
 ON CONFLICT (username) DO NOTHING;
 
--- Create view for task execution statistics
+-- Create view for task execution statistics (one all-time rollup row per task)
 CREATE OR REPLACE VIEW task_execution_stats AS
 SELECT 
     t.id as task_id,
     t.name as task_name,
-    COUNT(te.id) as total_executions,
-    COUNT(CASE WHEN te.status = 'success' THEN 1 END) as successful_executions,
-    COUNT(CASE WHEN te.status = 'failed' THEN 1 END) as failed_executions,
-    ROUND(AVG(te.duration_ms)::numeric, 2) as avg_duration_ms,
-    MAX(te.started_at) as last_execution
+    COALESCE(r.total, 0) as total_executions,
+    COALESCE(r.successful, 0) as successful_executions,
+    COALESCE(r.failed, 0) as failed_executions,
+    ROUND(r.duration_sum::numeric / NULLIF(r.duration_count, 0), 2) as avg_duration_ms,
+    r.last_execution_at as last_execution,
+    COALESCE(r.timed_out, 0) as timed_out_executions,
+    ROUND(histogram_percentile(r.duration_histogram, 0.5)::numeric, 2) as p50_duration_ms,
+    ROUND(histogram_percentile(r.duration_histogram, 0.95)::numeric, 2) as p95_duration_ms,
+    ROUND(histogram_percentile(r.duration_histogram, 0.99)::numeric, 2) as p99_duration_ms
 FROM tasks t
-LEFT JOIN task_executions te ON t.id = te.task_id
-GROUP BY t.id, t.name;
+LEFT JOIN task_execution_rollups r
+    ON r.task_id = t.id AND r.bucket_size = 'all' AND r.bucket_start = TIMESTAMP 'epoch';
 
 -- Grant permissions (adjust as needed for production)
 -- GRANT ALL PRIVILEGES ON ALL TABLES IN SCHEMA public TO omnitasker;